@@ -4,6 +4,10 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy import stats
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'uber-eats-menu-processing'))
+from menu_prices import load_restaurant_prices
 
 sns.set_style("whitegrid")
 plt.rcParams['figure.dpi'] = 300
@@ -16,15 +20,9 @@ print("Loading datasets...")
 scores_df = pd.read_csv('scored-datasets/uber_eats_menu_with_scores.csv')
 ingredients_scores_df = pd.read_csv('scored-datasets/uber_eats_menu_with_ingredients_scores.csv')
 
-print("Loading restaurant menus (this may take a moment)...")
-menus_df = pd.read_csv('datasets/restaurant-menus.csv')
-
-print("Calculating price ranges per restaurant...")
-menus_df['price_float'] = menus_df['price'].str.replace(' USD', '', regex=False)
-menus_df['price_float'] = pd.to_numeric(menus_df['price_float'], errors='coerce')
-
-restaurant_prices = menus_df.groupby('restaurant_id')['price_float'].agg(['min', 'max', 'mean']).reset_index()
-restaurant_prices.columns = ['restaurant_id', 'min_price', 'max_price', 'avg_price']
+print("Loading price ranges per restaurant...")
+# Read from datasets/restaurant-menus.csv.prices.npz while the menus file is unchanged.
+restaurant_prices = load_restaurant_prices('datasets/restaurant-menus.csv')
 
 restaurant_prices = restaurant_prices.dropna(subset=['avg_price'])
 
@@ -0,0 +1,141 @@
+import json
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Upper edges of the score bands 0-20, 21-40, 41-60, 61-80 and 81-100.
+BAND_EDGES = [20, 40, 60, 80]
+BAND_LABELS = ['0-20', '21-40', '41-60', '61-80', '81-100']
+# Points on the 0-100 grid the densities are evaluated at.
+DENSITY_POINTS = 512
+
+
+def valid_scores(series: pd.Series) -> pd.Series:
+    """Scores inside 0-100; failed rows (-1), missing and out-of-range values are dropped."""
+    scores = pd.to_numeric(series, errors='coerce')
+    return scores[(scores >= 0) & (scores <= 100)]
+
+
+def paired_scores(df1: pd.DataFrame, df2: pd.DataFrame, column1: str, column2: str,
+                  key: str = 'restaurant_id') -> pd.DataFrame:
+    """
+    One row per restaurant scored validly in both frames, with columns
+    score1 and score2. Duplicate restaurant ids keep their first row.
+    """
+    left = df1[[key, column1]].drop_duplicates(subset=[key])
+    right = df2[[key, column2]].drop_duplicates(subset=[key])
+    left = pd.DataFrame({key: left[key], 'score1': pd.to_numeric(left[column1], errors='coerce')})
+    right = pd.DataFrame({key: right[key], 'score2': pd.to_numeric(right[column2], errors='coerce')})
+    paired = left.merge(right, on=key, how='inner')
+    in_range = paired['score1'].between(0, 100) & paired['score2'].between(0, 100)
+    return paired[in_range].reset_index(drop=True)
+
+
+def bands(scores: np.ndarray) -> np.ndarray:
+    """Band index 0-4 of each score; a band includes its upper edge (20 is in 0-20)."""
+    return np.searchsorted(BAND_EDGES, scores, side='left')
+
+
+def pearson(x: np.ndarray, y: np.ndarray) -> Optional[float]:
+    if len(x) < 2:
+        return None
+    x = x - x.mean()
+    y = y - y.mean()
+    denominator = np.sqrt((x * x).sum() * (y * y).sum())
+    return float((x * y).sum() / denominator) if denominator > 0 else None
+
+
+def spearman(x: np.ndarray, y: np.ndarray) -> Optional[float]:
+    """Pearson correlation of the ranks, ties getting their average rank."""
+    return pearson(pd.Series(x).rank().to_numpy(), pd.Series(y).rank().to_numpy())
+
+
+def band_confusion(score1: np.ndarray, score2: np.ndarray) -> np.ndarray:
+    """5 x 5 counts of restaurants by (band of score1, band of score2)."""
+    n_bands = len(BAND_LABELS)
+    cells = bands(score1) * n_bands + bands(score2)
+    return np.bincount(cells, minlength=n_bands * n_bands).reshape(n_bands, n_bands)
+
+
+def agreement_metrics(paired: pd.DataFrame) -> Dict[str, Any]:
+    score1 = paired['score1'].to_numpy(dtype=np.float64)
+    score2 = paired['score2'].to_numpy(dtype=np.float64)
+    confusion = band_confusion(score1, score2)
+    n = len(paired)
+    difference = score1 - score2
+    return {
+        'paired_restaurants': n,
+        'pearson': pearson(score1, score2),
+        'spearman': spearman(score1, score2),
+        'mean_absolute_difference': float(np.abs(difference).mean()) if n else None,
+        'mean_difference': float(difference.mean()) if n else None,
+        'band_agreement': float(np.trace(confusion) / n) if n else None,
+        'band_labels': BAND_LABELS,
+        # Rows are the first dataset's bands, columns the second's.
+        'band_confusion': confusion.tolist(),
+    }
+
+
+def binned_density(scores: np.ndarray, points: int = DENSITY_POINTS, low: float = 0.0, high: float = 100.0,
+                   bandwidth: Optional[float] = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Gaussian kernel density estimate on an evenly spaced grid. Scores are
+    linearly binned onto the grid and convolved with the kernel by FFT, so
+    the cost is O(n + points log points) instead of O(n x points).
+    The bandwidth defaults to Scott's rule, as in seaborn's kdeplot.
+    """
+    grid = np.linspace(low, high, points)
+    scores = np.asarray(scores, dtype=np.float64)
+    if len(scores) < 2 or scores.std() == 0:
+        return grid, np.zeros(points)
+    if bandwidth is None:
+        bandwidth = scores.std(ddof=1) * len(scores) ** (-1 / 5)
+
+    # Linear binning: each score splits its weight between its two nearest grid points.
+    step = grid[1] - grid[0]
+    position = np.clip((scores - low) / step, 0, points - 1)
+    lower = np.minimum(position.astype(np.int64), points - 2)
+    upper_weight = position - lower
+    counts = (np.bincount(lower, weights=1 - upper_weight, minlength=points)
+              + np.bincount(lower + 1, weights=upper_weight, minlength=points))
+
+    # Zero padding keeps the circular convolution from wrapping mass around the ends.
+    offsets = np.arange(-points + 1, points) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    size = 1 << int(np.ceil(np.log2(3 * points - 2)))
+    convolved = np.fft.irfft(np.fft.rfft(counts, size) * np.fft.rfft(kernel, size), size)
+    density = convolved[points - 1:2 * points - 1] / len(scores)
+    return grid, np.maximum(density, 0.0)
+
+
+def write_report(path: str, report: Dict[str, Any]):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def compare_scores(df1: pd.DataFrame, df2: pd.DataFrame, column1: str, column2: str,
+                   labels: List[str], points: int = DENSITY_POINTS) -> Dict[str, Any]:
+    """
+    Agreement metrics over the restaurants scored in both frames, plus each
+    dataset's own score density, as one JSON-serializable report.
+    """
+    paired = paired_scores(df1, df2, column1, column2)
+    scores1 = valid_scores(df1[column1]).to_numpy(dtype=np.float64)
+    scores2 = valid_scores(df2[column2]).to_numpy(dtype=np.float64)
+    grid, density1 = binned_density(scores1, points)
+    _, density2 = binned_density(scores2, points)
+    return {
+        'datasets': [
+            {'label': labels[0], 'column': column1, 'rows': len(df1), 'valid_scores': len(scores1),
+             'mean': float(scores1.mean()) if len(scores1) else None},
+            {'label': labels[1], 'column': column2, 'rows': len(df2), 'valid_scores': len(scores2),
+             'mean': float(scores2.mean()) if len(scores2) else None},
+        ],
+        'agreement': agreement_metrics(paired),
+        'density': {
+            'grid': grid.round(4).tolist(),
+            labels[0]: density1.round(8).tolist(),
+            labels[1]: density2.round(8).tolist(),
+        },
+    }
@@ -1,8 +1,15 @@
+import argparse
 import pandas as pd
-import seaborn as sns
 import matplotlib.pyplot as plt
+from score_comparison import compare_scores, write_report
 
-def compare_restaurant_scores(file_path_1, file_path_2, score_column_file1='nutrition_score', score_column_file2='healthiness_score'):
+def compare_restaurant_scores(file_path_1, file_path_2, score_column_file1='nutrition_score', score_column_file2='healthiness_score',
+                              output_filename='restaurant_score_comparison.png', report_filename='restaurant_score_comparison.json'):
+    """
+    Compare two restaurant score files: agreement metrics over the
+    restaurants both scored go to report_filename, and both score densities
+    (binned, FFT-smoothed) are plotted to output_filename.
+    """
     try:
         df1 = pd.read_csv(file_path_1)
         df2 = pd.read_csv(file_path_2)
@@ -13,9 +20,22 @@ def compare_restaurant_scores(file_path_1, file_path_2, score_column_file1='nutr
             print(f"Columns in CSV 2: {df2.columns.tolist()}")
             return
 
+        labels = ['uber_eats_menu_with_scores', 'uber_eats_menu_with_ingredients_scores']
+        report = compare_scores(df1, df2, score_column_file1, score_column_file2, labels)
+        report['files'] = [file_path_1, file_path_2]
+        write_report(report_filename, report)
+
+        agreement = report['agreement']
+        print(f"{agreement['paired_restaurants']} restaurants scored in both files")
+        for name in ['pearson', 'spearman', 'mean_absolute_difference', 'band_agreement']:
+            value = agreement[name]
+            print(f"  {name}: {value:.4f}" if value is not None else f"  {name}: n/a")
+
         plt.figure(figsize=(10, 6))
-        sns.kdeplot(df1[score_column_file1], label='uber_eats_menu_with_scores', fill=True, alpha=0.5, linewidth=2)
-        sns.kdeplot(df2[score_column_file2], label='uber_eats_menu_with_ingredients_scores', fill=True, alpha=0.5, linewidth=2)
+        grid = report['density']['grid']
+        for label in labels:
+            plt.fill_between(grid, report['density'][label], alpha=0.5, label=label)
+            plt.plot(grid, report['density'][label], linewidth=2)
 
         title = f'Comparison of scores between the datasets'
         plt.title(title, fontsize=16)
@@ -24,12 +44,26 @@ def compare_restaurant_scores(file_path_1, file_path_2, score_column_file1='nutr
         plt.legend()
         plt.grid(True, linestyle='--', alpha=0.7)
 
-        output_filename = 'restaurant_score_comparison.png'
         plt.savefig(output_filename)
-        plt.close() 
+        plt.close()
+        print(f"Saved: {output_filename} and {report_filename}")
 
     except FileNotFoundError:
         print("Error: One of the CSV files was not found")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
-compare_restaurant_scores('scored-datasets/uber_eats_menu_with_scores.csv', 'scored-datasets/uber_eats_menu_with_ingredients_scores.csv')
\ No newline at end of file
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare menu-based and ingredient-based restaurant scores.")
+    parser.add_argument('--menu-scores', default='scored-datasets/uber_eats_menu_with_scores.csv')
+    parser.add_argument('--ingredient-scores', default='scored-datasets/uber_eats_menu_with_ingredients_scores.csv')
+    parser.add_argument('--plot', default='restaurant_score_comparison.png', help="Density plot to write")
+    parser.add_argument('--report', default='restaurant_score_comparison.json', help="JSON report with the agreement metrics")
+
+    args = parser.parse_args()
+
+    compare_restaurant_scores(args.menu_scores, args.ingredient_scores,
+                              output_filename=args.plot, report_filename=args.report)
+
+if __name__ == "__main__":
+    main()
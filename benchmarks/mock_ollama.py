@@ -0,0 +1,262 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HOST = '127.0.0.1'
+PORT = 11435
+# Seconds per request, plus up to JITTER extra, to stand in for model latency.
+LATENCY = 0.05
+JITTER = 0.0
+# Extra seconds per generated word, so longer answers take longer.
+TOKEN_LATENCY = 0.0
+# Share of items left out of JSON batch answers, to exercise the callers' fallbacks.
+DROP_RATE = 0.0
+# Words of explanation appended after a score, like a chatty small model.
+RAMBLE = 0
+# Share of chat requests that stall for STALL_SECONDS, and share answered with a 500, for the callers' call policy.
+STALL_RATE = 0.0
+STALL_SECONDS = 30.0
+ERROR_RATE = 0.0
+# Requests served at once, like OLLAMA_NUM_PARALLEL; the rest queue.
+PARALLEL = 4
+# Length of the vectors returned by /api/embed.
+EMBED_DIM = 256
+INGREDIENT_WORDS = [
+    'chicken', 'beef', 'pork', 'salmon', 'shrimp', 'tofu', 'egg', 'rice', 'noodles', 'bread',
+    'tortilla', 'cheese', 'lettuce', 'tomato', 'onion', 'garlic', 'pepper', 'potato', 'beans',
+    'butter', 'cream', 'soy sauce', 'olive oil', 'basil', 'mushroom', 'spinach', 'avocado', 'corn',
+]
+RAMBLE_WORDS = ['this', 'menu', 'has', 'some', 'fresh', 'options', 'but', 'also', 'fried', 'items', 'and', 'desserts']
+
+
+def fake_content(messages, format=None, drop_rate=DROP_RATE, ramble=RAMBLE):
+    """
+    A plausible answer for the prompts the helper scripts send. Requests with
+    a `format` get a JSON object with one entry per numbered line of the
+    prompt, minus a drop_rate share of them. Scores are followed by `ramble`
+    words of explanation.
+    """
+    prompt = messages[-1].get('content', '') if messages else ''
+    rng = random.Random(prompt)
+    if format is not None:
+        numbers = [int(number) for number in re.findall(r'^(\d+)\. ', prompt, flags=re.MULTILINE)]
+        items = [
+            {'index': number, 'ingredients': rng.sample(INGREDIENT_WORDS, rng.randint(3, 8))}
+            for number in numbers if rng.random() >= drop_rate
+        ]
+        return json.dumps({'items': items})
+    if 'ingredients' in prompt.lower():
+        return ', '.join(rng.sample(INGREDIENT_WORDS, rng.randint(3, 8)))
+    score = str(rng.randint(0, 100))
+    if ramble:
+        score += '\n' + ' '.join(rng.choice(RAMBLE_WORDS) for _ in range(ramble))
+    return score
+
+
+def fake_embedding(text, dim=EMBED_DIM):
+    """
+    Hashed character-trigram counts of the lower-cased text, so texts that
+    share spelling get similar vectors, like a (very small) embedding model.
+    """
+    padded = f"  {str(text).lower()} "
+    vector = [0.0] * dim
+    for i in range(len(padded) - 2):
+        digest = hashlib.blake2b(padded[i:i + 3].encode('utf-8'), digest_size=4).digest()
+        bucket = int.from_bytes(digest, 'little')
+        vector[bucket % dim] += 1.0 if bucket & 0x80000000 else -1.0
+    return vector
+
+
+def split_tokens(content):
+    """Words with their trailing whitespace, standing in for model tokens."""
+    return re.findall(r'\S+\s*', content)
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    """Answers /api/chat and /api/embed like an Ollama server, after a fixed delay."""
+
+    server_version = 'MockOllama/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path in ('/', '/api/tags', '/api/version'):
+            self._send_json(200, {'models': [], 'version': 'mock'})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            self._send_json(400, {'error': 'invalid JSON'})
+            return
+        if self.path == '/api/embed':
+            self._embed(request)
+            return
+        if self.path != '/api/chat':
+            self._send_json(404, {'error': f"unsupported endpoint {self.path}"})
+            return
+
+        if random.random() < self.server.error_rate:
+            self._send_json(500, {'error': 'mock server error'})
+            return
+        start = time.perf_counter()
+        content = fake_content(request.get('messages', []), request.get('format'), self.server.drop_rate, self.server.ramble)
+        tokens = split_tokens(content)
+        num_predict = (request.get('options') or {}).get('num_predict')
+        done_reason = 'stop'
+        if num_predict is not None and 0 <= num_predict < len(tokens):
+            tokens = tokens[:num_predict]
+            done_reason = 'length'
+        with self.server.slots:
+            time.sleep(self.server.latency + random.random() * self.server.jitter)
+            if random.random() < self.server.stall_rate:
+                time.sleep(self.server.stall_seconds)
+            if request.get('stream'):
+                self._stream_tokens(request, tokens, start, done_reason)
+                return
+            time.sleep(len(tokens) * self.server.token_latency)
+            self.server.count_request(len(tokens))
+        self._send_json(200, self._final(request, ''.join(tokens), len(tokens), start, done_reason))
+
+    def _embed(self, request):
+        texts = request.get('input', '')
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        start = time.perf_counter()
+        with self.server.slots:
+            time.sleep(self.server.latency)
+            embeddings = [fake_embedding(text) for text in texts]
+        self.server.count_request()
+        self._send_json(200, {
+            'model': request.get('model', 'mock'),
+            'embeddings': embeddings,
+            'total_duration': int((time.perf_counter() - start) * 1e9),
+            'prompt_eval_count': sum(len(str(text).split()) for text in texts),
+        })
+
+    def _final(self, request, content, eval_count, start, done_reason):
+        # Split the time like a real server would report it: a small load, then
+        # prompt ingestion and generation.
+        elapsed_ns = int((time.perf_counter() - start) * 1e9)
+        prompt_tokens = sum(len(str(message.get('content', '')).split()) for message in request.get('messages', []))
+        return {
+            'model': request.get('model', 'mock'),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'message': {'role': 'assistant', 'content': content},
+            'done': True,
+            'done_reason': done_reason,
+            'total_duration': elapsed_ns,
+            'load_duration': elapsed_ns // 20,
+            'prompt_eval_count': prompt_tokens,
+            'prompt_eval_duration': elapsed_ns * 3 // 10,
+            'eval_count': eval_count,
+            'eval_duration': elapsed_ns * 13 // 20,
+        }
+
+    def _stream_tokens(self, request, tokens, start, done_reason):
+        """
+        Send one JSON line per token like Ollama's streaming mode. A client that
+        disconnects stops generation, and only the tokens sent are counted.
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        sent = 0
+        try:
+            for token in tokens:
+                time.sleep(self.server.token_latency)
+                chunk = {'model': request.get('model', 'mock'), 'created_at': datetime.now(timezone.utc).isoformat(),
+                         'message': {'role': 'assistant', 'content': token}, 'done': False}
+                self.wfile.write((json.dumps(chunk) + '\n').encode('utf-8'))
+                self.wfile.flush()
+                sent += 1
+            final = self._final(request, '', sent, start, done_reason)
+            self.wfile.write((json.dumps(final) + '\n').encode('utf-8'))
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.count_cancelled()
+        finally:
+            self.server.count_request(sent)
+
+
+class MockOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host=HOST, port=PORT, latency=LATENCY, jitter=JITTER, parallel=PARALLEL,
+                 token_latency=TOKEN_LATENCY, drop_rate=DROP_RATE, ramble=RAMBLE, stall_rate=STALL_RATE,
+                 stall_seconds=STALL_SECONDS, error_rate=ERROR_RATE):
+        super().__init__((host, port), MockOllamaHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.token_latency = token_latency
+        self.drop_rate = drop_rate
+        self.ramble = ramble
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.error_rate = error_rate
+        self.slots = threading.Semaphore(parallel)
+        self.requests_served = 0
+        self.tokens_generated = 0
+        self.requests_cancelled = 0
+        self._count_lock = threading.Lock()
+
+    def count_request(self, tokens=0):
+        with self._count_lock:
+            self.requests_served += 1
+            self.tokens_generated += tokens
+
+    def count_cancelled(self):
+        with self._count_lock:
+            self.requests_cancelled += 1
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local Ollama-compatible stub server for benchmarks.")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--latency', type=float, default=LATENCY, help="Seconds spent on each request")
+    parser.add_argument('--jitter', type=float, default=JITTER, help="Random extra seconds added per request")
+    parser.add_argument('--parallel', type=int, default=PARALLEL, help="Requests processed concurrently")
+    parser.add_argument('--token-latency', type=float, default=TOKEN_LATENCY, help="Extra seconds per generated word")
+    parser.add_argument('--drop-rate', type=float, default=DROP_RATE, help="Share of items omitted from JSON batch answers")
+    parser.add_argument('--ramble', type=int, default=RAMBLE, help="Words of explanation after each score")
+    parser.add_argument('--stall-rate', type=float, default=STALL_RATE, help="Share of chat requests that stall")
+    parser.add_argument('--stall-seconds', type=float, default=STALL_SECONDS, help="Seconds a stalled request takes")
+    parser.add_argument('--error-rate', type=float, default=ERROR_RATE, help="Share of chat requests answered with a 500")
+
+    args = parser.parse_args()
+
+    server = MockOllamaServer(args.host, args.port, args.latency, args.jitter, args.parallel, args.token_latency, args.drop_rate,
+                              args.ramble, args.stall_rate, args.stall_seconds, args.error_rate)
+    print(f"Mock Ollama listening on {server.url} (latency {args.latency}s, parallel {args.parallel})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from mock_ollama import MockOllamaServer
+from synthetic_data import DATA_DIR, generate
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_FILE = os.path.join(REPO_ROOT, 'benchmarks', 'results.jsonl')
+SCRIPTS = {
+    'buildPrompts': 'uber-eats-menu-processing',
+    'batch_menu_run': 'ollama-helpers',
+    'batch_gen_ingredients': 'ollama-helpers',
+    'score-restaurant-ingredients': 'food-data-central-ingredient-processing',
+}
+STAGES = ['gen_prompts', 'process_csv', 'process_csv_async', 'process_data',
+          'create_nutrition_lookup_table', 'process_restaurants']
+# LLM stages only see this many rows; the rest of the time would be spent
+# sleeping in the mock server.
+LLM_ROWS = 200
+SYNTHETIC_INGREDIENTS = 'restaurants_with_ingredients_synthetic.csv'
+
+
+def import_script(name):
+    """Import a pipeline script by file name (hyphens allowed), so spawn-started pool workers can import it too."""
+    script_dir = os.path.join(REPO_ROOT, SCRIPTS[name])
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+    return importlib.import_module(name)
+
+
+def peak_rss_mb(who):
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux.
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def count_rows(path):
+    with open(path, 'rb') as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+def ensure_prompts(llm_rows):
+    if not os.path.exists('prompts.csv'):
+        import_script('buildPrompts').gen_prompts('datasets/restaurant-menus.csv', 'datasets/restaurants.csv', 'prompts.csv')
+    pd.read_csv('prompts.csv').head(llm_rows).to_csv('prompts_llm.csv', index=False)
+
+
+def write_llm_menus(llm_rows, state):
+    """First menu rows of `state` restaurants that batch_gen_ingredients would keep, up to llm_rows."""
+    restaurants = pd.read_csv('datasets/restaurants.csv')
+    ids = restaurants.loc[restaurants['full_address'].str.split(', ').str[-2] == state, 'id']
+    kept = []
+    for chunk in pd.read_csv('datasets/restaurant-menus.csv', chunksize=100_000):
+        kept.append(chunk[chunk['restaurant_id'].isin(ids)].drop_duplicates(subset=['restaurant_id', 'category']))
+        if sum(len(part) for part in kept) >= llm_rows:
+            break
+    menus = pd.concat(kept).drop_duplicates(subset=['restaurant_id', 'category']).head(llm_rows)
+    menus.to_csv('datasets/restaurant-menus-llm.csv', index=False)
+
+
+def run_stage(stage, llm_rows, items_per_prompt=1, stream=False, hedge=False):
+    """Run one stage in the current process (cwd = data directory). Returns (rows, seconds)."""
+    if stage == 'gen_prompts':
+        module = import_script('buildPrompts')
+        start = time.perf_counter()
+        module.gen_prompts('datasets/restaurant-menus.csv', 'datasets/restaurants.csv', 'prompts.csv')
+        return count_rows('datasets/restaurant-menus.csv'), time.perf_counter() - start
+
+    if stage in ('process_csv', 'process_csv_async'):
+        ensure_prompts(llm_rows)
+        module = import_script('batch_menu_run')
+        module.INPUT_FILE = 'prompts_llm.csv'
+        # Set when the parent starts several mock hosts.
+        backend = module.EndpointPool.from_specs()
+        start = time.perf_counter()
+        if stage == 'process_csv':
+            module.process_csv(use_cache=False, backend=backend, stream=stream, hedge=hedge)
+        else:
+            concurrency = backend.capacity if backend is not None else module.CONCURRENCY
+            module.process_csv_async(concurrency, use_cache=False, backend=backend, stream=stream, hedge=hedge)
+        return count_rows('prompts_llm.csv'), time.perf_counter() - start
+
+    if stage == 'process_data':
+        module = import_script('batch_gen_ingredients')
+        write_llm_menus(llm_rows, module.STATE)
+        module.MENU_FILE = 'datasets/restaurant-menus-llm.csv'
+        module.USE_CACHE = False
+        for path in (module.OUTPUT_FILE, module.OUTPUT_FILE + module.CHECKPOINT_SUFFIX):
+            if os.path.exists(path):
+                os.remove(path)
+        start = time.perf_counter()
+        module.process_data(module.EndpointPool.from_specs(), items_per_prompt, hedge)
+        return count_rows(module.OUTPUT_FILE), time.perf_counter() - start
+
+    if stage == 'create_nutrition_lookup_table':
+        module = import_script('score-restaurant-ingredients')
+        # Time the matching itself, not lookups of an earlier run's matches.
+        module.USE_MATCH_STORE = False
+        if not module.load_and_preprocess_data():
+            raise RuntimeError("could not load the synthetic USDA data")
+        df = pd.read_csv(SYNTHETIC_INGREDIENTS)
+        start = time.perf_counter()
+        module.create_nutrition_lookup_table(df)
+        return len(module.nutrition_lookup), time.perf_counter() - start
+
+    if stage == 'process_restaurants':
+        module = import_script('score-restaurant-ingredients')
+        module.USE_MATCH_STORE = False
+        start = time.perf_counter()
+        module.process_restaurants(SYNTHETIC_INGREDIENTS, 'restaurant_averages_with_score.csv')
+        return count_rows(SYNTHETIC_INGREDIENTS), time.perf_counter() - start
+
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def child_main(stage, data_dir, llm_rows, result_path, items_per_prompt=1, stream=False, hedge=False):
+    os.chdir(data_dir)
+    rows, seconds = run_stage(stage, llm_rows, items_per_prompt, stream, hedge)
+    with open(result_path, 'w') as f:
+        json.dump({
+            'rows': rows,
+            'seconds': round(seconds, 4),
+            'rows_per_sec': round(rows / seconds, 2) if seconds > 0 else None,
+            'peak_rss_mb': round(peak_rss_mb(resource.RUSAGE_SELF), 1),
+            'children_peak_rss_mb': round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+        }, f)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ensure_data(scale, data_dir):
+    try:
+        with open(os.path.join(data_dir, 'sizes.json')) as f:
+            if json.load(f)['scale'] == scale:
+                return
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+    generate(data_dir, scale)
+
+
+def run_benchmarks(scales, stages=STAGES, latency=0.05, parallel=4, llm_rows=LLM_ROWS,
+                   results_file=RESULTS_FILE, verbose=False, mock_hosts=1, token_latency=0.0, items_per_prompt=1,
+                   stream=False, ramble=0, stall_rate=0.0, error_rate=0.0, hedge=False):
+    """
+    Time each stage on synthetic data at every scale, each in a fresh process
+    so peak RSS is per stage, and append one JSON line per measurement to
+    results_file. With mock_hosts > 1 the LLM stages balance over that many
+    mock servers through OLLAMA_HOSTS. stall_rate and error_rate make the
+    mock servers stall or fail that share of chat requests.
+    """
+    servers = [MockOllamaServer(port=0, latency=latency, parallel=parallel, token_latency=token_latency, ramble=ramble,
+                                stall_rate=stall_rate, error_rate=error_rate)
+               for _ in range(max(1, mock_hosts))]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    env = dict(os.environ, OLLAMA_HOST=servers[0].url)
+    env.pop('OLLAMA_HOSTS', None)
+    if mock_hosts > 1:
+        env['OLLAMA_HOSTS'] = ','.join(f"{server.url}={parallel}" for server in servers)
+    commit = git_commit()
+    records = []
+
+    try:
+        for scale in scales:
+            data_dir = os.path.abspath(os.path.join(REPO_ROOT, DATA_DIR, str(scale)))
+            ensure_data(scale, data_dir)
+            for stage in stages:
+                print(f"[{scale:,}] {stage}...", end='', flush=True)
+                with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as tmp:
+                    result_path = tmp.name
+                command = [sys.executable, os.path.abspath(__file__), '--child', stage,
+                           '--data-dir', data_dir, '--llm-rows', str(llm_rows), '--result', result_path,
+                           '--items-per-prompt', str(items_per_prompt)] + (['--stream'] if stream else []) + (['--hedge'] if hedge else [])
+                completed = subprocess.run(command, env=env, stdout=None if verbose else subprocess.DEVNULL)
+                try:
+                    with open(result_path) as f:
+                        result = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    result = None
+                finally:
+                    if os.path.exists(result_path):
+                        os.remove(result_path)
+                if completed.returncode != 0 or result is None:
+                    print(f" failed (exit status {completed.returncode})")
+                    continue
+
+                record = {
+                    'timestamp': datetime.now().isoformat(timespec='seconds'),
+                    'commit': commit,
+                    'stage': stage,
+                    'scale': scale,
+                    'llm_latency': latency if stage in ('process_csv', 'process_csv_async', 'process_data') else None,
+                    'mock_hosts': mock_hosts,
+                    'token_latency': token_latency,
+                    'items_per_prompt': items_per_prompt if stage == 'process_data' else None,
+                    'stream': stream if stage in ('process_csv', 'process_csv_async') else None,
+                    'ramble': ramble,
+                    'stall_rate': stall_rate,
+                    'error_rate': error_rate,
+                    'hedge': hedge if stage in ('process_csv', 'process_csv_async', 'process_data') else None,
+                    'cpu_count': os.cpu_count(),
+                    'python': platform.python_version(),
+                    **result,
+                }
+                records.append(record)
+                with open(results_file, 'a') as f:
+                    f.write(json.dumps(record) + '\n')
+                print(f" {result['seconds']:.2f}s, {result['rows_per_sec']} rows/s, peak RSS {result['peak_rss_mb']} MB")
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages on synthetic data with a mock Ollama server.")
+    parser.add_argument('--scale', type=int, nargs='+', default=[10_000],
+                        help="Menu rows per dataset (e.g. 1000 100000 10000000)")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--latency', type=float, default=0.05, help="Mock model seconds per request")
+    parser.add_argument('--parallel', type=int, default=4, help="Requests each mock server processes at once")
+    parser.add_argument('--mock-hosts', type=int, default=1, help="Mock servers to balance the LLM stages over")
+    parser.add_argument('--token-latency', type=float, default=0.0, help="Mock model seconds per generated word")
+    parser.add_argument('--items-per-prompt', type=int, default=1, help="Menu items per request in process_data")
+    parser.add_argument('--stream', action='store_true', help="Score with streaming early stop in process_csv(_async)")
+    parser.add_argument('--ramble', type=int, default=0, help="Words the mock model adds after each score")
+    parser.add_argument('--stall-rate', type=float, default=0.0, help="Share of mock requests that stall")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of mock requests answered with a 500")
+    parser.add_argument('--hedge', action='store_true', help="Hedge slow LLM requests in the LLM stages")
+    parser.add_argument('--llm-rows', type=int, default=LLM_ROWS, help="Rows sent to the model by the LLM stages")
+    parser.add_argument('--results', default=RESULTS_FILE, help="JSON lines file results are appended to")
+    parser.add_argument('--verbose', action='store_true', help="Show the stages' own output")
+    parser.add_argument('--child', choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument('--data-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.child:
+        child_main(args.child, args.data_dir, args.llm_rows, args.result, args.items_per_prompt, args.stream, args.hedge)
+    else:
+        run_benchmarks(args.scale, args.stages, args.latency, args.parallel, args.llm_rows, args.results, args.verbose,
+                       args.mock_hosts, args.token_latency, args.items_per_prompt, args.stream, args.ramble,
+                       args.stall_rate, args.error_rate, args.hedge)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = 'benchmarks/data'
+# Rows written per to_csv call, so 10M-row files never sit in memory at once.
+WRITE_CHUNK = 1_000_000
+STATES = ['DC', 'VA', 'MD', 'NY', 'CA', 'TX', 'IL', 'WA']
+# Share of restaurants in the state the pipeline scripts filter on.
+DC_SHARE = 0.25
+SEED = 0
+
+FOODS = [
+    'Chicken', 'Beef', 'Pork', 'Salmon', 'Shrimp', 'Tofu', 'Egg', 'Rice', 'Noodles', 'Bread',
+    'Tortilla', 'Cheese', 'Lettuce', 'Tomato', 'Onion', 'Garlic', 'Pepper', 'Potato', 'Beans',
+    'Butter', 'Cream', 'Soy sauce', 'Olive oil', 'Basil', 'Mushroom', 'Spinach', 'Avocado', 'Corn',
+    'Turkey', 'Lamb', 'Tuna', 'Yogurt', 'Apple', 'Banana', 'Carrot', 'Broccoli', 'Cabbage', 'Peanut',
+]
+PARTS = ['breast', 'thigh', 'ground', 'whole', 'sliced', 'fillet', 'leaves', 'kernels', 'paste']
+PREPARATIONS = ['raw', 'cooked', 'roasted', 'fried', 'boiled', 'grilled', 'canned', 'frozen', 'dried', 'steamed']
+CATEGORIES = [
+    'Appetizers', 'Entrees', 'Sides', 'Desserts', 'Beverages', 'Salads', 'Soups', 'Sandwiches',
+    'Burgers', 'Pizza', 'Pasta', 'Bowls', 'Breakfast', 'Kids Menu', 'Specials', 'Combos',
+]
+DISHES = ['Bowl', 'Wrap', 'Plate', 'Sandwich', 'Salad', 'Soup', 'Burger', 'Taco', 'Curry', 'Platter']
+NUTRIENTS = [
+    (1003, 'Protein', 'G'),
+    (1004, 'Total lipid (fat)', 'G'),
+    (1005, 'Carbohydrate, by difference', 'G'),
+    (1008, 'Energy', 'KCAL'),
+    (1062, 'Energy', 'kJ'),
+    (1079, 'Fiber, total dietary', 'G'),
+    (1087, 'Calcium, Ca', 'MG'),
+    (1093, 'Sodium, Na', 'MG'),
+    (2000, 'Sugars, total including NLEA', 'G'),
+]
+
+
+def scaled_sizes(scale):
+    """Row counts for every file, derived from the number of menu rows."""
+    return {
+        'menus': scale,
+        'restaurants': max(scale // 40, 10),
+        'foods': max(scale // 20, 50),
+        # About 12 nutrient rows per food, like the FDC foundation/SR data.
+        'food_nutrients': max(scale // 20, 50) * 12,
+        'ingredient_rows': max(scale // 10, 100),
+    }
+
+
+def write_chunked(path, total, make_chunk):
+    """Write make_chunk(start, stop) frames to path in WRITE_CHUNK row pieces."""
+    for start in range(0, total, WRITE_CHUNK):
+        frame = make_chunk(start, min(start + WRITE_CHUNK, total))
+        frame.to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+
+
+def pick(rng, choices, size):
+    return np.asarray(choices, dtype=object)[rng.integers(0, len(choices), size)]
+
+
+def food_descriptions(rng, size):
+    """FDC-style 'Food, part, preparation' descriptions; part and preparation are often omitted."""
+    parts = np.where(rng.random(size) < 0.5, '', pick(rng, PARTS, size))
+    preparations = np.where(rng.random(size) < 0.3, '', pick(rng, PREPARATIONS, size))
+    descriptions = (pick(rng, FOODS, size) + np.where(parts == '', '', ', ' + parts)
+                    + np.where(preparations == '', '', ', ' + preparations))
+    return descriptions.astype(str)
+
+
+def ingredient_lists(rng, size):
+    """Comma-separated lists of 3-8 lower-case ingredient names, some misspelled or unmatched."""
+    words = np.char.lower(np.asarray(FOODS, dtype=str))
+    counts = rng.integers(3, 9, size)
+    picks = pick(rng, list(words), counts.sum()).astype(str)
+    typo = rng.random(len(picks)) < 0.1
+    picks[typo] = np.char.add(picks[typo], 's')
+    unknown = rng.random(len(picks)) < 0.05
+    picks[unknown] = 'house special seasoning'
+    bounds = np.r_[0, np.cumsum(counts)]
+    return [', '.join(picks[bounds[i]:bounds[i + 1]]) for i in range(size)]
+
+
+def generate(output_dir=DATA_DIR, scale=10_000, seed=SEED):
+    """
+    Write synthetic restaurants.csv, restaurant-menus.csv, food_data/*.csv and
+    an ingredient list file laid out like the real datasets/ directory.
+    """
+    sizes = scaled_sizes(scale)
+    rng = np.random.default_rng(seed)
+    datasets_dir = os.path.join(output_dir, 'datasets')
+    food_dir = os.path.join(datasets_dir, 'food_data')
+    os.makedirs(food_dir, exist_ok=True)
+    print(f"Generating synthetic data at scale {scale:,} in {output_dir}...")
+
+    n_restaurants = sizes['restaurants']
+    states = np.where(rng.random(n_restaurants) < DC_SHARE, 'DC', pick(rng, STATES[1:], n_restaurants))
+    zips = rng.integers(10000, 99999, n_restaurants).astype(str)
+    restaurants = pd.DataFrame({
+        'id': np.arange(1, n_restaurants + 1),
+        'position': rng.integers(1, 50, n_restaurants),
+        'name': [f"Restaurant {i}" for i in range(1, n_restaurants + 1)],
+        'score': np.round(rng.uniform(3.0, 5.0, n_restaurants), 1),
+        'ratings': rng.integers(0, 500, n_restaurants),
+        'category': pick(rng, ['American', 'Asian', 'Mexican', 'Italian', 'Healthy'], n_restaurants),
+        'price_range': pick(rng, ['$', '$$', '$$$', ''], n_restaurants),
+        'full_address': [f"{i} Main St, City, {state}, {zip_code}" for i, state, zip_code in zip(range(n_restaurants), states, zips)],
+        'zip_code': zips,
+        'lat': rng.uniform(25, 48, n_restaurants).round(6),
+        'lng': rng.uniform(-124, -70, n_restaurants).round(6),
+    })
+    restaurants.to_csv(os.path.join(datasets_dir, 'restaurants.csv'), index=False)
+
+    def menu_chunk(start, stop):
+        size = stop - start
+        prices = rng.uniform(1.0, 40.0, size).round(2)
+        return pd.DataFrame({
+            'restaurant_id': np.sort(rng.integers(1, n_restaurants + 1, size)),
+            'category': pick(rng, CATEGORIES, size),
+            'name': pick(rng, FOODS, size) + ' ' + pick(rng, DISHES, size),
+            'description': pick(rng, PREPARATIONS, size) + ' with ' + np.char.lower(pick(rng, FOODS, size).astype(str)),
+            'price': [f"{price:.2f} USD" for price in prices],
+        })
+    write_chunked(os.path.join(datasets_dir, 'restaurant-menus.csv'), sizes['menus'], menu_chunk)
+
+    n_foods = sizes['foods']
+    foods = pd.DataFrame({
+        'fdc_id': np.arange(100000, 100000 + n_foods),
+        'data_type': pick(rng, ['sr_legacy_food', 'foundation_food', 'branded_food'], n_foods),
+        'description': food_descriptions(rng, n_foods),
+        'food_category_id': rng.integers(1, 25, n_foods),
+        'publication_date': '2019-04-01',
+    })
+    foods.to_csv(os.path.join(food_dir, 'food.csv'), index=False)
+
+    pd.DataFrame(NUTRIENTS, columns=['id', 'name', 'unit_name']).assign(
+        nutrient_nbr=lambda df: df['id'] - 700, rank=lambda df: np.arange(len(df)) * 100,
+    ).to_csv(os.path.join(food_dir, 'nutrient.csv'), index=False)
+
+    nutrient_ids = np.array([nutrient[0] for nutrient in NUTRIENTS])
+
+    def food_nutrient_chunk(start, stop):
+        size = stop - start
+        amounts = rng.gamma(2.0, 50.0, size).round(3)
+        amounts[rng.random(size) < 0.02] = np.nan
+        return pd.DataFrame({
+            'id': np.arange(start + 1, stop + 1),
+            'fdc_id': 100000 + np.arange(start, stop) // 12 % n_foods,
+            'nutrient_id': nutrient_ids[rng.integers(0, len(nutrient_ids), size)],
+            'amount': amounts,
+        })
+    write_chunked(os.path.join(food_dir, 'food_nutrient.csv'), sizes['food_nutrients'], food_nutrient_chunk)
+
+    n_ingredient_rows = sizes['ingredient_rows']
+    pd.DataFrame({
+        'restaurant_id': np.sort(rng.integers(1, n_restaurants + 1, n_ingredient_rows)),
+        'name_menu': pick(rng, FOODS, n_ingredient_rows) + ' ' + pick(rng, DISHES, n_ingredient_rows),
+        'ingredients': ingredient_lists(rng, n_ingredient_rows),
+    }).to_csv(os.path.join(output_dir, 'restaurants_with_ingredients_synthetic.csv'), index=False)
+
+    with open(os.path.join(output_dir, 'sizes.json'), 'w') as f:
+        json.dump({'scale': scale, 'seed': seed, **sizes}, f, indent=2)
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic Uber Eats and FoodData Central datasets for benchmarks.")
+    parser.add_argument('--scale', type=int, default=10_000, help="Rows in restaurant-menus.csv; other files scale with it")
+    parser.add_argument('--output-dir', default=None, help="Directory to write (default: benchmarks/data/<scale>)")
+    parser.add_argument('--seed', type=int, default=SEED)
+
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or os.path.join(DATA_DIR, str(args.scale))
+    sizes = generate(output_dir, args.scale, args.seed)
+    print(json.dumps(sizes, indent=2))
+
+if __name__ == "__main__":
+    main()
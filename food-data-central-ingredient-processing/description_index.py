@@ -0,0 +1,219 @@
+import hashlib
+import os
+import shutil
+from collections import Counter, defaultdict
+from typing import List, Optional, Tuple
+
+import numpy as np
+from fuzzywuzzy import fuzz
+from fuzzywuzzy import utils
+
+from shared_arrays import StringArray, load_arrays, save_arrays
+
+INDEX_PATH = 'datasets/food_data/description_index'
+NGRAM_SIZE = 3
+# Characters counted individually by the character-bag filter; everything else shares one slot.
+BAG_ALPHABET = 'abcdefghijklmnopqrstuvwxyz0123456789 '
+_BAG_SLOTS = {c: i for i, c in enumerate(BAG_ALPHABET)}
+_ARRAY_NAMES = [
+    'description_buffer', 'description_offsets', 'processed_buffer', 'processed_offsets',
+    'lengths', 'by_length', 'bags', 'grams', 'gram_starts', 'posting_ids', 'posting_counts',
+]
+
+
+def _ngram_counts(s: str) -> Counter:
+    return Counter(s[i:i + NGRAM_SIZE] for i in range(len(s) - NGRAM_SIZE + 1))
+
+
+def _char_bag(s: str) -> np.ndarray:
+    bag = np.zeros(len(BAG_ALPHABET) + 1, dtype=np.uint16)
+    for c in s:
+        bag[_BAG_SLOTS.get(c, len(BAG_ALPHABET))] += 1
+    return bag
+
+
+def descriptions_digest(descriptions: List[str]) -> str:
+    digest = hashlib.sha256()
+    for description in descriptions:
+        digest.update(description.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class DescriptionIndex:
+    """
+    Character n-gram inverted index over FDC food descriptions.
+
+    best_match() returns exactly what fuzzywuzzy's
+    process.extractOne(query, descriptions, scorer=fuzz.ratio) would return
+    whenever that match scores at or above the threshold, but only rescores a
+    pruned candidate set. The filters are all necessary conditions for
+    fuzz.ratio >= threshold, so nothing that could reach the threshold is
+    dropped:
+
+    - length: ratio <= 2 * min(la, lb) / (la + lb)
+    - character bag: ratio <= 2 * |common characters| / (la + lb)
+    - n-gram count (q-gram lemma): strings within edit distance k share at
+      least max(la, lb) - q + 1 - k * q n-grams
+
+    Descriptions are compared after fuzzywuzzy's default full_process, as
+    extractOne does. All state is held in NumPy arrays so a saved index can be
+    memory-mapped by many processes at once.
+    """
+
+    def __init__(self, arrays: dict, digest: str):
+        self.digest = digest
+        self.descriptions = StringArray(arrays['description_buffer'], arrays['description_offsets'])
+        self.processed = StringArray(arrays['processed_buffer'], arrays['processed_offsets'])
+        self.lengths = arrays['lengths']
+        self.by_length = arrays['by_length']
+        self.sorted_lengths = self.lengths[self.by_length]
+        self.bags = arrays['bags']
+        # Sorted n-grams; postings for grams[i] are posting_*[gram_starts[i]:gram_starts[i + 1]].
+        self.grams = arrays['grams']
+        self.gram_starts = arrays['gram_starts']
+        self.posting_ids = arrays['posting_ids']
+        self.posting_counts = arrays['posting_counts']
+
+    @classmethod
+    def build(cls, descriptions: List[str]) -> 'DescriptionIndex':
+        processed = [utils.full_process(d) for d in descriptions]
+        lengths = np.array([len(p) for p in processed], dtype=np.int32)
+        bags = np.vstack([_char_bag(p) for p in processed]) if processed \
+            else np.zeros((0, len(BAG_ALPHABET) + 1), dtype=np.uint16)
+
+        postings = defaultdict(list)
+        for doc_id, text in enumerate(processed):
+            for gram, count in _ngram_counts(text).items():
+                postings[gram].append((doc_id, count))
+
+        grams = sorted(postings)
+        gram_starts = np.zeros(len(grams) + 1, dtype=np.int64)
+        np.cumsum([len(postings[g]) for g in grams], out=gram_starts[1:])
+        ids = np.fromiter((doc_id for g in grams for doc_id, _ in postings[g]), dtype=np.int32, count=gram_starts[-1])
+        counts = np.fromiter((count for g in grams for _, count in postings[g]), dtype=np.int32, count=gram_starts[-1])
+
+        description_strings = StringArray.from_list(descriptions)
+        processed_strings = StringArray.from_list(processed)
+        arrays = {
+            'description_buffer': description_strings.buffer,
+            'description_offsets': description_strings.offsets,
+            'processed_buffer': processed_strings.buffer,
+            'processed_offsets': processed_strings.offsets,
+            'lengths': lengths,
+            'by_length': np.argsort(lengths, kind='stable').astype(np.int32),
+            'bags': bags,
+            'grams': np.array(grams, dtype=f'<U{NGRAM_SIZE}'),
+            'gram_starts': gram_starts,
+            'posting_ids': ids,
+            'posting_counts': counts,
+        }
+        return cls(arrays, descriptions_digest(descriptions))
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def _postings(self, gram: str):
+        i = np.searchsorted(self.grams, gram)
+        if i >= len(self.grams) or self.grams[i] != gram:
+            return None
+        start, end = self.gram_starts[i], self.gram_starts[i + 1]
+        return self.posting_ids[start:end], self.posting_counts[start:end]
+
+    def candidates(self, processed_query: str, threshold: float) -> np.ndarray:
+        """Ids of descriptions that could score >= threshold, in ascending order."""
+        la = len(processed_query)
+        # fuzz.ratio rounds 100 * ratio to the nearest integer, so any score >= threshold
+        # needs ratio >= (threshold - 0.5) / 100.
+        r_min = (threshold - 0.5) / 100.0
+        if r_min <= 0:
+            return np.arange(len(self), dtype=np.int32)
+
+        lb_min = int(np.ceil(r_min * la / (2.0 - r_min) - 1e-9))
+        lb_max = int(np.floor(la * (2.0 - r_min) / r_min + 1e-9))
+        lo = np.searchsorted(self.sorted_lengths, lb_min, side='left')
+        hi = np.searchsorted(self.sorted_lengths, lb_max, side='right')
+        cand = np.asarray(self.by_length[lo:hi])
+        if cand.size == 0:
+            return cand
+        lb = self.lengths[cand]
+        lensum = la + lb
+
+        # Upper bound on the indel distance for a candidate reaching r_min.
+        max_dist = np.floor((1.0 - r_min) * lensum + 1e-9)
+        min_shared = np.maximum(la, lb) - NGRAM_SIZE + 1 - max_dist * NGRAM_SIZE
+        if (min_shared > 0).any():
+            shared = np.zeros(len(self), dtype=np.int32)
+            for gram, q_count in _ngram_counts(processed_query).items():
+                postings = self._postings(gram)
+                if postings is None:
+                    continue
+                ids, counts = postings
+                shared[ids] += np.minimum(counts, q_count)
+            keep = (min_shared <= 0) | (shared[cand] >= min_shared)
+            cand, lb, lensum = cand[keep], lb[keep], lensum[keep]
+
+        common = np.minimum(self.bags[cand], _char_bag(processed_query)).sum(axis=1)
+        keep = 2.0 * common >= r_min * lensum - 1e-9
+        return np.sort(cand[keep])
+
+    def best_match(self, query: str, threshold: float) -> Optional[Tuple[str, int, int]]:
+        """
+        Return (description, score, position) of the first highest-scoring
+        description, or None when no description reaches threshold.
+        """
+        processed_query = utils.full_process(query)
+        best_id, best_score = -1, -1
+        for doc_id in self.candidates(processed_query, threshold):
+            score = fuzz.ratio(processed_query, self.processed[doc_id])
+            if score > best_score:
+                best_id, best_score = int(doc_id), score
+
+        if best_id < 0 or best_score < threshold:
+            return None
+        return self.descriptions[best_id], best_score, best_id
+
+    def save(self, path: str = INDEX_PATH):
+        tmp_path = path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        arrays = {
+            'description_buffer': self.descriptions.buffer,
+            'description_offsets': self.descriptions.offsets,
+            'processed_buffer': self.processed.buffer,
+            'processed_offsets': self.processed.offsets,
+            'lengths': self.lengths,
+            'by_length': self.by_length,
+            'bags': self.bags,
+            'grams': self.grams,
+            'gram_starts': self.gram_starts,
+            'posting_ids': self.posting_ids,
+            'posting_counts': self.posting_counts,
+        }
+        save_arrays(tmp_path, arrays, {'digest': self.digest, 'ngram_size': NGRAM_SIZE})
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = INDEX_PATH, mmap: bool = True) -> 'DescriptionIndex':
+        arrays, meta = load_arrays(path, _ARRAY_NAMES, mmap=mmap)
+        if meta.get('ngram_size') != NGRAM_SIZE:
+            raise ValueError(f"{path} was built with n-gram size {meta.get('ngram_size')}")
+        return cls(arrays, meta['digest'])
+
+
+def load_or_build_index(descriptions: List[str], path: str = INDEX_PATH) -> DescriptionIndex:
+    """
+    Load the persisted index if it was built from the same descriptions,
+    otherwise build and save a new one.
+    """
+    digest = descriptions_digest(descriptions)
+    try:
+        index = DescriptionIndex.load(path)
+        if index.digest == digest:
+            return index
+    except (FileNotFoundError, ValueError, KeyError, OSError):
+        pass
+
+    print(f"Building description index for {len(descriptions)} foods...")
+    DescriptionIndex.build(descriptions).save(path)
+    return DescriptionIndex.load(path)
@@ -0,0 +1,180 @@
+import argparse
+import os
+import shutil
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from description_index import descriptions_digest
+from shared_arrays import StringArray, load_arrays, save_arrays
+
+EMBEDDING_INDEX_PATH = 'datasets/food_data/embedding_index'
+EMBEDDING_MODEL = 'nomic-embed-text'
+# Texts sent to the embedding model per request.
+EMBED_BATCH = 256
+# Upper bound on the query x description similarity block held at once.
+SCORE_MEMORY_BYTES = 64 * 1024 * 1024
+_ARRAY_NAMES = ['description_buffer', 'description_offsets', 'positions', 'vectors']
+
+# Maps a batch of texts to one embedding row per text.
+EmbedFn = Callable[[List[str]], np.ndarray]
+
+
+def ollama_embedder(model: str = EMBEDDING_MODEL, host: Optional[str] = None) -> EmbedFn:
+    """Embedding function backed by Ollama's /api/embed (OLLAMA_HOST unless host is given)."""
+    import ollama
+
+    client = ollama.Client(host=host) if host else ollama.Client()
+
+    def embed(texts: List[str]) -> np.ndarray:
+        return np.asarray(client.embed(model=model, input=texts)['embeddings'], dtype=np.float32)
+    return embed
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def embed_all(texts: List[str], embed_fn: EmbedFn, batch_size: int = EMBED_BATCH, label: str = '') -> np.ndarray:
+    parts = []
+    for start in range(0, len(texts), batch_size):
+        parts.append(normalize_rows(embed_fn(texts[start:start + batch_size])))
+        if label and (start // batch_size) % 50 == 49:
+            print(f"Embedded {start + batch_size:,}/{len(texts):,} {label}")
+    return np.vstack(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+
+
+class EmbeddingIndex:
+    """
+    FDC food descriptions embedded once and stored as an L2-normalized
+    float32 matrix, one row per distinct non-empty description.
+
+    best_match()/best_matches() follow DescriptionIndex's contract:
+    (description, score, position) of the first best description, or None
+    below threshold, where score is the cosine similarity scaled to 0-100 and
+    rounded like fuzz.ratio. Queries are embedded in batches and scored with
+    blocked matrix products, so the matrix can stay memory-mapped.
+    """
+
+    def __init__(self, arrays: dict, digest: str, model: str, embed_fn: Optional[EmbedFn] = None):
+        self.digest = digest
+        self.model = model
+        self.descriptions = StringArray(arrays['description_buffer'], arrays['description_offsets'])
+        # Position in the full description list of each embedded (distinct) description.
+        self.positions = arrays['positions']
+        self.vectors = arrays['vectors']
+        self.embed_fn = embed_fn
+
+    @classmethod
+    def build(cls, descriptions: List[str], embed_fn: EmbedFn, model: str = EMBEDDING_MODEL) -> 'EmbeddingIndex':
+        first_position = {}
+        for position, description in enumerate(descriptions):
+            if description and description not in first_position:
+                first_position[description] = position
+        distinct = list(first_position)
+        print(f"Embedding {len(distinct):,} food descriptions with {model}...")
+        vectors = embed_all(distinct, embed_fn, label='descriptions')
+        strings = StringArray.from_list(descriptions)
+        arrays = {
+            'description_buffer': strings.buffer,
+            'description_offsets': strings.offsets,
+            'positions': np.fromiter(first_position.values(), dtype=np.int64, count=len(distinct)),
+            'vectors': vectors,
+        }
+        return cls(arrays, descriptions_digest(descriptions), model, embed_fn)
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def best_matches(self, queries: List[str], threshold: float) -> List[Optional[Tuple[str, int, int]]]:
+        if self.embed_fn is None:
+            raise RuntimeError("EmbeddingIndex has no embedding function for queries")
+        # Empty names never match, as with fuzz.ratio.
+        asked = [i for i, query in enumerate(queries) if query]
+        results: List[Optional[Tuple[str, int, int]]] = [None] * len(queries)
+        if len(self) == 0 or not asked:
+            return results
+
+        query_vectors = embed_all([queries[i] for i in asked], self.embed_fn)
+        best_rows = np.zeros(len(asked), dtype=np.int64)
+        best_scores = np.full(len(asked), -np.inf, dtype=np.float32)
+        block = max(1, SCORE_MEMORY_BYTES // (4 * len(asked)))
+        for start in range(0, len(self), block):
+            similarities = query_vectors @ np.asarray(self.vectors[start:start + block]).T
+            rows = similarities.argmax(axis=1)
+            scores = similarities[np.arange(len(asked)), rows]
+            # Strictly greater, so ties keep the earliest description like extractOne.
+            better = scores > best_scores
+            best_rows[better] = rows[better] + start
+            best_scores[better] = scores[better]
+
+        for i, row, similarity in zip(asked, best_rows, best_scores):
+            score = int(round(100 * max(float(similarity), 0.0)))
+            if score >= threshold:
+                position = int(self.positions[row])
+                results[i] = (self.descriptions[position], score, position)
+        return results
+
+    def best_match(self, query: str, threshold: float) -> Optional[Tuple[str, int, int]]:
+        return self.best_matches([query], threshold)[0]
+
+    def save(self, path: str = EMBEDDING_INDEX_PATH):
+        tmp_path = path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        arrays = {
+            'description_buffer': self.descriptions.buffer,
+            'description_offsets': self.descriptions.offsets,
+            'positions': self.positions,
+            'vectors': self.vectors,
+        }
+        save_arrays(tmp_path, arrays, {'digest': self.digest, 'model': self.model})
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = EMBEDDING_INDEX_PATH, embed_fn: Optional[EmbedFn] = None, mmap: bool = True) -> 'EmbeddingIndex':
+        arrays, meta = load_arrays(path, _ARRAY_NAMES, mmap=mmap)
+        return cls(arrays, meta['digest'], meta['model'], embed_fn)
+
+
+def load_or_build_embedding_index(descriptions: List[str], model: str = EMBEDDING_MODEL,
+                                  embed_fn: Optional[EmbedFn] = None,
+                                  path: str = EMBEDDING_INDEX_PATH) -> EmbeddingIndex:
+    """
+    Load the persisted embeddings if they were built from the same
+    descriptions with the same model, otherwise embed and save them.
+    """
+    embed_fn = embed_fn or ollama_embedder(model)
+    digest = descriptions_digest(descriptions)
+    try:
+        index = EmbeddingIndex.load(path, embed_fn)
+        if index.digest == digest and index.model == model:
+            return index
+    except (FileNotFoundError, ValueError, KeyError, OSError):
+        pass
+
+    EmbeddingIndex.build(descriptions, embed_fn, model).save(path)
+    return EmbeddingIndex.load(path, embed_fn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the FDC description embeddings and try queries against them.")
+    parser.add_argument('queries', nargs='*', help="Ingredient names to match")
+    parser.add_argument('--food', default='datasets/food_data/food.csv', help="Path to food.csv")
+    parser.add_argument('--model', default=EMBEDDING_MODEL, help="Ollama embedding model")
+    parser.add_argument('--path', default=EMBEDDING_INDEX_PATH, help="Directory for the stored embeddings")
+    parser.add_argument('--threshold', type=float, default=0, help="Minimum score (cosine similarity x 100)")
+
+    args = parser.parse_args()
+
+    from fdc_cache import load_fdc_tables
+    food_df, _, _ = load_fdc_tables(args.food)
+    index = load_or_build_embedding_index(food_df['description'].tolist(), args.model, path=args.path)
+    print(f"{len(index):,} descriptions embedded with {index.model} ({index.vectors.shape[1]} dimensions)")
+    for query, match in zip(args.queries, index.best_matches(args.queries, args.threshold)):
+        print(f"{query!r} -> {match}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import argparse
+import os
+import shutil
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from shared_arrays import StringArray, load_arrays, save_arrays
+
+FOOD_CSV_PATH = 'datasets/food_data/food.csv'
+NUTRIENT_CSV_PATH = 'datasets/food_data/nutrient.csv'
+FOOD_NUTRIENT_CSV_PATH = 'datasets/food_data/food_nutrient.csv'
+CACHE_DIR = 'datasets/food_data/cache'
+# Bump when the cached layout changes so stale caches are rebuilt.
+CACHE_VERSION = 1
+
+_ARRAY_NAMES = [
+    'food_fdc_id', 'food_description_buffer', 'food_description_offsets',
+    'nutrient_id', 'nutrient_name_buffer', 'nutrient_name_offsets',
+    'nutrient_unit_buffer', 'nutrient_unit_offsets',
+    'food_nutrient_fdc_id', 'food_nutrient_nutrient_id', 'food_nutrient_amount',
+]
+
+
+def _source_signature(paths: Dict[str, str]) -> Dict[str, list]:
+    signature = {}
+    for key, path in paths.items():
+        stat = os.stat(path)
+        signature[key] = [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+    return signature
+
+
+def _read_columns(path: str, text_columns: List[str], numeric_columns: List[str]) -> pd.DataFrame:
+    """
+    Read only the named columns (matched case/space-insensitively). Text is
+    read as str and numeric columns as float64; rows missing a numeric id are
+    dropped.
+    """
+    wanted = set(text_columns) | set(numeric_columns)
+    df = pd.read_csv(path, usecols=lambda c: c.lower().strip() in wanted, dtype=str)
+    df.columns = df.columns.str.lower().str.strip()
+    for column in numeric_columns:
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    return df
+
+
+def convert_csvs(food_csv: str, nutrient_csv: str, food_nutrient_csv: str, cache_dir: str = CACHE_DIR):
+    """One-time conversion of the USDA CSVs into pruned, typed .npy columns."""
+    print("Converting USDA CSVs to columnar cache...")
+    signature = _source_signature({'food': food_csv, 'nutrient': nutrient_csv, 'food_nutrient': food_nutrient_csv})
+
+    food = _read_columns(food_csv, ['description'], ['fdc_id']).dropna(subset=['fdc_id'])
+    descriptions = StringArray.from_list(food['description'].fillna('').astype(str).tolist())
+
+    nutrient = _read_columns(nutrient_csv, ['name', 'unit_name'], ['id']).dropna(subset=['id'])
+    names = StringArray.from_list(nutrient['name'].fillna('').tolist())
+    units = StringArray.from_list(nutrient['unit_name'].fillna('').tolist())
+
+    food_nutrient = pd.read_csv(
+        food_nutrient_csv,
+        usecols=lambda c: c.lower().strip() in {'fdc_id', 'nutrient_id', 'amount'},
+        dtype='float64',
+    )
+    food_nutrient.columns = food_nutrient.columns.str.lower().str.strip()
+    food_nutrient = food_nutrient.dropna(subset=['fdc_id', 'nutrient_id'])
+
+    arrays = {
+        'food_fdc_id': food['fdc_id'].astype(np.int32).to_numpy(),
+        'food_description_buffer': descriptions.buffer,
+        'food_description_offsets': descriptions.offsets,
+        'nutrient_id': nutrient['id'].astype(np.int32).to_numpy(),
+        'nutrient_name_buffer': names.buffer,
+        'nutrient_name_offsets': names.offsets,
+        'nutrient_unit_buffer': units.buffer,
+        'nutrient_unit_offsets': units.offsets,
+        'food_nutrient_fdc_id': food_nutrient['fdc_id'].astype(np.int32).to_numpy(),
+        'food_nutrient_nutrient_id': food_nutrient['nutrient_id'].astype(np.int32).to_numpy(),
+        # Amounts stay float64 so nutrient means match the CSV values exactly.
+        'food_nutrient_amount': food_nutrient['amount'].to_numpy(dtype=np.float64),
+    }
+    tmp_dir = cache_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    save_arrays(tmp_dir, arrays, {'version': CACHE_VERSION, 'sources': signature})
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+
+
+def cache_is_fresh(food_csv: str, nutrient_csv: str, food_nutrient_csv: str, cache_dir: str = CACHE_DIR) -> bool:
+    try:
+        _, meta = load_arrays(cache_dir, [], mmap=True)
+    except (FileNotFoundError, ValueError):
+        return False
+    signature = _source_signature({'food': food_csv, 'nutrient': nutrient_csv, 'food_nutrient': food_nutrient_csv})
+    return meta.get('version') == CACHE_VERSION and meta.get('sources') == signature
+
+
+def load_fdc_tables(food_csv: str = FOOD_CSV_PATH, nutrient_csv: str = NUTRIENT_CSV_PATH,
+                    food_nutrient_csv: str = FOOD_NUTRIENT_CSV_PATH,
+                    cache_dir: str = CACHE_DIR) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Return (food_df, nutrient_df, food_nutrient_df) with only the columns the
+    scoring scripts use:
+
+    - food_df: fdc_id, description (missing descriptions as '')
+    - nutrient_df: nutrient_id, name, unit_name
+    - food_nutrient_df: fdc_id, nutrient_id, amount
+
+    The cache is rebuilt whenever a source CSV's size or mtime changes.
+    Raises FileNotFoundError if a source CSV is missing.
+    """
+    if not cache_is_fresh(food_csv, nutrient_csv, food_nutrient_csv, cache_dir):
+        convert_csvs(food_csv, nutrient_csv, food_nutrient_csv, cache_dir)
+
+    arrays, _ = load_arrays(cache_dir, _ARRAY_NAMES, mmap=True)
+    food_df = pd.DataFrame({
+        'fdc_id': arrays['food_fdc_id'].astype(np.int64),
+        'description': StringArray(arrays['food_description_buffer'], arrays['food_description_offsets']).tolist(),
+    })
+    nutrient_df = pd.DataFrame({
+        'nutrient_id': arrays['nutrient_id'].astype(np.int64),
+        'name': StringArray(arrays['nutrient_name_buffer'], arrays['nutrient_name_offsets']).tolist(),
+        'unit_name': StringArray(arrays['nutrient_unit_buffer'], arrays['nutrient_unit_offsets']).tolist(),
+    })
+    food_nutrient_df = pd.DataFrame({
+        'fdc_id': np.asarray(arrays['food_nutrient_fdc_id']),
+        'nutrient_id': np.asarray(arrays['food_nutrient_nutrient_id']),
+        'amount': np.asarray(arrays['food_nutrient_amount']),
+    })
+    return food_df, nutrient_df, food_nutrient_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the USDA FoodData Central CSVs into a columnar cache.")
+    parser.add_argument('--food', default=FOOD_CSV_PATH, help="Path to food.csv")
+    parser.add_argument('--nutrient', default=NUTRIENT_CSV_PATH, help="Path to nutrient.csv")
+    parser.add_argument('--food-nutrient', default=FOOD_NUTRIENT_CSV_PATH, help="Path to food_nutrient.csv")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="Directory for the cached columns")
+
+    args = parser.parse_args()
+
+    convert_csvs(args.food, args.nutrient, args.food_nutrient, args.cache_dir)
+    print(f"Cache written to {args.cache_dir}")
+
+if __name__ == "__main__":
+    main()
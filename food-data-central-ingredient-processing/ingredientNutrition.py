@@ -1,48 +1,50 @@
+import numpy as np
 import pandas as pd
 from rapidfuzz import fuzz
 from rapidfuzz import process
 from typing import List, Dict, Any, Optional
+from fdc_cache import load_fdc_tables
+from embedding_index import EMBEDDING_MODEL, EmbeddingIndex, load_or_build_embedding_index
+from nutrient_matrix import NutrientMatrix
 
 FOOD_CSV_PATH = 'datasets/food_data/food.csv'
 NUTRIENT_CSV_PATH = 'datasets/food_data/nutrient.csv'
 FOOD_NUTRIENT_CSV_PATH = 'datasets/food_data/food_nutrient.csv'
 
 FUZZY_MATCH_THRESHOLD = 75 
+# Upper bound on the score matrix held at once by get_nutrition_info_batch.
+BATCH_SCORE_MEMORY_BYTES = 256 * 1024 * 1024
+# 'fuzzy' scores names with fuzz.ratio; 'embedding' compares EMBEDDING_MODEL vectors (see embedding_index.py).
+MATCHER = 'fuzzy'
+# Cosine similarity x 100 an embedding match needs.
+EMBEDDING_MATCH_THRESHOLD = 75
 
 food_df: Optional[pd.DataFrame] = None
-merged_df: Optional[pd.DataFrame] = None
+nutrient_matrix: Optional[NutrientMatrix] = None
 FOOD_DESCRIPTIONS: Optional[List[str]] = None 
+DESCRIPTION_TO_FDC_ID: Optional[Dict[str, int]] = None
+embedding_index: Optional[EmbeddingIndex] = None
 
 
 def load_and_preprocess_data():
     """
     Loads, cleans, and merges the necessary CSV data into global DataFrames.
-    Also prepares the global list for fuzzy search.
+    Also prepares the global list for fuzzy search, or the description
+    embeddings when MATCHER is 'embedding'.
     Returns True if successful, False otherwise.
     """
-    global food_df, merged_df, FOOD_DESCRIPTIONS
+    global food_df, nutrient_matrix, FOOD_DESCRIPTIONS, DESCRIPTION_TO_FDC_ID, embedding_index
     try:
         print("Loading data...")
-        food_data = pd.read_csv(FOOD_CSV_PATH)
-        nutrient_data = pd.read_csv(NUTRIENT_CSV_PATH)
-        food_nutrient_data = pd.read_csv(FOOD_NUTRIENT_CSV_PATH)
+        food_df, nutrient_data, food_nutrient_data = load_fdc_tables(FOOD_CSV_PATH, NUTRIENT_CSV_PATH, FOOD_NUTRIENT_CSV_PATH)
 
-        food_data.columns = food_data.columns.str.lower().str.strip()
-        nutrient_data.columns = nutrient_data.columns.str.lower().str.strip()
-        food_nutrient_data.columns = food_nutrient_data.columns.str.lower().str.strip()
-
-        food_df = food_data[['fdc_id', 'description']].copy()
-        
-        food_df['description'] = food_df['description'].fillna('').astype(str)
-        
-        nutrient_data = nutrient_data[['id', 'name', 'unit_name']].copy()
-        nutrient_data.rename(columns={'id': 'nutrient_id'}, inplace=True)
-        
-        food_nutrient_data = food_nutrient_data[['fdc_id', 'nutrient_id', 'amount']].copy()
-
-        merged_df = food_nutrient_data.merge(nutrient_data, on='nutrient_id', how='left')
+        nutrient_matrix = NutrientMatrix.from_frames(food_nutrient_data, nutrient_data)
         
         FOOD_DESCRIPTIONS = food_df['description'].tolist()
+        # Duplicate descriptions resolve to the first food carrying them.
+        DESCRIPTION_TO_FDC_ID = food_df.drop_duplicates(subset=['description']).set_index('description')['fdc_id'].to_dict()
+        if MATCHER == 'embedding':
+            embedding_index = load_or_build_embedding_index(FOOD_DESCRIPTIONS, EMBEDDING_MODEL)
         
         print("Data loaded and preprocessed successfully.")
         return True
@@ -58,10 +60,14 @@ def load_and_preprocess_data():
         return False
 
 
+def match_threshold() -> float:
+    return EMBEDDING_MATCH_THRESHOLD if MATCHER == 'embedding' else FUZZY_MATCH_THRESHOLD
+
 def get_nutrition_info(ingredient_name: str) -> Dict[str, Any]:
     """
     Performs a fuzzy search on food descriptions and outputs nutrition information 
-    for the best match, using rapidfuzz for speed.
+    for the best match, using rapidfuzz for speed (or the description
+    embeddings when MATCHER is 'embedding').
 
     Args:
         ingredient_name: The name of the ingredient to search for.
@@ -69,17 +75,25 @@ def get_nutrition_info(ingredient_name: str) -> Dict[str, Any]:
     Returns:
         A dictionary containing the search results, match details, and nutrition facts.
     """
-    if merged_df is None or food_df is None or FOOD_DESCRIPTIONS is None:
+    if nutrient_matrix is None or food_df is None or FOOD_DESCRIPTIONS is None or DESCRIPTION_TO_FDC_ID is None:
         return {
             "error": "Data not initialized.",
             "message": "Please call load_and_preprocess_data() and ensure all CSV files are present and correct."
         }
         
-    best_match_result: Optional[tuple] = process.extractOne(
-        query=ingredient_name, 
-        choices=FOOD_DESCRIPTIONS, 
-        scorer=fuzz.ratio
-    )
+    if MATCHER == 'embedding':
+        best_match_result: Optional[tuple] = embedding_index.best_match(ingredient_name, 0)
+    else:
+        best_match_result: Optional[tuple] = process.extractOne(
+            query=ingredient_name, 
+            choices=FOOD_DESCRIPTIONS, 
+            scorer=fuzz.ratio
+        )
+    return nutrition_result(ingredient_name, best_match_result)
+
+def nutrition_result(ingredient_name: str, best_match_result: Optional[tuple]) -> Dict[str, Any]:
+    """get_nutrition_info's answer given the best (description, score, ...) match, or None when there was none."""
+    threshold = match_threshold()
 
     if not best_match_result:
         return {
@@ -87,20 +101,20 @@ def get_nutrition_info(ingredient_name: str) -> Dict[str, Any]:
             "error": "No food data found to search against."
         }
         
-    food_description, similarity_score, _ = best_match_result
+    food_description, similarity_score = best_match_result[:2]
 
-    if similarity_score < FUZZY_MATCH_THRESHOLD:
+    if similarity_score < threshold:
         return {
             "search_query": ingredient_name,
             "error": "No close match found.",
-            "message": f"Best match '{food_description}' only had a similarity score of {similarity_score:.2f}, which is below the threshold of {FUZZY_MATCH_THRESHOLD}."
+            "message": f"Best match '{food_description}' only had a similarity score of {similarity_score:.2f}, which is below the threshold of {threshold}."
         }
 
-    fdc_id = food_df[food_df['description'] == food_description]['fdc_id'].values[0]
+    fdc_id = DESCRIPTION_TO_FDC_ID[food_description]
 
-    nutrition_data = merged_df[merged_df['fdc_id'] == fdc_id]
+    nutrition_data = nutrient_matrix.row_entries(fdc_id)
 
-    if nutrition_data.empty:
+    if not nutrition_data:
         return {
             "search_query": ingredient_name,
             "matched_food": food_description,
@@ -110,13 +124,11 @@ def get_nutrition_info(ingredient_name: str) -> Dict[str, Any]:
         }
 
     nutrition_list = []
-    for row in nutrition_data.itertuples():
-        amount = getattr(row, 'amount')
-        
+    for name, amount, unit in nutrition_data:
         nutrition_list.append({
-            "nutrient_name": getattr(row, 'name'),
+            "nutrient_name": name,
             "amount": float(amount) if pd.notna(amount) and amount is not None else 0.0,
-            "unit": getattr(row, 'unit_name')
+            "unit": unit
         })
 
     nutrition_list.sort(key=lambda x: x['nutrient_name'])
@@ -129,6 +141,99 @@ def get_nutrition_info(ingredient_name: str) -> Dict[str, Any]:
         "nutrition_facts": nutrition_list
     }
 
+def best_fuzzy_matches(names: List[str]) -> List[tuple]:
+    """
+    (description, score) of the best food for each name, scoring every name
+    against every description with rapidfuzz's multi-threaded cdist in chunks
+    sized to BATCH_SCORE_MEMORY_BYTES. Picks the same match as extractOne.
+    """
+    chunk_size = max(1, BATCH_SCORE_MEMORY_BYTES // (8 * len(FOOD_DESCRIPTIONS)))
+    best = []
+    for chunk_start in range(0, len(names), chunk_size):
+        chunk = names[chunk_start:chunk_start + chunk_size]
+        # float64 keeps scores identical to extractOne, so argmax breaks ties the same way.
+        scores = process.cdist(chunk, FOOD_DESCRIPTIONS, scorer=fuzz.ratio, dtype=np.float64, workers=-1)
+        best_positions = scores.argmax(axis=1)
+        best_scores = scores[np.arange(len(chunk)), best_positions]
+        best.extend((FOOD_DESCRIPTIONS[position], float(score)) for position, score in zip(best_positions, best_scores))
+    return best
+
+def best_embedding_matches(names: List[str]) -> List[tuple]:
+    """(description, score) of the closest food for each name by embedding; (None, 0.0) for empty names."""
+    return [(match[0], float(match[1])) if match else (None, 0.0)
+            for match in embedding_index.best_matches(names, 0)]
+
+def get_nutrition_info_many(ingredient_names: List[str]) -> List[Dict[str, Any]]:
+    """
+    get_nutrition_info for several names, matched together like
+    get_nutrition_info_batch, with one result dictionary per name.
+    """
+    if nutrient_matrix is None or food_df is None or FOOD_DESCRIPTIONS is None or DESCRIPTION_TO_FDC_ID is None:
+        return [get_nutrition_info(name) for name in ingredient_names]
+    if not FOOD_DESCRIPTIONS or not ingredient_names:
+        return [nutrition_result(name, None) for name in ingredient_names]
+
+    if MATCHER == 'embedding':
+        best = best_embedding_matches(ingredient_names)
+    else:
+        best = best_fuzzy_matches(ingredient_names)
+    return [nutrition_result(name, match if match[0] is not None else None)
+            for name, match in zip(ingredient_names, best)]
+
+def get_nutrition_info_batch(ingredient_names: List[str]) -> pd.DataFrame:
+    """
+    Batch version of get_nutrition_info. Scores every query against every
+    food description with rapidfuzz's multi-threaded cdist, in chunks of
+    queries sized to BATCH_SCORE_MEMORY_BYTES, and picks the same best match
+    as process.extractOne. With MATCHER 'embedding' all queries are embedded
+    together and compared to the description embeddings instead.
+
+    Args:
+        ingredient_names: The ingredient names to search for.
+
+    Returns:
+        A tidy DataFrame with one row per (query, nutrient) and columns
+        search_query, matched_food, fdc_id, match_score, nutrient_name,
+        amount, unit and error. Queries without a usable match get a single
+        row with the error set and the nutrient columns empty.
+    """
+    columns = ['search_query', 'matched_food', 'fdc_id', 'match_score', 'nutrient_name', 'amount', 'unit', 'error']
+    if nutrient_matrix is None or food_df is None or FOOD_DESCRIPTIONS is None or DESCRIPTION_TO_FDC_ID is None:
+        raise RuntimeError("Data not initialized. Please call load_and_preprocess_data() first.")
+
+    if not FOOD_DESCRIPTIONS:
+        return pd.DataFrame(
+            [(name, None, None, None, None, None, None, "No food data found to search against.") for name in ingredient_names],
+            columns=columns,
+        )
+
+    if MATCHER == 'embedding':
+        best = best_embedding_matches(ingredient_names)
+    else:
+        best = best_fuzzy_matches(ingredient_names)
+    threshold = match_threshold()
+
+    rows = []
+    for ingredient_name, (food_description, similarity_score) in zip(ingredient_names, best):
+        if similarity_score < threshold:
+            rows.append((ingredient_name, None, None, similarity_score, None, None, None, "No close match found."))
+            continue
+
+        fdc_id = int(DESCRIPTION_TO_FDC_ID[food_description])
+        nutrition_data = nutrient_matrix.row_entries(fdc_id)
+        if not nutrition_data:
+            rows.append((ingredient_name, food_description, fdc_id, similarity_score, None, None, None,
+                         "No nutrition data available for this food item."))
+            continue
+
+        for name, amount, unit in sorted(nutrition_data, key=lambda x: x[0]):
+            amount = float(amount) if pd.notna(amount) and amount is not None else 0.0
+            rows.append((ingredient_name, food_description, fdc_id, similarity_score, name, amount, unit, None))
+
+    result = pd.DataFrame(rows, columns=columns)
+    result['fdc_id'] = result['fdc_id'].astype('Int64')
+    return result
+
 # Example usage 
 if __name__ == '__main__':
     if load_and_preprocess_data():
@@ -146,4 +251,7 @@ if __name__ == '__main__':
         search_term_3 = "asdnasdioejqoiwejqw"
         print(f"\n--- Searching for: '{search_term_3}' ---")
         result_3 = get_nutrition_info(search_term_3)
-        print(result_3)
\ No newline at end of file
+        print(result_3)
+
+        print(f"\n--- Batch search ---")
+        print(get_nutrition_info_batch([search_term_1, search_term_2, search_term_3]))
\ No newline at end of file
@@ -0,0 +1,189 @@
+import argparse
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+STORE_PATH = 'datasets/food_data/ingredient_matches.sqlite'
+# Bump when canonicalize() changes so matches stored for old canonical forms are not reused.
+CANONICAL_VERSION = 3
+# Words that describe how an ingredient is prepared or sold rather than what it is.
+DESCRIPTORS = {
+    'fresh', 'freshly', 'chopped', 'diced', 'minced', 'sliced', 'shredded', 'grated', 'crushed',
+    'finely', 'roughly', 'thinly', 'organic', 'large', 'medium', 'small', 'halved',
+    'peeled', 'trimmed', 'optional', 'to', 'taste', 'of', 'a', 'some',
+}
+# Words whose trailing 's' is not a plural.
+SINGULAR_EXCEPTIONS = {
+    'asparagus', 'couscous', 'hummus', 'molasses', 'swiss', 'citrus', 'grits', 'hibiscus',
+    'lemongrass', 'watercress', 'bass', 'floss', 'octopus', 'cactus', 'bonus', 'anise', 'series', 'fries',
+}
+# Plurals in -ies whose singular ends in -y; other -ies words become -ie (cookies, brownies).
+Y_PLURALS = {
+    'cherries', 'anchovies', 'curries', 'jellies', 'candies', 'patties', 'pastries', 'celeries',
+}
+# -ies plurals whose singular is neither -y nor -ie.
+IES_SINGULARS = {'chilies': 'chili'}
+# Plurals in -ves whose singular ends in -f; other -ves words just drop the s (olives, cloves).
+F_PLURALS = {'leaves': 'leaf', 'loaves': 'loaf', 'halves': 'half', 'calves': 'calf'}
+# Real food names and their canonical forms, checked by `ingredient_store.py --check`.
+CANONICAL_EXAMPLES = {
+    'cookies': 'cookie', 'brownies': 'brownie', 'pies': 'pies', 'smoothies': 'smoothie',
+    'berries': 'berry', 'strawberries': 'strawberry', 'cherries': 'cherry', 'anchovies': 'anchovy',
+    'leaves': 'leaf', 'bay leaves': 'bay leaf', 'olives': 'olive', 'cloves': 'clove', 'chives': 'chive',
+    'tomatoes': 'tomato', 'potatoes': 'potato', 'peaches': 'peach', 'radishes': 'radish',
+    'cheeses': 'cheese', 'eggs': 'egg', 'french fries': 'french fries', 'asparagus': 'asparagus',
+    'hummus': 'hummus', 'chilies': 'chili', 'Fresh Chopped Onions': 'onion',
+}
+
+# (canonical name, fdc_id, matched description, score); fdc_id is None when nothing matched.
+Match = Tuple[str, Optional[int], Optional[str], Optional[int]]
+
+
+def singularize(word: str) -> str:
+    if word in SINGULAR_EXCEPTIONS or len(word) <= 3:
+        return word
+    if word in F_PLURALS:
+        return F_PLURALS[word]
+    if word in IES_SINGULARS:
+        return IES_SINGULARS[word]
+    if word.endswith('ies'):
+        if word in Y_PLURALS or word.endswith('berries'):
+            return word[:-3] + 'y'
+        # Short words like "pies" are left alone.
+        return word[:-1] if len(word) > 4 else word
+    if word.endswith('oes'):
+        return word[:-2]
+    if word.endswith(('ches', 'shes', 'sses', 'xes', 'zes')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def canonicalize(name: str) -> str:
+    """
+    Canonical form of an ingredient name used for matching: lower case,
+    punctuation removed, descriptor words dropped, each word singularized and
+    whitespace collapsed. "Fresh Tomatoes", "tomato" and "chopped  tomatoes"
+    all become "tomato". A name made only of descriptors keeps its words.
+    """
+    words = re.sub(r'[^\w\s]', ' ', str(name).lower()).split()
+    kept = [word for word in words if word not in DESCRIPTORS] or words
+    return ' '.join(singularize(word) for word in kept)
+
+
+def check_canonical_forms() -> List[Tuple[str, str, str]]:
+    """(name, expected, actual) for every CANONICAL_EXAMPLES entry canonicalize gets wrong."""
+    return [(name, expected, canonicalize(name)) for name, expected in CANONICAL_EXAMPLES.items()
+            if canonicalize(name) != expected]
+
+
+class MatchStore:
+    """
+    On-disk map from canonical ingredient names to their FDC match (fdc_id,
+    description, match score), shared across runs. Matches are filed under a
+    context string naming everything they depend on (FDC descriptions digest,
+    threshold, canonicalizer version, matcher), so a changed food.csv,
+    threshold or matcher starts from an empty set instead of reusing stale
+    matches.
+    """
+
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS matches ("
+            " context TEXT NOT NULL,"
+            " canonical TEXT NOT NULL,"
+            " fdc_id INTEGER,"
+            " description TEXT,"
+            " score INTEGER,"
+            " updated REAL NOT NULL,"
+            " PRIMARY KEY (context, canonical))"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def context(descriptions_digest: str, threshold: float, canonical: bool = True, matcher: str = 'fuzzy') -> str:
+        # Raw names get their own context; they are not canonical forms.
+        context = f"{descriptions_digest}:{threshold}:{CANONICAL_VERSION if canonical else 'raw'}"
+        # Fuzzy matches keep the contexts they were stored under before other matchers existed.
+        return context if matcher == 'fuzzy' else f"{context}:{matcher}"
+
+    def get_many(self, context: str, canonicals: Iterable[str]) -> Dict[str, Match]:
+        """Stored matches for the canonical names that have one."""
+        found = {}
+        names = list(canonicals)
+        with self._lock:
+            # Stay under SQLite's default limit on bound parameters.
+            for start in range(0, len(names), 900):
+                chunk = names[start:start + 900]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT canonical, fdc_id, description, score FROM matches"
+                    f" WHERE context = ? AND canonical IN ({placeholders})",
+                    [context, *chunk],
+                ).fetchall()
+                for canonical, fdc_id, description, score in rows:
+                    found[canonical] = (canonical, fdc_id, description, score)
+        return found
+
+    def put_many(self, context: str, matches: List[Match]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO matches (context, canonical, fdc_id, description, score, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(context, canonical, fdc_id, description, score, now)
+                 for canonical, fdc_id, description, score in matches],
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM matches")
+            self._conn.commit()
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the persistent ingredient to FDC match store.")
+    parser.add_argument('--path', default=STORE_PATH, help="Path to the match store")
+    parser.add_argument('--canonicalize', nargs='+', metavar='NAME', help="Print the canonical form of these names")
+    parser.add_argument('--clear', action='store_true', help="Remove every stored match")
+    parser.add_argument('--check', action='store_true', help="Check canonical forms of known food names")
+
+    args = parser.parse_args()
+
+    if args.canonicalize:
+        for name in args.canonicalize:
+            print(f"{name!r} -> {canonicalize(name)!r}")
+        return
+    if args.check:
+        wrong = check_canonical_forms()
+        for name, expected, actual in wrong:
+            print(f"{name!r} -> {actual!r}, expected {expected!r}")
+        print(f"{len(CANONICAL_EXAMPLES) - len(wrong)}/{len(CANONICAL_EXAMPLES)} canonical forms as expected")
+        if wrong:
+            raise SystemExit(1)
+        return
+
+    store = MatchStore(args.path)
+    if args.clear:
+        store.clear()
+    print(f"{store.size()} stored matches in {args.path}")
+    store.close()
+
+if __name__ == "__main__":
+    main()
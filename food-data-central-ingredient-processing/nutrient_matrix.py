@@ -0,0 +1,134 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from shared_arrays import load_arrays, save_arrays
+
+_ARRAY_NAMES = ['indptr', 'indices', 'data', 'fdc_ids', 'nutrient_ids']
+
+
+class NutrientMatrix:
+    """
+    food_nutrient held as a CSR matrix with one row per fdc_id and one column
+    per nutrient_id.
+
+    Entries are kept exactly as they appear in food_nutrient.csv: duplicate
+    (fdc_id, nutrient_id) rows are not summed and missing amounts stay NaN, so
+    lookups reproduce the per-row results of filtering the merged table.
+    The CSR arrays are plain NumPy arrays so they can be saved and
+    memory-mapped by pool workers.
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray,
+                 fdc_ids: np.ndarray, nutrient_ids: np.ndarray,
+                 nutrient_names: List[Optional[str]], nutrient_units: List[Optional[str]]):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        # Sorted, so a food's row is found with searchsorted.
+        self.fdc_ids = fdc_ids
+        self.nutrient_ids = nutrient_ids
+        self.nutrient_names = nutrient_names
+        self.nutrient_units = nutrient_units
+        columns: Dict[str, List[int]] = {}
+        for col, name in enumerate(nutrient_names):
+            if isinstance(name, str):
+                columns.setdefault(name, []).append(col)
+        self.columns_by_name = {name: np.array(cols, dtype=np.int32) for name, cols in columns.items()}
+
+    @classmethod
+    def from_frames(cls, food_nutrient_df: pd.DataFrame, nutrient_df: pd.DataFrame) -> 'NutrientMatrix':
+        """
+        Build from food_nutrient (fdc_id, nutrient_id, amount) and nutrient
+        (nutrient_id, name, unit_name) frames.
+        """
+        food_nutrient_df = food_nutrient_df.dropna(subset=['fdc_id', 'nutrient_id'])
+        fdc_codes, fdc_ids = pd.factorize(food_nutrient_df['fdc_id'], sort=True)
+        col_codes, nutrient_ids = pd.factorize(food_nutrient_df['nutrient_id'], sort=True)
+
+        # Stable sort by row keeps each food's entries in file order.
+        order = np.argsort(fdc_codes, kind='stable')
+        indptr = np.zeros(len(fdc_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(fdc_codes, minlength=len(fdc_ids)), out=indptr[1:])
+        amounts = pd.to_numeric(food_nutrient_df['amount'], errors='coerce').to_numpy(dtype=np.float64)
+
+        nutrient_info = nutrient_df.drop_duplicates(subset=['nutrient_id']).set_index('nutrient_id')
+        names = nutrient_info['name'].reindex(nutrient_ids)
+        units = nutrient_info['unit_name'].reindex(nutrient_ids)
+        return cls(
+            indptr,
+            col_codes[order].astype(np.int32),
+            amounts[order],
+            np.asarray(fdc_ids, dtype=np.int64),
+            np.asarray(nutrient_ids, dtype=np.int64),
+            names.where(names.notna(), None).tolist(),
+            units.where(units.notna(), None).tolist(),
+        )
+
+    @property
+    def matrix(self) -> sparse.csr_matrix:
+        return sparse.csr_matrix((self.data, self.indices, self.indptr),
+                                 shape=(len(self.fdc_ids), len(self.nutrient_ids)))
+
+    def save(self, directory: str):
+        arrays = {name: getattr(self, name) for name in _ARRAY_NAMES}
+        save_arrays(directory, arrays, {'names': self.nutrient_names, 'units': self.nutrient_units})
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'NutrientMatrix':
+        arrays, meta = load_arrays(directory, _ARRAY_NAMES, mmap=mmap)
+        return cls(*(arrays[name] for name in _ARRAY_NAMES), meta['names'], meta['units'])
+
+    def _rows(self, fdc_ids: Iterable[int]) -> np.ndarray:
+        """Row of each fdc_id, -1 for foods with no food_nutrient rows."""
+        fdc_ids = np.asarray(list(fdc_ids), dtype=np.int64)
+        rows = np.searchsorted(self.fdc_ids, fdc_ids)
+        found = rows < len(self.fdc_ids)
+        found[found] = self.fdc_ids[rows[found]] == fdc_ids[found]
+        return np.where(found, rows, -1)
+
+    def row_entries(self, fdc_id: int) -> List[Tuple[Optional[str], float, Optional[str]]]:
+        """(nutrient name, amount, unit) for every food_nutrient row of fdc_id, in file order."""
+        row = self._rows([fdc_id])[0]
+        if row < 0:
+            return []
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return [
+            (self.nutrient_names[col], amount, self.nutrient_units[col])
+            for col, amount in zip(self.indices[start:end], self.data[start:end])
+        ]
+
+    def _gather(self, fdc_ids: Iterable[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+        rows = self._rows(fdc_ids)
+        present = rows >= 0
+        starts = np.where(present, self.indptr[np.maximum(rows, 0)], 0)
+        ends = np.where(present, self.indptr[np.maximum(rows, 0) + 1], 0)
+        lengths = ends - starts
+        owner = np.repeat(np.arange(len(rows)), lengths)
+        # Flat positions of every entry of every requested row.
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        flat = np.repeat(starts, lengths) + offsets
+        return owner, self.indices[flat], self.data[flat], len(rows)
+
+    def mean_amounts(self, fdc_ids: Iterable[int], nutrient_names: List[str]) -> np.ndarray:
+        """
+        Mean amount per (fdc_id, nutrient name) for a batch of foods, NaN where
+        the food has no non-missing amount for that nutrient. A name that maps
+        to several nutrient_ids (e.g. 'Energy' in KCAL and kJ) averages over
+        all of them, like filtering the merged table on name does.
+        """
+        owner, cols, values, n = self._gather(fdc_ids)
+        valid = ~np.isnan(values)
+        result = np.full((n, len(nutrient_names)), np.nan)
+        for j, name in enumerate(nutrient_names):
+            name_cols = self.columns_by_name.get(name)
+            if name_cols is None:
+                continue
+            mask = valid & np.isin(cols, name_cols)
+            sums = np.bincount(owner[mask], weights=values[mask], minlength=n)
+            counts = np.bincount(owner[mask], minlength=n)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result[:, j] = np.where(counts > 0, sums / counts, np.nan)
+        return result
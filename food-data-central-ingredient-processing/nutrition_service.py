@@ -0,0 +1,296 @@
+import argparse
+import json
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+import ingredientNutrition
+
+HOST = '127.0.0.1'
+PORT = 8765
+MENU_SCORES_PATH = 'scored-datasets/uber_eats_menu_with_scores.csv'
+INGREDIENT_SCORES_PATH = 'scored-datasets/uber_eats_menu_with_ingredients_scores.csv'
+# Ingredient lookups remembered by the result cache.
+CACHE_SIZE = 10000
+# Most ingredients accepted by one batch request.
+MAX_BATCH = 5000
+# Latencies kept per endpoint for the percentiles in /metrics.
+LATENCY_WINDOW = 10000
+# Endpoints with their own latency stats; every other path is recorded as OTHER_ENDPOINT.
+ENDPOINTS = {'/nutrition', '/nutrition/batch', '/restaurants', '/metrics', '/health'}
+OTHER_ENDPOINT = 'other'
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, math.ceil(q / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+class LRUCache:
+    """Thread-safe least-recently-used map with hit/miss counts."""
+
+    def __init__(self, capacity: int = CACHE_SIZE):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[Any]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self._entries), 'capacity': self.capacity, 'hits': self.hits,
+                    'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+class LatencyStats:
+    """Request counts and recent latencies per endpoint."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._endpoints: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, elapsed: float, status: int):
+        with self._lock:
+            stats = self._endpoints.setdefault(
+                endpoint, {'requests': 0, 'errors': 0, 'latencies': deque(maxlen=self.window)})
+            stats['requests'] += 1
+            stats['errors'] += status >= 400
+            stats['latencies'].append(elapsed)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            snapshot = {name: (stats['requests'], stats['errors'], sorted(stats['latencies']))
+                        for name, stats in self._endpoints.items()}
+        summary = {}
+        for name, (requests, errors, latencies) in snapshot.items():
+            summary[name] = {
+                'requests': requests,
+                'errors': errors,
+                'p50_ms': _ms(percentile(latencies, 50)),
+                'p95_ms': _ms(percentile(latencies, 95)),
+                'p99_ms': _ms(percentile(latencies, 99)),
+                'max_ms': _ms(latencies[-1] if latencies else None),
+            }
+        return summary
+
+
+def endpoint_name(path: str) -> str:
+    """Key latencies are recorded under, so unknown paths cannot grow the stats without bound."""
+    if path.startswith('/restaurants/'):
+        return '/restaurants'
+    return path if path in ENDPOINTS else OTHER_ENDPOINT
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def _records_by_restaurant(path: str, columns: List[str]) -> Dict[int, Dict[str, Any]]:
+    """Rows of a scored dataset keyed by restaurant_id, NaN as None; {} when the file is missing."""
+    try:
+        df = pd.read_csv(path, usecols=lambda column: column in columns)
+    except FileNotFoundError:
+        print(f"Warning: {path} not found; its scores will be missing.")
+        return {}
+    df = df.dropna(subset=['restaurant_id']).drop_duplicates(subset=['restaurant_id'])
+    df['restaurant_id'] = df['restaurant_id'].astype('int64')
+    records = df.astype(object).where(df.notna(), None).to_dict('records')
+    return {int(record.pop('restaurant_id')): record for record in records}
+
+
+class RestaurantScores:
+    """Menu (LLM) and ingredient scores per restaurant from the published scored datasets."""
+
+    def __init__(self, menu_scores_path: str = MENU_SCORES_PATH, ingredient_scores_path: str = INGREDIENT_SCORES_PATH):
+        self.menu = _records_by_restaurant(menu_scores_path, ['restaurant_id', 'nutrition_score'])
+        self.ingredients = _records_by_restaurant(
+            ingredient_scores_path,
+            ['restaurant_id', 'average_calories', 'average_sodium', 'average_protein', 'healthiness_score'])
+
+    def __len__(self) -> int:
+        return len(self.menu.keys() | self.ingredients.keys())
+
+    def get(self, restaurant_id: int) -> Optional[Dict[str, Any]]:
+        menu = self.menu.get(restaurant_id)
+        ingredients = self.ingredients.get(restaurant_id)
+        if menu is None and ingredients is None:
+            return None
+        return {
+            'restaurant_id': restaurant_id,
+            'menu_score': menu['nutrition_score'] if menu else None,
+            'ingredient_score': ingredients,
+        }
+
+
+class NutritionService:
+    """The lookups behind the HTTP endpoints, with a shared LRU cache of ingredient results."""
+
+    def __init__(self, scores: RestaurantScores, cache_size: int = CACHE_SIZE):
+        self.scores = scores
+        self.cache = LRUCache(cache_size)
+
+    def nutrition(self, name: str) -> Dict[str, Any]:
+        return self.nutrition_many([name])[0]
+
+    def nutrition_many(self, names: List[str]) -> List[Dict[str, Any]]:
+        results = [self.cache.get(name) for name in names]
+        missing = list(dict.fromkeys(name for name, result in zip(names, results) if result is None))
+        if missing:
+            if len(missing) == 1:
+                found = {missing[0]: ingredientNutrition.get_nutrition_info(missing[0])}
+            else:
+                found = dict(zip(missing, ingredientNutrition.get_nutrition_info_many(missing)))
+            for name, result in found.items():
+                self.cache.put(name, result)
+            results = [result if result is not None else found[name] for name, result in zip(names, results)]
+        return results
+
+
+class NutritionRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /nutrition?ingredient=NAME         one ingredient, like get_nutrition_info
+    POST /nutrition/batch {"ingredients": [...]}   {"results": [...]} in request order
+    GET  /restaurants/ID                    menu and ingredient scores of one restaurant
+    GET  /metrics                           request latencies and cache statistics
+    GET  /health
+    """
+
+    server_version = 'NutritionService/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle(self._route_get)
+
+    def do_POST(self):
+        self._handle(self._route_post)
+
+    def _handle(self, route):
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        try:
+            endpoint, status, body = route(url)
+        except Exception as e:
+            endpoint, status, body = endpoint_name(url.path), 500, {'error': str(e)}
+        self._send_json(status, body)
+        self.server.latency.record(endpoint, time.perf_counter() - start, status)
+
+    def _route_get(self, url):
+        if url.path == '/nutrition':
+            names = parse_qs(url.query).get('ingredient')
+            if not names:
+                return url.path, 400, {'error': "missing 'ingredient' query parameter"}
+            return url.path, 200, self.server.service.nutrition(names[0])
+        if url.path.startswith('/restaurants/'):
+            try:
+                restaurant_id = int(url.path[len('/restaurants/'):])
+            except ValueError:
+                return '/restaurants', 400, {'error': "restaurant id must be an integer"}
+            scores = self.server.service.scores.get(restaurant_id)
+            if scores is None:
+                return '/restaurants', 404, {'error': f"no scores for restaurant {restaurant_id}"}
+            return '/restaurants', 200, scores
+        if url.path == '/metrics':
+            return url.path, 200, {'endpoints': self.server.latency.summary(),
+                                   'cache': self.server.service.cache.stats(),
+                                   'uptime_s': round(time.time() - self.server.started, 1)}
+        if url.path == '/health':
+            return url.path, 200, {'status': 'ok', 'restaurants': len(self.server.service.scores)}
+        return OTHER_ENDPOINT, 404, {'error': f"unsupported endpoint {url.path}"}
+
+    def _route_post(self, url):
+        if url.path != '/nutrition/batch':
+            return OTHER_ENDPOINT, 404, {'error': f"unsupported endpoint {url.path}"}
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            return url.path, 400, {'error': 'invalid JSON'}
+        names = request.get('ingredients') if isinstance(request, dict) else None
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            return url.path, 400, {'error': "'ingredients' must be a list of strings"}
+        if len(names) > MAX_BATCH:
+            return url.path, 400, {'error': f"at most {MAX_BATCH} ingredients per request"}
+        return url.path, 200, {'results': self.server.service.nutrition_many(names)}
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class NutritionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, service: NutritionService, host: str = HOST, port: int = PORT):
+        super().__init__((host, port), NutritionRequestHandler)
+        self.service = service
+        self.latency = LatencyStats()
+        self.started = time.time()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve ingredient nutrition lookups and restaurant scores over HTTP.")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help="Ingredient results kept in the LRU cache")
+    parser.add_argument('--menu-scores', default=MENU_SCORES_PATH, help="Published menu (LLM) scores")
+    parser.add_argument('--ingredient-scores', default=INGREDIENT_SCORES_PATH, help="Published ingredient scores")
+    parser.add_argument('--matcher', choices=['fuzzy', 'embedding'], default=ingredientNutrition.MATCHER,
+                        help="How ingredient names are matched to FDC foods")
+
+    args = parser.parse_args()
+
+    ingredientNutrition.MATCHER = args.matcher
+    if not ingredientNutrition.load_and_preprocess_data():
+        return
+    scores = RestaurantScores(args.menu_scores, args.ingredient_scores)
+    server = NutritionServer(NutritionService(scores, args.cache_size), args.host, args.port)
+    print(f"Nutrition service listening on {server.url} ({len(scores)} restaurants, {args.matcher} matching)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
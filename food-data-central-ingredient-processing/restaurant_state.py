@@ -0,0 +1,147 @@
+import os
+import shutil
+from typing import Optional, Tuple
+
+import numpy as np
+
+from shared_arrays import load_arrays, save_arrays
+
+# Bump when the saved layout changes so old state is rebuilt.
+STATE_VERSION = 1
+_ARRAY_NAMES = ['restaurant_ids', 'sums', 'compensation', 'counts', 'averages', 'scores']
+
+
+def compensated_group_sums(groups: np.ndarray, values: np.ndarray, sums: np.ndarray,
+                           compensation: np.ndarray, counts: np.ndarray):
+    """
+    Add each row of values (n x k) to sums[groups[i]] in place, skipping NaN,
+    with the same Kahan summation and per-group order as pandas' groupby
+    mean, so sums / counts reproduces its means bit for bit. Starting from
+    non-zero sums/compensation continues an earlier call.
+
+    Rows are processed by their rank within their group: rows of equal rank
+    belong to different groups, so each rank is one vectorized step and every
+    group still sees its rows in order.
+    """
+    if len(groups) == 0:
+        return
+    by_group = np.argsort(groups, kind='stable')
+    sorted_groups = groups[by_group]
+    group_starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    sizes = np.diff(np.r_[group_starts, len(sorted_groups)])
+    ranks = np.empty(len(groups), dtype=np.int64)
+    ranks[by_group] = np.arange(len(groups)) - np.repeat(group_starts, sizes)
+
+    valid = ~np.isnan(values)
+    counts += np.stack([np.bincount(groups, weights=valid[:, j], minlength=len(counts)).astype(counts.dtype)
+                        for j in range(values.shape[1])], axis=1)
+
+    # Lay rows out rank by rank so each step reads contiguous slices.
+    by_rank = np.argsort(ranks, kind='stable')
+    rank_starts = np.searchsorted(ranks[by_rank], np.arange(ranks.max() + 2))
+    groups, values, valid = groups[by_rank], values[by_rank], valid[by_rank]
+    has_inf = bool(np.isinf(values).any())
+    for rank in range(ranks.max() + 1):
+        start, end = rank_starts[rank], rank_starts[rank + 1]
+        step_groups = groups[start:end]
+        step_valid = valid[start:end]
+        total = sums[step_groups]
+        carried = compensation[step_groups]
+        with np.errstate(invalid='ignore'):
+            y = values[start:end] - carried
+            t = total + y
+            new_compensation = t - total - y
+        if has_inf:
+            # An infinite value makes the compensation NaN; pandas resets it to 0.
+            new_compensation[np.isnan(new_compensation)] = 0.0
+        sums[step_groups] = np.where(step_valid, t, total)
+        compensation[step_groups] = np.where(step_valid, new_compensation, carried)
+
+
+class RestaurantTotals:
+    """
+    Running per-restaurant totals of menu item means (one column per
+    nutrient), plus the averages and healthiness score last computed from them.
+
+    Item means are folded in with the same compensated (Kahan) summation, in
+    the same order, as pandas' groupby mean, so adding rows in several runs
+    gives bit-for-bit the averages a single groupby over all rows would give.
+    """
+
+    def __init__(self, restaurant_ids: np.ndarray, sums: np.ndarray, compensation: np.ndarray,
+                 counts: np.ndarray, averages: np.ndarray, scores: np.ndarray):
+        self.restaurant_ids = restaurant_ids
+        self.sums = sums
+        self.compensation = compensation
+        self.counts = counts
+        self.averages = averages
+        self.scores = scores
+
+    @classmethod
+    def empty(cls, n_columns: int) -> 'RestaurantTotals':
+        return cls(np.zeros(0, dtype=np.int64), np.zeros((0, n_columns)), np.zeros((0, n_columns)),
+                   np.zeros((0, n_columns), dtype=np.int64), np.zeros((0, n_columns)), np.zeros(0))
+
+    def __len__(self) -> int:
+        return len(self.restaurant_ids)
+
+    def _insert(self, restaurant_ids: np.ndarray):
+        """Add zeroed rows for ids not seen before, keeping ids sorted."""
+        new_ids = np.setdiff1d(restaurant_ids, self.restaurant_ids)
+        if new_ids.size == 0:
+            return
+        ids = np.concatenate([self.restaurant_ids, new_ids])
+        order = np.argsort(ids, kind='stable')
+        n_new = new_ids.size
+
+        def grow(array):
+            padding = np.zeros((n_new,) + array.shape[1:], dtype=array.dtype)
+            return np.concatenate([array, padding])[order]
+
+        self.restaurant_ids = ids[order]
+        self.sums = grow(self.sums)
+        self.compensation = grow(self.compensation)
+        self.counts = grow(self.counts)
+        self.averages = grow(self.averages)
+        self.scores = grow(self.scores)
+
+    def add(self, restaurant_ids: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Fold in item means (one row per menu item, in file order; NaN is
+        skipped like pandas does). Returns the positions of the restaurants
+        that changed.
+        """
+        restaurant_ids = np.asarray(restaurant_ids, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        if restaurant_ids.size == 0:
+            return np.zeros(0, dtype=np.int64)
+        self._insert(np.unique(restaurant_ids))
+        rows = np.searchsorted(self.restaurant_ids, restaurant_ids)
+
+        compensated_group_sums(rows, values, self.sums, self.compensation, self.counts)
+        return np.unique(rows)
+
+    def means(self, positions: np.ndarray) -> np.ndarray:
+        """Mean of the item means for the given restaurants, NaN where no item had a value."""
+        counts = self.counts[positions]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, self.sums[positions] / counts, np.nan)
+
+    def save(self, directory: str, meta: dict):
+        tmp_dir = directory + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        arrays = {name: getattr(self, name) for name in _ARRAY_NAMES}
+        save_arrays(tmp_dir, arrays, {'version': STATE_VERSION, **meta})
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_dir, directory)
+
+    @classmethod
+    def load(cls, directory: str) -> Tuple[Optional['RestaurantTotals'], dict]:
+        """Saved totals and their meta, or (None, {}) when there is no usable state."""
+        try:
+            arrays, meta = load_arrays(directory, _ARRAY_NAMES, mmap=False)
+        except (FileNotFoundError, ValueError, OSError):
+            return None, {}
+        if meta.get('version') != STATE_VERSION:
+            return None, {}
+        return cls(*(arrays[name] for name in _ARRAY_NAMES)), meta
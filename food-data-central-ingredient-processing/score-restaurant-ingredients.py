@@ -1,97 +1,140 @@
 import pandas as pd
-from fuzzywuzzy import fuzz
-from fuzzywuzzy import process
 from typing import List, Dict, Any, Optional
 import numpy as np
 from multiprocessing import Pool, cpu_count, current_process
+import argparse
+import hashlib
+import io
+import os
+from itertools import chain
 import sys
+import tempfile
+from fdc_cache import load_fdc_tables
+from description_index import INDEX_PATH, DescriptionIndex, load_or_build_index
+from embedding_index import EMBEDDING_MODEL, EmbeddingIndex, load_or_build_embedding_index
+from ingredient_store import CANONICAL_VERSION, Match, MatchStore, canonicalize
+from nutrient_matrix import NutrientMatrix
+from restaurant_state import RestaurantTotals, compensated_group_sums
 
 FOOD_CSV_PATH = 'datasets/food_data/food.csv'
 NUTRIENT_CSV_PATH = 'datasets/food_data/nutrient.csv'
 FOOD_NUTRIENT_CSV_PATH = 'datasets/food_data/food_nutrient.csv'
 
 FUZZY_MATCH_THRESHOLD = 75
+# 'fuzzy' matches names with fuzz.ratio; 'embedding' compares EMBEDDING_MODEL vectors (see embedding_index.py).
+MATCHER = 'fuzzy'
+# Cosine similarity x 100 an embedding match needs.
+EMBEDDING_MATCH_THRESHOLD = 75
 DRI_CALORIES = 2000.0
 DRI_SODIUM = 2000.0
 DRI_PROTEIN = 85.0
 MAX_INGREDIENTS_PER_ITEM = 4
+# Match "Tomatoes", "fresh tomato" and "Tomato" once, as "tomato".
+CANONICALIZE = True
+# Reuse ingredient matches from earlier runs (datasets/food_data/ingredient_matches.sqlite).
+USE_MATCH_STORE = True
+# --incremental keeps its running totals in <output file> + STATE_SUFFIX.
+STATE_SUFFIX = '.state'
+# Bytes hashed at the start and end of the processed input to check it was only appended to.
+SAMPLE_BYTES = 4096
 
 IDEAL_CALORIES_PER_MEAL = DRI_CALORIES / 3.0
 IDEAL_SODIUM_PER_MEAL = DRI_SODIUM / 3.0
 IDEAL_PROTEIN_PER_MEAL = DRI_PROTEIN / 3.0
+SCORED_NUTRIENTS = ['Energy', 'Sodium, Na', 'Protein']
 food_df: Optional[pd.DataFrame] = None
-merged_df: Optional[pd.DataFrame] = None
+nutrient_matrix: Optional[NutrientMatrix] = None
+description_index: Optional[DescriptionIndex] = None
+embedding_index: Optional[EmbeddingIndex] = None
+description_fdc_ids: Optional[np.ndarray] = None
 nutrition_lookup: Dict[str, Dict[str, float]] = {}
 
-def load_and_preprocess_data_worker():
-    global food_df, merged_df
+def load_and_preprocess_data():
+    """
+    Parse the USDA CSVs once in the parent. Pool workers never read the CSVs;
+    they attach to the arrays written by export_worker_arrays().
+    """
+    global food_df, nutrient_matrix, description_index, embedding_index, description_fdc_ids
+    print("Loading food csv...")
     try:
-        food_data = pd.read_csv(FOOD_CSV_PATH)
-        nutrient_data = pd.read_csv(NUTRIENT_CSV_PATH)
-        food_nutrient_data = pd.read_csv(FOOD_NUTRIENT_CSV_PATH)
-
-        food_data.columns = food_data.columns.str.lower().str.strip()
-        nutrient_data.columns = nutrient_data.columns.str.lower().str.strip()
-        food_nutrient_data.columns = food_nutrient_data.columns.str.lower().str.strip()
-
-        food_df = food_data[['fdc_id', 'description']].copy()
-        food_df['description'] = food_df['description'].fillna('').astype(str)
-
-        nutrient_data = nutrient_data[['id', 'name', 'unit_name']]
-        nutrient_data.rename(columns={'id': 'nutrient_id'}, inplace=True)
+        food_df, nutrient_data, food_nutrient_data = load_fdc_tables(FOOD_CSV_PATH, NUTRIENT_CSV_PATH, FOOD_NUTRIENT_CSV_PATH)
 
-        food_nutrient_data = food_nutrient_data[['fdc_id', 'nutrient_id', 'amount']]
+        nutrient_matrix = NutrientMatrix.from_frames(food_nutrient_data, nutrient_data)
 
-        merged_df = food_nutrient_data.merge(nutrient_data, on='nutrient_id', how='left')
+        if MATCHER == 'embedding':
+            embedding_index = load_or_build_embedding_index(food_df['description'].tolist(), EMBEDDING_MODEL)
+        else:
+            description_index = load_or_build_index(food_df['description'].tolist())
+        # A matched description resolves to the first food carrying that description.
+        description_fdc_ids = food_df.groupby('description', sort=False)['fdc_id'].transform('first').to_numpy()
         return True
     except:
         return False
 
-def init_worker():
-    global food_df, merged_df
+def export_worker_arrays(shared_dir: str):
+    np.save(os.path.join(shared_dir, 'description_fdc_ids.npy'), description_fdc_ids)
+
+def init_worker(shared_dir: str, index_path: str):
+    global description_index, description_fdc_ids
     try:
-        load_success = load_and_preprocess_data_worker()
-        if not load_success:
-            print(f"Worker {current_process().pid} failed to load data.")
+        description_fdc_ids = np.load(os.path.join(shared_dir, 'description_fdc_ids.npy'), mmap_mode='r')
+        description_index = DescriptionIndex.load(index_path)
     except Exception as e:
-        print(f"Worker initialization error: {e}")
+        print(f"Worker {current_process().pid} failed to attach to shared data: {e}")
     sys.stdout.flush()
 
-def get_nutrition_info_parallel(ingredient_name: str) -> Optional[tuple[str, Dict[str, Any]]]:
-    global food_df, merged_df
-
-    if merged_df is None or food_df is None:
+def match_ingredient(ingredient_name: str) -> Optional[Match]:
+    """Best FDC food for one ingredient, as (name, fdc_id, description, score); fdc_id is None below the threshold."""
+    if description_index is None or description_fdc_ids is None:
         return None
 
-    choices_list = food_df['description'].tolist()
-    best_match = process.extractOne(
-        query=ingredient_name,
-        choices=choices_list,
-        scorer=fuzz.ratio
-    )
+    best_match = description_index.best_match(ingredient_name, FUZZY_MATCH_THRESHOLD)
 
-    if not best_match or best_match[1] < FUZZY_MATCH_THRESHOLD:
-        return (ingredient_name, {})
+    if not best_match:
+        return (ingredient_name, None, None, None)
 
-    food_desc, score = best_match
-    fdc_id = food_df.loc[food_df['description'] == food_desc, 'fdc_id'].iloc[0]
-    nutrients = merged_df[merged_df['fdc_id'] == fdc_id]
+    food_desc, score, position = best_match
+    return (ingredient_name, int(description_fdc_ids[position]), food_desc, int(score))
 
-    cal = nutrients[nutrients['name'] == 'Energy']['amount'].mean()
-    sod = nutrients[nutrients['name'] == 'Sodium, Na']['amount'].mean()
-    prot = nutrients[nutrients['name'] == 'Protein']['amount'].mean()
+def active_index():
+    """The index MATCHER selects, or None before load_and_preprocess_data()."""
+    return embedding_index if MATCHER == 'embedding' else description_index
 
-    info = {
-        'calories': float(cal) if pd.notna(cal) else 0.0,
-        'sodium': float(sod) if pd.notna(sod) else 0.0,
-        'protein': float(prot) if pd.notna(prot) else 0.0
-    }
+def match_threshold() -> float:
+    return EMBEDDING_MATCH_THRESHOLD if MATCHER == 'embedding' else FUZZY_MATCH_THRESHOLD
 
-    return (ingredient_name, info)
+def match_ingredients(names: List[str]) -> List[Match]:
+    if MATCHER == 'embedding':
+        # One batched embedding call and matrix product in the parent; workers would only queue on the model.
+        return [(name, int(description_fdc_ids[best[2]]), best[0], int(best[1])) if best else (name, None, None, None)
+                for name, best in zip(names, embedding_index.best_matches(names, EMBEDDING_MATCH_THRESHOLD))]
 
-def load_and_preprocess_data():
-    print("Loading food csv...")
-    return load_and_preprocess_data_worker()
+    matches = []
+    try:
+        with tempfile.TemporaryDirectory() as shared_dir:
+            export_worker_arrays(shared_dir)
+            with Pool(processes=cpu_count(), initializer=init_worker, initargs=(shared_dir, INDEX_PATH)) as pool:
+                for result in pool.imap_unordered(match_ingredient, names):
+                    if result:
+                        matches.append(result)
+    except Exception as e:
+        print(f"An error occurred during parallel processing, falling back to sequential: {e}")
+        matches = [result for result in map(match_ingredient, names) if result]
+    return matches
+
+def nutrition_for_matches(matches: Dict[str, Match]) -> Dict[str, Dict[str, float]]:
+    """Nutrition info per matched name, {} for names without a match."""
+    info = {name: {} for name, (_, fdc_id, _, _) in matches.items() if fdc_id is None}
+    matched = [(name, fdc_id) for name, (_, fdc_id, _, _) in matches.items() if fdc_id is not None]
+    if matched:
+        amounts = nutrient_matrix.mean_amounts([fdc_id for _, fdc_id in matched], SCORED_NUTRIENTS)
+        for (name, _), (cal, sod, prot) in zip(matched, amounts):
+            info[name] = {
+                'calories': float(cal) if pd.notna(cal) else 0.0,
+                'sodium': float(sod) if pd.notna(sod) else 0.0,
+                'protein': float(prot) if pd.notna(prot) else 0.0
+            }
+    return info
 
 def create_nutrition_lookup_table(input_df: pd.DataFrame):
     global nutrition_lookup
@@ -107,63 +150,109 @@ def create_nutrition_lookup_table(input_df: pd.DataFrame):
         all_ingredients = input_df['ingredients'].str.split(',').explode().str.strip().dropna().unique()
 
     unique_ingredients_list = all_ingredients.tolist()
+    index = active_index()
+    if nutrient_matrix is None or index is None or description_fdc_ids is None:
+        return
 
-    num_processes = cpu_count()
-
-    try:
-        with Pool(processes=num_processes, initializer=init_worker) as pool:
-            for result in pool.imap_unordered(get_nutrition_info_parallel, unique_ingredients_list):
-                if result:
-                    ingredient, info = result
-                    nutrition_lookup[ingredient] = info
-    except Exception as e:
-        print(f"An error occurred during parallel processing, falling back to sequential: {e}")
-        for ingredient in unique_ingredients_list:
-            result = get_nutrition_info_parallel(ingredient)
-            if result:
-                 ingredient, info = result
-                 nutrition_lookup[ingredient] = info
+    # Each distinct canonical form is matched once and shared by all its spellings.
+    canonical_of = {name: canonicalize(name) if CANONICALIZE else name for name in unique_ingredients_list}
+    canonicals = list(dict.fromkeys(canonical_of.values()))
+
+    store = MatchStore() if USE_MATCH_STORE else None
+    matcher = f"embedding:{EMBEDDING_MODEL}" if MATCHER == 'embedding' else 'fuzzy'
+    context = MatchStore.context(index.digest, match_threshold(), CANONICALIZE, matcher)
+    matches = store.get_many(context, canonicals) if store is not None else {}
+    to_match = [name for name in canonicals if name not in matches]
+    print(f"{len(unique_ingredients_list)} unique ingredients, {len(canonicals)} to look up, "
+          f"{len(matches)} matched in earlier runs, {len(to_match)} to match")
+
+    if to_match:
+        new_matches = match_ingredients(to_match)
+        matches.update((match[0], match) for match in new_matches)
+        if store is not None:
+            store.put_many(context, new_matches)
+    if store is not None:
+        store.close()
+
+    info_by_canonical = nutrition_for_matches(matches)
+    for name, canonical in canonical_of.items():
+        if canonical in info_by_canonical:
+            nutrition_lookup[name] = info_by_canonical[canonical]
 
     successful_matches = len([k for k, v in nutrition_lookup.items() if v])
 
 
-def process_restaurants(input_file='restaurants_with_ingredients.csv', output_file='restaurant_averages_with_score.csv'):
-    if not load_and_preprocess_data():
-        return
-
-    try:
-        df = pd.read_csv(input_file)
-    except FileNotFoundError:
-        print("Input file not found.")
-        return
-
-    create_nutrition_lookup_table(df)
-
+def split_ingredients(ingredient_lists: np.ndarray) -> tuple[List[str], np.ndarray]:
+    """Flat list of the ingredient names of every list, in order, and the number of names per list."""
     if MAX_INGREDIENTS_PER_ITEM and MAX_INGREDIENTS_PER_ITEM > 0:
-        def split_and_limit(ingredients_str):
-            if pd.isna(ingredients_str):
-                return []
+        def split(ingredients_str):
             return [x.strip() for x in str(ingredients_str).split(',') if x.strip()][:MAX_INGREDIENTS_PER_ITEM]
-
-        ingredients_exploded_df = df.set_index(['restaurant_id', df.index]).ingredients.apply(split_and_limit).explode().reset_index()
     else:
-        ingredients_exploded_df = df.set_index(['restaurant_id', df.index]).ingredients.str.split(',').explode().reset_index()
-
-    ingredients_exploded_df.rename(columns={'level_1': 'menu_item_index', 'ingredients': 'ingredient_name'}, inplace=True)
-    ingredients_exploded_df['ingredient_name'] = ingredients_exploded_df['ingredient_name'].str.strip()
-
-    lookup_df = pd.DataFrame.from_dict(nutrition_lookup, orient='index').reset_index()
-    lookup_df.rename(columns={'index': 'ingredient_name'}, inplace=True)
-    for col in ['calories', 'sodium', 'protein']:
-        if col not in lookup_df.columns:
-            lookup_df[col] = np.nan
-
-    merged_ingredients_df = ingredients_exploded_df.merge(lookup_df, on='ingredient_name', how='left')
-
-    item_averages_df = merged_ingredients_df.groupby(['restaurant_id', 'menu_item_index']).mean(numeric_only=True).reset_index()
-
-    final_df = item_averages_df.groupby('restaurant_id').mean(numeric_only=True).reset_index()
-
+        def split(ingredients_str):
+            return [x.strip() for x in str(ingredients_str).split(',')]
+
+    lists = [split(value) for value in ingredient_lists]
+    lengths = np.fromiter((len(names) for names in lists), dtype=np.int64, count=len(lists))
+    return list(chain.from_iterable(lists)), lengths
+
+def nutrient_table(names: np.ndarray) -> np.ndarray:
+    """calories/sodium/protein for each name from nutrition_lookup, NaN for unmatched names."""
+    table = np.full((len(names), 3), np.nan)
+    for code, name in enumerate(names):
+        info = nutrition_lookup.get(name)
+        if info:
+            table[code] = [info.get('calories', np.nan), info.get('sodium', np.nan), info.get('protein', np.nan)]
+    return table
+
+def item_means(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Mean calories/sodium/protein of each menu item's matched ingredients, one
+    row per item in file order.
+
+    An item's mean depends only on its ingredients string, so the strings are
+    factorized and each distinct list is split and averaged once. Ingredient
+    names are factorized too, and their nutrient values come from an array
+    indexed by ingredient id. The sums are compensated like pandas' groupby
+    mean, so the means match the merge-and-groupby they replace bit for bit.
+    """
+    df = df[df['restaurant_id'].notna()]
+    list_codes, lists = pd.factorize(df['ingredients'])
+    names, lengths = split_ingredients(np.asarray(lists, dtype=object))
+    name_codes, unique_names = pd.factorize(pd.Series(names, dtype=object))
+    values = nutrient_table(unique_names)[name_codes]
+
+    n_lists = len(lists)
+    sums = np.zeros((n_lists, 3))
+    counts = np.zeros((n_lists, 3), dtype=np.int64)
+    compensated_group_sums(np.repeat(np.arange(n_lists), lengths), values, sums, np.zeros((n_lists, 3)), counts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # One extra all-NaN row for items without an ingredient list (code -1).
+        list_means = np.vstack([np.where(counts > 0, sums / counts, np.nan), np.full((1, 3), np.nan)])
+    means = list_means[list_codes]
+
+    return pd.DataFrame({
+        'restaurant_id': df['restaurant_id'].to_numpy(),
+        'menu_item_index': df.index.to_numpy(),
+        'calories': means[:, 0],
+        'sodium': means[:, 1],
+        'protein': means[:, 2],
+    })
+
+def restaurant_means(items: pd.DataFrame) -> pd.DataFrame:
+    """Mean of the item means per restaurant, sorted by restaurant_id."""
+    restaurant_codes, restaurant_ids = pd.factorize(items['restaurant_id'], sort=True)
+    # pandas' grouped mean on the integer codes is already one compensated
+    # pass; plain bincount sums would drift from it in the last bits.
+    means = pd.DataFrame(items[['calories', 'sodium', 'protein']].to_numpy()).groupby(restaurant_codes).mean().to_numpy()
+    return pd.DataFrame({
+        'restaurant_id': restaurant_ids,
+        'calories': means[:, 0],
+        'sodium': means[:, 1],
+        'protein': means[:, 2],
+    })
+
+def score_restaurants(final_df: pd.DataFrame) -> pd.DataFrame:
+    """Turn per-restaurant calories/sodium/protein means into average_* columns and a healthiness_score."""
     expected_cols_map = {
         'calories': 'average_calories',
         'sodium': 'average_sodium',
@@ -202,6 +291,21 @@ def process_restaurants(input_file='restaurants_with_ingredients.csv', output_fi
     final_df['healthiness_score'] = (final_df['avg_ratios'] * 100).round(2)
 
     final_df.drop(columns=['menu_item_index', 'ratio_cal', 'ratio_sod', 'ratio_prot', 'avg_ratios'], inplace=True, errors='ignore')
+    return final_df
+
+def process_restaurants(input_file='restaurants_with_ingredients.csv', output_file='restaurant_averages_with_score.csv'):
+    if not load_and_preprocess_data():
+        return
+
+    try:
+        df = pd.read_csv(input_file)
+    except FileNotFoundError:
+        print("Input file not found.")
+        return
+
+    create_nutrition_lookup_table(df)
+
+    final_df = score_restaurants(restaurant_means(item_means(df)))
 
     final_df.to_csv(output_file, index=False)
 
@@ -209,5 +313,135 @@ def process_restaurants(input_file='restaurants_with_ingredients.csv', output_fi
     print("\nFinal Restaurant Averages and Healthiness Scores:")
     print(final_df.head(10))
 
+def incremental_settings() -> Dict[str, Any]:
+    """Everything the saved totals depend on besides the input rows; a change forces a rebuild."""
+    sources = {}
+    for path in (FOOD_CSV_PATH, NUTRIENT_CSV_PATH, FOOD_NUTRIENT_CSV_PATH):
+        stat = os.stat(path)
+        sources[path] = [stat.st_size, stat.st_mtime_ns]
+    return {
+        'fdc_sources': sources,
+        'fuzzy_match_threshold': FUZZY_MATCH_THRESHOLD,
+        'matcher': f"embedding:{EMBEDDING_MODEL}:{EMBEDDING_MATCH_THRESHOLD}" if MATCHER == 'embedding' else 'fuzzy',
+        'max_ingredients_per_item': MAX_INGREDIENTS_PER_ITEM,
+        'canonicalize': CANONICALIZE,
+        'canonical_version': CANONICAL_VERSION,
+        'dri': [DRI_CALORIES, DRI_SODIUM, DRI_PROTEIN],
+    }
+
+def prefix_digest(input_file: str, offset: int) -> str:
+    """
+    Hash of the first and last SAMPLE_BYTES before offset, to notice an input
+    file that was rewritten rather than appended to without rereading it.
+    """
+    digest = hashlib.sha256()
+    with open(input_file, 'rb') as f:
+        digest.update(f.read(min(offset, SAMPLE_BYTES)))
+        tail_start = max(0, offset - SAMPLE_BYTES)
+        f.seek(tail_start)
+        digest.update(f.read(offset - tail_start))
+    return digest.hexdigest()
+
+def read_new_rows(input_file: str, offset: Optional[int], first_index: int) -> tuple[pd.DataFrame, int]:
+    """
+    Rows after byte offset (or the whole file when offset is None), indexed
+    from first_index. A trailing line without a newline is left for the next
+    run. Returns the rows and the offset just past them.
+    """
+    with open(input_file, 'rb') as f:
+        header = f.readline()
+        if offset is not None:
+            f.seek(offset)
+        data = f.read()
+        start = f.tell() - len(data)
+    complete = data[:data.rfind(b'\n') + 1]
+    df = pd.read_csv(io.BytesIO(header + complete))
+    df.index = pd.RangeIndex(first_index, first_index + len(df))
+    return df, start + len(complete)
+
+def totals_frame(totals: RestaurantTotals) -> pd.DataFrame:
+    final_df = pd.DataFrame({'restaurant_id': totals.restaurant_ids})
+    for j, name in enumerate(['average_calories', 'average_sodium', 'average_protein']):
+        final_df[name] = totals.averages[:, j]
+    final_df['healthiness_score'] = totals.scores
+    return final_df
+
+def process_restaurants_incremental(input_file='restaurants_with_ingredients.csv',
+                                    output_file='restaurant_averages_with_score.csv',
+                                    state_dir=None, rebuild=False):
+    """
+    Like process_restaurants, but only reads rows appended to input_file
+    since the last run. Per-restaurant running totals are saved next to the
+    output; new rows are matched (reusing stored ingredient matches), folded
+    into the totals, and only the restaurants they touch are rescored. The
+    output is identical to a full process_restaurants run over the whole file.
+    """
+    state_dir = state_dir or output_file + STATE_SUFFIX
+    try:
+        settings = incremental_settings()
+    except FileNotFoundError as e:
+        print(f"Error: {e.filename} not found.")
+        return
+    if not os.path.exists(input_file):
+        print("Input file not found.")
+        return
+
+    totals, meta = (None, {}) if rebuild else RestaurantTotals.load(state_dir)
+    reason = None
+    if totals is None:
+        reason = "rebuild requested" if rebuild else "no saved state"
+    elif meta.get('settings') != settings:
+        reason = "settings or FDC data changed"
+    elif (meta.get('input') != os.path.abspath(input_file) or os.path.getsize(input_file) < meta['offset']
+          or prefix_digest(input_file, meta['offset']) != meta['prefix_sha256']):
+        reason = "input file was rewritten"
+    if reason is not None:
+        print(f"Scoring every row ({reason})...")
+        totals, meta = RestaurantTotals.empty(3), {'offset': None, 'rows': 0}
+
+    df, offset = read_new_rows(input_file, meta['offset'], meta['rows'])
+    if len(df):
+        if not load_and_preprocess_data():
+            return
+        create_nutrition_lookup_table(df)
+        items = item_means(df)
+        changed = totals.add(items['restaurant_id'].to_numpy(), items[['calories', 'sodium', 'protein']].to_numpy())
+
+        affected_df = pd.DataFrame({'restaurant_id': totals.restaurant_ids[changed]})
+        means = totals.means(changed)
+        for j, name in enumerate(['calories', 'sodium', 'protein']):
+            affected_df[name] = means[:, j]
+        affected_df = score_restaurants(affected_df)
+        totals.averages[changed] = affected_df[['average_calories', 'average_sodium', 'average_protein']].to_numpy()
+        totals.scores[changed] = affected_df['healthiness_score'].to_numpy()
+        print(f"Folded in {len(df)} new rows; rescored {len(changed)} of {len(totals)} restaurants")
+    else:
+        print("No new rows; scores are up to date")
+
+    rows = meta['rows'] + len(df)
+    totals.save(state_dir, {'settings': settings, 'input': os.path.abspath(input_file), 'offset': offset,
+                            'rows': rows, 'prefix_sha256': prefix_digest(input_file, offset)})
+    # Written from the saved totals every time, so an interrupted run never leaves a stale output behind.
+    final_df = totals_frame(totals)
+    final_df.to_csv(output_file, index=False)
+
+    print("\nFinal Restaurant Averages and Healthiness Scores:")
+    print(final_df.head(10))
+
+def main():
+    parser = argparse.ArgumentParser(description="Score restaurants from the ingredients of their menu items.")
+    parser.add_argument('--input', default='restaurants_with_ingredients.csv', help="Menu items with generated ingredients")
+    parser.add_argument('--output', default='restaurant_averages_with_score.csv', help="Per-restaurant averages and scores")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only score rows appended since the last --incremental run and update the affected restaurants")
+    parser.add_argument('--rebuild', action='store_true', help="With --incremental, discard the saved totals first")
+
+    args = parser.parse_args()
+
+    if args.incremental:
+        process_restaurants_incremental(args.input, args.output, rebuild=args.rebuild)
+    else:
+        process_restaurants(args.input, args.output)
+
 if __name__ == '__main__':
-    process_restaurants()
+    main()
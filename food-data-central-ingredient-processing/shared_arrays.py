@@ -0,0 +1,55 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class StringArray:
+    """
+    Read-only list of strings stored as one UTF-8 buffer plus offsets, so it
+    can be saved with np.save and memory-mapped by other processes.
+    """
+
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    @classmethod
+    def from_list(cls, strings: List[str]) -> 'StringArray':
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(buffer, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def tolist(self) -> List[str]:
+        return [self[i] for i in range(len(self))]
+
+
+def save_arrays(directory: str, arrays: Dict[str, np.ndarray], meta: Optional[dict] = None):
+    """Write each array to <directory>/<name>.npy plus an optional meta.json."""
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f'{name}.npy'), np.asarray(array))
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta or {}, f)
+
+
+def load_arrays(directory: str, names: List[str], mmap: bool = True):
+    """
+    Load arrays written by save_arrays. With mmap=True the files are mapped
+    read-only, so every process attaching to the same directory shares the
+    page cache instead of holding its own copy.
+    """
+    mode = 'r' if mmap else None
+    arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mode) for name in names}
+    with open(os.path.join(directory, 'meta.json')) as f:
+        meta = json.load(f)
+    return arrays, meta
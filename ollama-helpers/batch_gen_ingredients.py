@@ -1,5 +1,19 @@
 import pandas as pd
-import ollama
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+from llm_backend import EndpointPool
+from llm_cache import LLMCache, cached_chat
+from llm_policy import CallPolicy
+from llm_telemetry import TelemetryLog
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'uber-eats-menu-processing'))
+from buildPrompts import partition_keys
 
 MENU_FILE = 'datasets/restaurant-menus.csv'
 
@@ -9,8 +23,48 @@ INPUT_COL = 'name_menu'
 OUTPUT_COL = 'ingredients'
 MODEL = 'llama3.2:3b-instruct-q8_0'
 STATE = "DC"
+USE_CACHE = True
+# Log token counts and Ollama timings for every call to llm_telemetry.jsonl.
+USE_TELEMETRY = True
+# Rows generated between appends to OUTPUT_FILE; the checkpoint advances once per batch.
+BATCH_SIZE = 100
+CHECKPOINT_SUFFIX = '.checkpoint'
+# Generate once per normalized item name and reuse the result for repeats (chains, "Coke", ...).
+DEDUPLICATE = True
+# Menu items packed into one request with a JSON answer; 1 sends one plain-text request per item.
+ITEMS_PER_PROMPT = 1
+BATCH_RESPONSE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'items': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'index': {'type': 'integer'},
+                    'ingredients': {'type': 'array', 'items': {'type': 'string'}},
+                },
+                'required': ['index', 'ingredients'],
+            },
+        },
+    },
+    'required': ['items'],
+}
+SHARD_DIR = 'ingredient_shards'
+MANIFEST_NAME = 'manifest.json'
+# Partitions generated in parallel with --all-states; keep near the server's OLLAMA_NUM_PARALLEL.
+PARTITION_WORKERS = 4
+# Send a duplicate request for items slower than the recent p95 and keep the first answer.
+HEDGE = False
+# Generate items written as "ERROR" once more after the main pass.
+RETRY_FAILED = True
 
-def process_data():
+def load_menu_items(state=STATE, partition_by=None):
+    """
+    Menu items to generate ingredients for, as restaurant_id / name_menu rows.
+    With state=None every restaurant is kept; partition_by ('state' or
+    'zip3') adds a partition column.
+    """
     print(f"Reading {MENU_FILE} and {RESTAURANT_FILE}...")
     try:
         restaurant_menus_df = pd.read_csv(MENU_FILE)
@@ -18,11 +72,12 @@ def process_data():
 
         restaurants = pd.read_csv(RESTAURANT_FILE)
         restaurants['state'] = restaurants['full_address'].str.split(', ').str[-2]
-        restaurants = restaurants[restaurants['state'] == STATE].copy()
+        if state is not None:
+            restaurants = restaurants[restaurants['state'] == state].copy()
 
     except FileNotFoundError as e:
         print(f"Error: {e}")
-        return
+        return None
 
     df = pd.merge(
         restaurant_menus_df,
@@ -34,44 +89,394 @@ def process_data():
     )
 
     df.dropna(subset=['id'], inplace=True)
-    df = df[['restaurant_id', 'name_menu']]
 
     if INPUT_COL not in df.columns:
         print(f"Error: Column '{INPUT_COL}' not found in the merged data.")
+        return None
+
+    if partition_by is not None:
+        df['partition'] = partition_keys(df, partition_by)
+        return df[['restaurant_id', 'name_menu', 'partition']]
+    return df[['restaurant_id', 'name_menu']]
+
+def process_data(backend=None, items_per_prompt=ITEMS_PER_PROMPT, hedge=HEDGE):
+    df = load_menu_items(STATE)
+    if df is None:
         return
+    generate_ingredients_file(df, OUTPUT_FILE, backend=backend, items_per_prompt=items_per_prompt, hedge=hedge)
 
-    ingredients_list = []
-    
-    print(f"Starting ingredient generation with {MODEL}...")
+def generate_ingredients_file(df, output_file, label='', backend=None, items_per_prompt=ITEMS_PER_PROMPT, hedge=HEDGE):
+    """
+    Generate ingredients for every row of df into output_file, appending in
+    checkpointed batches and resuming from output_file's checkpoint if present.
+    With RETRY_FAILED, rows written as "ERROR" are generated once more at the
+    end, including rows left over from an earlier run.
+    """
+    checkpoint_file = output_file + CHECKPOINT_SUFFIX
+    start = resume_position(df, output_file)
+    total = len(df)
+    cache = LLMCache() if USE_CACHE else None
+    telemetry = TelemetryLog('batch_gen_ingredients') if USE_TELEMETRY else None
+    policy = CallPolicy(hedge=hedge)
+
+    if start >= total:
+        print(f"{label}All {total} rows already present in {output_file}; nothing to do.")
+    else:
+        if start > 0:
+            print(f"{label}Resuming from row {start+1}/{total} using {checkpoint_file}")
+        generate_rows(df, output_file, start, cache, backend, policy, label, telemetry, items_per_prompt)
+    if RETRY_FAILED:
+        sweep_failed_rows(output_file, cache, backend, policy, label, telemetry)
 
+    if cache is not None:
+        stats = cache.stats()
+        print(f"{label}Cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate)")
+        cache.close()
+    if telemetry is not None:
+        telemetry.close()
+    policy.report(label)
+    return total
+
+def generate_rows(df, output_file, start, cache, backend, policy, label='', telemetry=None, items_per_prompt=ITEMS_PER_PROMPT):
+    """Generate rows start..end of df and append them to output_file batch by batch."""
     total = len(df)
-    for index, row in df.iterrows():
-        item_description = str(row[INPUT_COL])
-        
-        prompt = (
-            f"You are a food scientist. Analyze the following menu item description and generate a single, "
-            f"comma-separated list of the most likely ingredients. Focus on primary components (proteins, vegetables, grains, main sauces/spices).\n"
-            f"DO NOT include any explanation, introduction, or extra text. Your entire response MUST be ONLY the comma-separated list of ingredients.\n\n"
-            f"Menu Item Description: {item_description}"
-        )
-
-        print(f"Processing row {index+1}/{total}...")
-
-        try:
-            response = ollama.chat(model=MODEL, messages=[
-                {'role': 'user', 'content': prompt},
-            ])
-            
-            raw_text = response['message']['content'].strip()
-            ingredients_list.append(raw_text)
-            
-        except Exception as e:
-            print(f"Error on row {index}: {e}")
-            ingredients_list.append("ERROR") 
-
-    df[OUTPUT_COL] = ingredients_list
-    df.to_csv(OUTPUT_FILE, index=False)
-    print(f"\nDone! Results saved to {OUTPUT_FILE}")
+
+    item_keys = df[INPUT_COL].astype(str).map(normalize_item_name) if DEDUPLICATE else None
+    generated = {}
+    if DEDUPLICATE:
+        unique_items = item_keys.nunique()
+        print(f"{label}{unique_items} unique items across {total} rows "
+              f"(dedup ratio {total / max(unique_items, 1):.2f}x, {1 - unique_items / max(total, 1):.1%} of calls skipped)")
+        if start > 0:
+            generated = load_generated(item_keys.iloc[:start], output_file)
+
+    print(f"{label}Starting ingredient generation with {MODEL}...")
+
+    workers = backend.capacity if backend is not None else 1
+    reused = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch_start in range(start, total, BATCH_SIZE):
+            batch_end = min(batch_start + BATCH_SIZE, total)
+            ingredients_list, batch_reused = generate_batch(
+                df, item_keys, batch_start, batch_end, generated, cache, backend, executor, label, telemetry,
+                items_per_prompt, policy)
+            reused += batch_reused
+            flush_batch(df.iloc[batch_start:batch_end], ingredients_list, batch_end - 1, output_file)
+
+    print(f"\n{label}Done! Results saved to {output_file}")
+    if DEDUPLICATE:
+        print(f"{label}Reused ingredients for {reused} duplicate rows")
+
+def sweep_failed_rows(output_file, cache, backend, policy, label='', telemetry=None):
+    """
+    Generate the items of output_file's "ERROR" rows once more, one request
+    per distinct item, and rewrite the file with the answers that came back.
+    Rows that fail again keep "ERROR". Returns the number of rows fixed.
+    """
+    if not os.path.exists(output_file):
+        return 0
+    done = pd.read_csv(output_file, dtype=str, keep_default_na=False)
+    failed = done[OUTPUT_COL] == "ERROR"
+    if not failed.any():
+        return 0
+    first_row = {}
+    for position, item in zip(done.index[failed], done.loc[failed, INPUT_COL]):
+        first_row.setdefault(item, position)
+    print(f"{label}Retrying {len(first_row)} items for {int(failed.sum())} rows written as ERROR...")
+
+    workers = backend.capacity if backend is not None else 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {item: executor.submit(generate_ingredients, cache, item, position, backend, telemetry, policy)
+                   for item, position in first_row.items()}
+        answers = {item: future.result() for item, future in futures.items()}
+
+    retried = done.loc[failed, INPUT_COL].map(answers)
+    done.loc[failed, OUTPUT_COL] = retried
+    fixed = int((retried != "ERROR").sum())
+    if fixed:
+        tmp_path = output_file + '.tmp'
+        done.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, output_file)
+        checkpoint_file = output_file + CHECKPOINT_SUFFIX
+        checkpoint = read_checkpoint(checkpoint_file)
+        if checkpoint is not None:
+            write_checkpoint(checkpoint_file, checkpoint['row_index'], checkpoint['restaurant_id'], os.path.getsize(output_file))
+    print(f"{label}{fixed} of {int(failed.sum())} rows generated on retry")
+    return fixed
+
+def generate_batch(df, item_keys, batch_start, batch_end, generated, cache, backend, executor, label='', telemetry=None,
+                   items_per_prompt=ITEMS_PER_PROMPT, policy=None):
+    """
+    Ingredients for rows batch_start..batch_end-1, in row order. Items not
+    generated yet are sent to the model concurrently (one at a time without a
+    multi-host backend), items_per_prompt to a request; repeats reuse the
+    first result. Returns the list and the number of reused rows.
+    """
+    total = len(df)
+    pending = {}
+    for position in range(batch_start, batch_end):
+        key = item_keys.iat[position] if DEDUPLICATE else position
+        if key in generated or key in pending:
+            continue
+        pending[key] = position
+
+    results = {}
+    if items_per_prompt > 1:
+        keys = list(pending)
+        groups = [keys[i:i + items_per_prompt] for i in range(0, len(keys), items_per_prompt)]
+        futures = []
+        for group in groups:
+            positions = [pending[key] for key in group]
+            print(f"{label}Processing rows {', '.join(str(position + 1) for position in positions)} of {total}...")
+            descriptions = [str(df[INPUT_COL].iat[position]) for position in positions]
+            futures.append((group, executor.submit(generate_ingredients_multi, cache, descriptions, positions, backend, telemetry, policy)))
+        for group, future in futures:
+            results.update(zip(group, future.result()))
+    else:
+        futures = {}
+        for key, position in pending.items():
+            print(f"{label}Processing row {position+1}/{total}...")
+            futures[key] = executor.submit(generate_ingredients, cache, str(df[INPUT_COL].iat[position]), position, backend, telemetry, policy)
+        results = {key: future.result() for key, future in futures.items()}
+    if DEDUPLICATE:
+        generated.update((key, ingredients) for key, ingredients in results.items() if ingredients != "ERROR")
+
+    ingredients_list = []
+    reused = 0
+    for position in range(batch_start, batch_end):
+        key = item_keys.iat[position] if DEDUPLICATE else position
+        if key in results:
+            ingredients_list.append(results[key])
+            # Only the first row with this item was sent to the model.
+            if pending.pop(key, None) is None:
+                reused += 1
+        else:
+            ingredients_list.append(generated[key])
+            reused += 1
+    return ingredients_list, reused
+
+def generate_partition(partition, df, shard_path, hosts=None, items_per_prompt=ITEMS_PER_PROMPT, hedge=HEDGE):
+    backend = EndpointPool.from_specs(hosts)
+    rows = generate_ingredients_file(df, shard_path, label=f"[{partition}] ", backend=backend, items_per_prompt=items_per_prompt,
+                                     hedge=hedge)
+    return {'partition': partition, 'path': os.path.basename(shard_path), 'rows': rows}
+
+def process_partitions(shard_dir=SHARD_DIR, partition_by='state', workers=PARTITION_WORKERS, hosts=None,
+                       items_per_prompt=ITEMS_PER_PROMPT, hedge=HEDGE):
+    """
+    Generate ingredients for all restaurants in one pass over the source
+    files, running partitions (state or zip prefix) in parallel processes.
+    Each partition writes and checkpoints its own shard, and a manifest in
+    shard_dir lists the shards for later stages. With hosts, every worker
+    process balances over them with its own per-host limits.
+    """
+    df = load_menu_items(state=None, partition_by=partition_by)
+    if df is None:
+        return
+
+    os.makedirs(shard_dir, exist_ok=True)
+    tasks = [
+        (partition, part[['restaurant_id', 'name_menu']].reset_index(drop=True), os.path.join(shard_dir, f"{partition}.csv"), hosts, items_per_prompt, hedge)
+        for partition, part in df.groupby('partition', sort=True)
+    ]
+    print(f"Generating {len(tasks)} partitions with {workers} workers...")
+
+    with Pool(processes=workers) as pool:
+        shards = pool.starmap(generate_partition, tasks)
+
+    manifest = {'stage': 'ingredients', 'partition_by': partition_by, 'shards': shards}
+    with open(os.path.join(shard_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Wrote {len(shards)} shards to {shard_dir}")
+
+def normalize_item_name(name):
+    """Case-fold, replace punctuation with spaces and collapse whitespace."""
+    name = re.sub(r'[^\w\s]', ' ', name.lower())
+    return ' '.join(name.split())
+
+def load_generated(done_keys, output_file):
+    """Map normalized item names to the ingredients already written before a resume."""
+    done = pd.read_csv(output_file, usecols=[OUTPUT_COL], keep_default_na=False)[OUTPUT_COL]
+    generated = {}
+    for key, ingredients in zip(done_keys, done):
+        if ingredients != "ERROR":
+            generated.setdefault(key, ingredients)
+    return generated
+
+def build_prompt(item_description):
+    return (
+        f"You are a food scientist. Analyze the following menu item description and generate a single, "
+        f"comma-separated list of the most likely ingredients. Focus on primary components (proteins, vegetables, grains, main sauces/spices).\n"
+        f"DO NOT include any explanation, introduction, or extra text. Your entire response MUST be ONLY the comma-separated list of ingredients.\n\n"
+        f"Menu Item Description: {item_description}"
+    )
+
+def build_batch_prompt(item_descriptions):
+    items = "\n".join(f"{index}. {description}" for index, description in enumerate(item_descriptions, start=1))
+    return (
+        f"You are a food scientist. For each numbered menu item description below, list the most likely ingredients. "
+        f"Focus on primary components (proteins, vegetables, grains, main sauces/spices).\n"
+        f"Respond with JSON only: an object whose \"items\" array has one entry per menu item, with its number as "
+        f"\"index\" and its ingredients as the \"ingredients\" array of strings.\n\n"
+        f"Menu Item Descriptions:\n{items}"
+    )
+
+def parse_batch_response(content, item_count):
+    """
+    Map item number (1-based) to a comma-separated ingredient string. Entries
+    that are malformed, out of range, duplicated or empty are dropped; a
+    response that is not valid JSON yields an empty dict.
+    """
+    try:
+        items = json.loads(content)['items']
+    except (json.JSONDecodeError, TypeError, KeyError):
+        return {}
+    if not isinstance(items, list):
+        return {}
+
+    parsed = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        index, ingredients = item.get('index'), item.get('ingredients')
+        if not isinstance(index, int) or not 1 <= index <= item_count or index in parsed:
+            continue
+        if isinstance(ingredients, str):
+            ingredients = ingredients.split(',')
+        if not isinstance(ingredients, list):
+            continue
+        names = [str(name).strip() for name in ingredients if str(name).strip()]
+        if names:
+            parsed[index] = ', '.join(names)
+    return parsed
+
+def llm_chat(cache, messages, backend=None, policy=None, **kwargs):
+    """cached_chat through the backend, under the call policy when one is given."""
+    if policy is None:
+        return cached_chat(cache, MODEL, messages, chat_fn=backend.chat if backend is not None else None, **kwargs)
+    chat_fn = backend.chat if backend is not None else policy.chat_fn()
+    return policy.call(lambda: cached_chat(cache, MODEL, messages, chat_fn=chat_fn, **kwargs))
+
+def generate_ingredients_multi(cache, item_descriptions, positions, backend=None, telemetry=None, policy=None):
+    """
+    Ingredients for several items from one JSON-formatted request, in input
+    order. Items missing from a malformed or partial answer are generated
+    again one at a time.
+    """
+    start_time = time.time()
+    try:
+        response = llm_chat(cache, [
+            {'role': 'user', 'content': build_batch_prompt(item_descriptions)},
+        ], backend, policy, format=BATCH_RESPONSE_SCHEMA)
+        parsed = parse_batch_response(response['message']['content'], len(item_descriptions))
+        if telemetry is not None:
+            telemetry.record(MODEL, time.time() - start_time, response, failed=len(parsed) < len(item_descriptions),
+                             row=positions[0], items=len(item_descriptions), missing=len(item_descriptions) - len(parsed))
+    except Exception as e:
+        if telemetry is not None:
+            telemetry.record(MODEL, time.time() - start_time, error=e, row=positions[0], items=len(item_descriptions))
+        print(f"Error on rows {positions[0]}-{positions[-1]}: {e}")
+        parsed = {}
+
+    if len(parsed) < len(item_descriptions):
+        print(f"Batch for rows {positions[0]}-{positions[-1]} answered {len(parsed)}/{len(item_descriptions)} items; "
+              f"generating the rest one at a time")
+    return [
+        parsed[index] if index in parsed else generate_ingredients(cache, description, position, backend, telemetry, policy)
+        for index, (description, position) in enumerate(zip(item_descriptions, positions), start=1)
+    ]
+
+def generate_ingredients(cache, item_description, position, backend=None, telemetry=None, policy=None):
+    start_time = time.time()
+    try:
+        response = llm_chat(cache, [
+            {'role': 'user', 'content': build_prompt(item_description)},
+        ], backend, policy)
+        ingredients = response['message']['content'].strip()
+        if telemetry is not None:
+            telemetry.record(MODEL, time.time() - start_time, response, failed=not ingredients, row=position)
+        return ingredients
+
+    except Exception as e:
+        if telemetry is not None:
+            telemetry.record(MODEL, time.time() - start_time, error=e, row=position)
+        print(f"Error on row {position}: {e}")
+        return "ERROR"
+
+def read_checkpoint(checkpoint_file):
+    try:
+        with open(checkpoint_file) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def write_checkpoint(checkpoint_file, row_index, restaurant_id, output_bytes):
+    tmp_path = checkpoint_file + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'row_index': int(row_index),
+            'restaurant_id': int(restaurant_id),
+            'output_bytes': int(output_bytes),
+        }, f)
+    os.replace(tmp_path, checkpoint_file)
+
+def resume_position(df, output_file):
+    """
+    Return the first row that still needs generating. The checkpoint records the
+    last row flushed, its restaurant_id and the size of output_file at that point;
+    anything appended after the checkpoint (a batch interrupted mid-write) is
+    truncated away so it is regenerated instead of duplicated.
+    """
+    checkpoint_file = output_file + CHECKPOINT_SUFFIX
+    checkpoint = read_checkpoint(checkpoint_file)
+    if checkpoint is None or not os.path.exists(output_file):
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        return 0
+
+    row_index = checkpoint['row_index']
+    if row_index >= len(df) or int(df['restaurant_id'].iat[row_index]) != checkpoint['restaurant_id']:
+        print(f"Warning: {checkpoint_file} does not match the input data; starting over.")
+        os.remove(output_file)
+        os.remove(checkpoint_file)
+        return 0
+
+    with open(output_file, 'r+b') as f:
+        f.truncate(checkpoint['output_bytes'])
+    return row_index + 1
+
+def flush_batch(batch_df, ingredients_list, last_position, output_file):
+    batch_df = batch_df.copy()
+    batch_df[OUTPUT_COL] = ingredients_list
+    write_header = not os.path.exists(output_file)
+    batch_df.to_csv(output_file, mode='a', header=write_header, index=False)
+    write_checkpoint(output_file + CHECKPOINT_SUFFIX, last_position, batch_df['restaurant_id'].iat[-1], os.path.getsize(output_file))
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate ingredient lists for menu items with an Ollama model.")
+    parser.add_argument('--all-states', action='store_true',
+                        help=f"Process every restaurant instead of only {STATE}, one output shard per partition")
+    parser.add_argument('--partition-by', choices=['state', 'zip3'], default='state',
+                        help="Partition key for --all-states: state or 3-digit zip prefix")
+    parser.add_argument('--shard-dir', default=SHARD_DIR, help="Output directory for --all-states shards and manifest")
+    parser.add_argument('--workers', type=int, default=PARTITION_WORKERS, help="Partitions processed in parallel")
+    parser.add_argument('--hosts', nargs='+',
+                        help="Ollama hosts to balance over, as host or host=max_concurrency (default: $OLLAMA_HOSTS, else the local server)")
+
+    parser.add_argument('--items-per-prompt', type=int, default=ITEMS_PER_PROMPT,
+                        help="Menu items packed into one JSON-formatted request (1 = one plain-text request per item)")
+    parser.add_argument('--hedge', action='store_true', default=HEDGE,
+                        help="Send a duplicate request for items slower than the recent p95 and keep the first answer")
+
+    args = parser.parse_args()
+
+    if args.all_states:
+        process_partitions(args.shard_dir, args.partition_by, args.workers, args.hosts, args.items_per_prompt, args.hedge)
+    else:
+        backend = EndpointPool.from_specs(args.hosts)
+        process_data(backend, args.items_per_prompt, args.hedge)
+        if backend is not None:
+            backend.report()
 
 if __name__ == "__main__":
-    process_data()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -1,8 +1,14 @@
 import pandas as pd
 import ollama
+import argparse
+import asyncio
 import re
 import time
 from datetime import datetime
+from llm_backend import EndpointPool
+from llm_cache import LLMCache, cached_chat, cached_chat_async
+from llm_policy import CallPolicy
+from llm_telemetry import TelemetryLog
 
 INPUT_FILE = 'prompts.csv'      
 OUTPUT_FILE = 'nutrition_scores_from_menu.csv'
@@ -10,6 +16,22 @@ INPUT_COL = 'summary'
 OUTPUT_COL = 'nutrition_score'
 # MODEL = 'tinyllama'
 MODEL = 'llama3.2:3b-instruct-q8_0'
+# Number of requests kept in flight in async mode. Match OLLAMA_NUM_PARALLEL on the server.
+CONCURRENCY = 4
+USE_CACHE = True
+# Log token counts and Ollama timings for every call to llm_telemetry.jsonl.
+USE_TELEMETRY = True
+SYSTEM_PROMPT = 'Respond with ONLY a number 0-100. No text.'
+# Stream responses and stop generating as soon as a score has been read.
+STREAM = False
+# Hard cap on tokens generated per request in streaming mode; a score needs a few.
+NUM_PREDICT = 16
+# How long Ollama keeps the model loaded after a request, so it is not reloaded between rows.
+KEEP_ALIVE = '30m'
+# Send a duplicate request for rows slower than the recent p95 and keep the first answer.
+HEDGE = False
+# Score rows that came back as -1 once more after the main pass.
+RETRY_FAILED = True
 
 def extract_score(text):
     """
@@ -56,67 +78,255 @@ def extract_score(text):
             
     return None
 
-def process_csv():
+def early_score(text):
+    """
+    Score from a partial streamed response, once more text can no longer
+    change what extract_score would return for the full answer: a number
+    alone on the first line, or the first "score: N" followed by another
+    character. Anything else ("score is N", a number inside a sentence)
+    could still be overridden by a later "score: N", so reading goes on.
+    """
+    match = re.match(r'\s*(\d+)[ \t\r]*\n', text)
+    if match and 0 <= int(match.group(1)) <= 100:
+        return int(match.group(1))
+    match = re.search(r'score\s*:?\s*(\d+)\D', text, re.IGNORECASE)
+    if match and 0 <= int(match.group(1)) <= 100:
+        return int(match.group(1))
+    return None
+
+def has_score(text):
+    return early_score(text) is not None
+
+def chat_settings(stream=STREAM):
+    """Extra cached_chat arguments; streaming caps generation and stops at the first score."""
+    settings = {'keep_alive': KEEP_ALIVE}
+    if stream:
+        settings.update(options={'num_predict': NUM_PREDICT}, stop_when=has_score)
+    return settings
+
+def build_prompt(menu_summary):
+    return (
+        f"Rate restaurant healthiness 0-100. Ignore price. Consider: vegetables, whole grains, lean proteins vs fried/sugary/processed foods. "
+        f"0-20=very unhealthy, 21-40=unhealthy, 41-60=average, 61-80=healthy, 81-100=very healthy. "
+        f"Respond with ONLY a number 0-100.\n\n"
+        f"{menu_summary}\n\n"
+        f"Score:"
+    )
+
+def build_messages(menu_summary):
+    return [
+        {'role': 'system', 'content': SYSTEM_PROMPT},
+        {'role': 'user', 'content': build_prompt(menu_summary)},
+    ]
+
+def load_input():
     print(f"Reading {INPUT_FILE}...")
     try:
         df = pd.read_csv(INPUT_FILE)
     except FileNotFoundError:
         print(f"Error: {INPUT_FILE} not found.")
-        return
+        return None
 
     if INPUT_COL not in df.columns:
         print(f"Error: Column '{INPUT_COL}' not found.")
+        return None
+    return df
+
+def report_cache(cache):
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate)")
+        cache.close()
+
+def open_telemetry():
+    return TelemetryLog('batch_menu_run') if USE_TELEMETRY else None
+
+def failed_positions(scores):
+    return [position for position, score in enumerate(scores) if score == -1]
+
+def score_row(cache, policy, chat_fn, settings, position, total, menu_summary, telemetry=None, refresh=False):
+    """Score one summary; refresh skips the cached answer, so a retried row is really asked again."""
+    start_time = time.time()
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    print(f"[{timestamp}] Processing row {position+1}/{total}...", end="", flush=True)
+
+    try:
+        response = policy.call(lambda: cached_chat(cache, MODEL, build_messages(menu_summary), chat_fn=chat_fn, refresh=refresh,
+                                                   **settings))
+        
+        raw_text = response['message']['content']
+        score = extract_score(raw_text)
+        
+        final_score = score if score is not None else -1
+        
+        elapsed = time.time() - start_time
+        if telemetry is not None:
+            telemetry.record(MODEL, elapsed, response, failed=final_score == -1, row=position)
+        if final_score == -1:
+            print(f" Done in {elapsed:.2f}s (score: {final_score}) [Failed to extract - raw response: '{raw_text[:100]}...']")
+        else:
+            print(f" Done in {elapsed:.2f}s (score: {final_score})")
+        return final_score
+        
+    except Exception as e:
+        elapsed = time.time() - start_time
+        if telemetry is not None:
+            telemetry.record(MODEL, elapsed, error=e, row=position)
+        print(f" Error after {elapsed:.2f}s: {e}")
+        return -1
+
+def process_csv(use_cache=USE_CACHE, backend=None, stream=STREAM, hedge=HEDGE, retry_failed=RETRY_FAILED):
+    df = load_input()
+    if df is None:
         return
 
-    scores = []
+    cache = LLMCache() if use_cache else None
+    telemetry = open_telemetry()
+    settings = chat_settings(stream)
+    policy = CallPolicy(hedge=hedge)
+    chat_fn = backend.chat if backend else policy.chat_fn()
     
-    print(f"Starting analysis with {MODEL}...")
+    print(f"Starting analysis with {MODEL}{' (streaming)' if stream else ''}...")
 
     total = len(df)
-    for index, row in df.iterrows():
-        menu_summary = str(row[INPUT_COL])
-        
-        prompt = (
-            f"Rate restaurant healthiness 0-100. Ignore price. Consider: vegetables, whole grains, lean proteins vs fried/sugary/processed foods. "
-            f"0-20=very unhealthy, 21-40=unhealthy, 41-60=average, 61-80=healthy, 81-100=very healthy. "
-            f"Respond with ONLY a number 0-100.\n\n"
-            f"{menu_summary}\n\n"
-            f"Score:"
-        )
+    summaries = [str(summary) for summary in df[INPUT_COL]]
+    scores = [score_row(cache, policy, chat_fn, settings, position, total, summary, telemetry)
+              for position, summary in enumerate(summaries)]
 
-        start_time = time.time()
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        print(f"[{timestamp}] Processing row {index+1}/{total}...", end="", flush=True)
+    failed = failed_positions(scores) if retry_failed else []
+    if failed:
+        print(f"\nRetrying {len(failed)} rows without a score...")
+        # The full answer, in case the score came after NUM_PREDICT tokens.
+        for position in failed:
+            scores[position] = score_row(cache, policy, chat_fn, chat_settings(stream=False), position, total,
+                                         summaries[position], telemetry, refresh=True)
+        print(f"{len(failed) - len(failed_positions(scores))} of them scored on retry")
 
+    df[OUTPUT_COL] = scores
+    df.to_csv(OUTPUT_FILE, index=False)
+    print(f"\nDone! Results saved to {OUTPUT_FILE}")
+    report_cache(cache)
+    policy.report()
+    if telemetry is not None:
+        telemetry.close()
+
+async def score_row_async(client, cache, semaphore, position, total, menu_summary, telemetry=None, stream=STREAM, policy=None,
+                          refresh=False):
+    """
+    Score a single summary with the async client. The semaphore bounds how many
+    requests are in flight at once; the returned score is placed by position so
+    output order matches input order regardless of completion order. Without a
+    policy the call is made once, with no deadline or retries; refresh skips
+    the cached answer.
+    """
+    async with semaphore:
+        start_time = time.time()
         try:
-            response = ollama.chat(model=MODEL, messages=[
-                {
-                    'role': 'system',
-                    'content': 'Respond with ONLY a number 0-100. No text.'
-                },
-                {'role': 'user', 'content': prompt},
-            ])
-            
+            settings = chat_settings(stream)
+            chat = lambda: cached_chat_async(cache, client, MODEL, build_messages(menu_summary), refresh=refresh, **settings)
+            response = await (policy.acall(chat) if policy is not None else chat())
             raw_text = response['message']['content']
             score = extract_score(raw_text)
-            
             final_score = score if score is not None else -1
-            scores.append(final_score)
-            
+
             elapsed = time.time() - start_time
+            if telemetry is not None:
+                telemetry.record(MODEL, elapsed, response, failed=final_score == -1, row=position)
+            timestamp = datetime.now().strftime("%H:%M:%S")
             if final_score == -1:
-                print(f" Done in {elapsed:.2f}s (score: {final_score}) [Failed to extract - raw response: '{raw_text[:100]}...']")
+                print(f"[{timestamp}] Row {position+1}/{total} done in {elapsed:.2f}s (score: {final_score}) [Failed to extract - raw response: '{raw_text[:100]}...']")
             else:
-                print(f" Done in {elapsed:.2f}s (score: {final_score})")
-            
+                print(f"[{timestamp}] Row {position+1}/{total} done in {elapsed:.2f}s (score: {final_score})")
+            return final_score
+
         except Exception as e:
             elapsed = time.time() - start_time
-            print(f" Error after {elapsed:.2f}s: {e}")
-            scores.append(-1)
+            if telemetry is not None:
+                telemetry.record(MODEL, elapsed, error=e, row=position)
+            print(f"Row {position+1}/{total} error after {elapsed:.2f}s: {e}")
+            return -1
+
+async def score_all_async(summaries, concurrency=CONCURRENCY, cache=None, backend=None, telemetry=None, stream=STREAM,
+                          policy=None, retry_failed=RETRY_FAILED):
+    """
+    Scores for all summaries in input order. With retry_failed, rows that
+    came back as -1 are scored once more after the rest are done, asking for
+    the full answer (no streaming early stop, no NUM_PREDICT cap).
+    """
+    policy = policy or CallPolicy()
+    client = backend.async_client() if backend is not None else ollama.AsyncClient(timeout=policy.deadline)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    total = len(summaries)
+
+    async def score_positions(positions, refresh=False, stream=stream):
+        tasks = [
+            score_row_async(client, cache, semaphore, position, total, summaries[position], telemetry, stream, policy, refresh)
+            for position in positions
+        ]
+        # gather returns results in task order, not completion order
+        return await asyncio.gather(*tasks)
+
+    scores = await score_positions(range(total))
+    failed = failed_positions(scores) if retry_failed else []
+    if failed:
+        print(f"\nRetrying {len(failed)} rows without a score...")
+        for position, score in zip(failed, await score_positions(failed, refresh=True, stream=False)):
+            scores[position] = score
+        print(f"{len(failed) - len(failed_positions(scores))} of them scored on retry")
+    return scores
+
+def process_csv_async(concurrency=CONCURRENCY, use_cache=USE_CACHE, backend=None, stream=STREAM, hedge=HEDGE,
+                      retry_failed=RETRY_FAILED):
+    df = load_input()
+    if df is None:
+        return
+
+    cache = LLMCache() if use_cache else None
+    telemetry = open_telemetry()
+
+    print(f"Starting analysis with {MODEL} ({concurrency} requests in flight{', streaming' if stream else ''})...")
+
+    start_time = time.time()
+    summaries = [str(summary) for summary in df[INPUT_COL]]
+    policy = CallPolicy(hedge=hedge)
+    scores = asyncio.run(score_all_async(summaries, concurrency, cache, backend, telemetry, stream, policy, retry_failed))
 
     df[OUTPUT_COL] = scores
     df.to_csv(OUTPUT_FILE, index=False)
-    print(f"\nDone! Results saved to {OUTPUT_FILE}")
+    print(f"\nDone in {time.time() - start_time:.2f}s! Results saved to {OUTPUT_FILE}")
+    report_cache(cache)
+    policy.report()
+    if telemetry is not None:
+        telemetry.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Score restaurant menu summaries with an Ollama model.")
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help=f"Requests to keep in flight; values above 1 use the async client (e.g. {CONCURRENCY})")
+    parser.add_argument('--no-cache', action='store_true', help="Always call the model instead of reusing cached responses")
+    parser.add_argument('--hosts', nargs='+',
+                        help="Ollama hosts to balance over, as host or host=max_concurrency (default: $OLLAMA_HOSTS, else the local server)")
+    parser.add_argument('--stream', action='store_true', default=STREAM,
+                        help=f"Stream responses and stop each one as soon as a score is read (at most {NUM_PREDICT} tokens)")
+    parser.add_argument('--hedge', action='store_true', default=HEDGE,
+                        help="Send a duplicate request for rows slower than the recent p95 and keep the first answer")
+    parser.add_argument('--no-retry-failed', action='store_true', help="Do not score rows that came back as -1 a second time")
+
+    args = parser.parse_args()
+
+    backend = EndpointPool.from_specs(args.hosts)
+    concurrency = args.concurrency
+    if backend is not None and concurrency <= 1:
+        concurrency = backend.capacity
+
+    if concurrency > 1:
+        process_csv_async(concurrency, use_cache=not args.no_cache, backend=backend, stream=args.stream,
+                          hedge=args.hedge, retry_failed=not args.no_retry_failed)
+    else:
+        process_csv(use_cache=not args.no_cache, backend=backend, stream=args.stream,
+                    hedge=args.hedge, retry_failed=not args.no_retry_failed)
+    if backend is not None:
+        backend.report()
 
 if __name__ == "__main__":
-    process_csv()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,313 @@
+import asyncio
+import os
+import statistics
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set
+
+import ollama
+
+# Comma-separated host[=max_concurrency] list, e.g.
+# "http://gpu1:11434=4,http://gpu2:11434=2". Empty means the default host.
+HOSTS_ENV = 'OLLAMA_HOSTS'
+DEFAULT_CONCURRENCY = 4
+REQUEST_TIMEOUT = 300.0
+HEALTH_TIMEOUT = 5.0
+# Consecutive failures before a host is ejected.
+MAX_FAILURES = 3
+# A host whose average latency is this many times the median of the others is ejected.
+SLOW_FACTOR = 3.0
+MIN_SAMPLES = 5
+LATENCY_ALPHA = 0.2
+# Seconds an ejected host sits out before it is health-checked again.
+EJECT_SECONDS = 30.0
+POLL_SECONDS = 0.01
+
+
+class Endpoint:
+    """One Ollama host with its own concurrency limit and health bookkeeping."""
+
+    def __init__(self, host: str, max_concurrency: int = DEFAULT_CONCURRENCY):
+        self.host = host
+        self.max_concurrency = max(1, max_concurrency)
+        self.client = ollama.Client(host=host, timeout=REQUEST_TIMEOUT)
+        self._async_client = None
+        self._async_loop = None
+        self.outstanding = 0
+        self.healthy = True
+        self.ejected_until = 0.0
+        self.consecutive_failures = 0
+        self.latency = None
+        self.samples = 0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def async_client(self) -> ollama.AsyncClient:
+        # httpx async clients are bound to the loop they were first used in.
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = ollama.AsyncClient(host=self.host, timeout=REQUEST_TIMEOUT)
+            self._async_loop = loop
+        return self._async_client
+
+    def check_health(self) -> bool:
+        try:
+            ollama.Client(host=self.host, timeout=HEALTH_TIMEOUT).list()
+            return True
+        except Exception:
+            return False
+
+
+def parse_hosts(specs: List[str]) -> List[Endpoint]:
+    """Build endpoints from "host" or "host=max_concurrency" strings."""
+    endpoints = []
+    for spec in specs:
+        spec = spec.strip()
+        if not spec:
+            continue
+        host, _, limit = spec.rpartition('=') if '=' in spec else (spec, '', '')
+        endpoints.append(Endpoint(host, int(limit) if limit else DEFAULT_CONCURRENCY))
+    return endpoints
+
+
+def is_host_failure(error: Exception) -> bool:
+    """Errors the request itself caused (unknown model, bad input) say nothing about the host."""
+    return not (isinstance(error, ollama.ResponseError) and 0 <= error.status_code < 500)
+
+
+class EndpointPool:
+    """
+    Dispatches chat requests over several Ollama hosts.
+
+    Each request goes to the healthy host with the fewest requests in flight
+    that still has a free slot, and waits when every host is at its limit.
+    Hosts that fail repeatedly or run much slower than the rest are ejected
+    for EJECT_SECONDS and readmitted once a health check passes; a request
+    that fails on one host is retried on the others. The last healthy host is
+    never ejected.
+    """
+
+    def __init__(self, endpoints: List[Endpoint], check_on_start: bool = True):
+        if not endpoints:
+            raise ValueError("EndpointPool needs at least one endpoint")
+        self.endpoints = endpoints
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        if check_on_start:
+            for endpoint in endpoints:
+                if not endpoint.check_health():
+                    print(f"Warning: {endpoint.host} failed its health check; ejecting it for {EJECT_SECONDS:.0f}s")
+                    self._eject(endpoint)
+
+    @classmethod
+    def from_specs(cls, specs: Optional[List[str]] = None) -> Optional['EndpointPool']:
+        """Pool for the given host specs, or $OLLAMA_HOSTS; None when neither names a host."""
+        if not specs:
+            specs = [spec for spec in os.environ.get(HOSTS_ENV, '').split(',') if spec.strip()]
+        return cls(parse_hosts(specs)) if specs else None
+
+    @property
+    def capacity(self) -> int:
+        return sum(endpoint.max_concurrency for endpoint in self.endpoints)
+
+    def _healthy(self) -> List[Endpoint]:
+        return [endpoint for endpoint in self.endpoints if endpoint.healthy]
+
+    def _eject(self, endpoint: Endpoint):
+        if endpoint.healthy and len(self._healthy()) > 1:
+            endpoint.healthy = False
+            endpoint.ejected_until = time.monotonic() + EJECT_SECONDS
+            endpoint.ejections += 1
+
+    def _readmit_expired(self):
+        """Health-check hosts whose ejection has run out. Called without the lock held."""
+        now = time.monotonic()
+        for endpoint in self.endpoints:
+            if not endpoint.healthy and endpoint.ejected_until <= now:
+                with self._lock:
+                    endpoint.ejected_until = now + EJECT_SECONDS
+                if endpoint.check_health():
+                    with self._lock:
+                        endpoint.healthy = True
+                        endpoint.consecutive_failures = 0
+                        endpoint.latency = None
+                        endpoint.samples = 0
+                        self._available.notify_all()
+
+    def _try_acquire(self, tried: Set[str]) -> Optional[Endpoint]:
+        """Reserve a slot on the least-loaded healthy host not in tried. Caller holds the lock."""
+        candidates = [endpoint for endpoint in self._healthy() if endpoint.host not in tried]
+        if not candidates:
+            raise RuntimeError("No healthy Ollama host left to try")
+        free = [endpoint for endpoint in candidates if endpoint.outstanding < endpoint.max_concurrency]
+        if not free:
+            return None
+        endpoint = min(free, key=lambda e: e.outstanding / e.max_concurrency)
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        return endpoint
+
+    def _readmit_due(self) -> bool:
+        now = time.monotonic()
+        return any(not endpoint.healthy and endpoint.ejected_until <= now for endpoint in self.endpoints)
+
+    def _has_untried(self, tried: Set[str]) -> bool:
+        with self._lock:
+            return any(endpoint.host not in tried for endpoint in self._healthy())
+
+    def _acquire(self, tried: Set[str]) -> Endpoint:
+        while True:
+            if self._readmit_due():
+                self._readmit_expired()
+            with self._available:
+                endpoint = self._try_acquire(tried)
+                if endpoint is not None:
+                    return endpoint
+                self._available.wait(timeout=1.0)
+
+    async def _acquire_async(self, tried: Set[str]) -> Endpoint:
+        while True:
+            if self._readmit_due():
+                await asyncio.to_thread(self._readmit_expired)
+            with self._lock:
+                endpoint = self._try_acquire(tried)
+            if endpoint is not None:
+                return endpoint
+            await asyncio.sleep(POLL_SECONDS)
+
+    def _release(self, endpoint: Endpoint, elapsed: float, error: Optional[Exception] = None):
+        with self._available:
+            endpoint.outstanding -= 1
+            if error is not None and is_host_failure(error):
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= MAX_FAILURES:
+                    self._eject(endpoint)
+            else:
+                endpoint.consecutive_failures = 0
+                endpoint.latency = elapsed if endpoint.latency is None else (
+                    LATENCY_ALPHA * elapsed + (1 - LATENCY_ALPHA) * endpoint.latency)
+                endpoint.samples += 1
+                self._eject_if_slow(endpoint)
+            self._available.notify_all()
+
+    def _eject_if_slow(self, endpoint: Endpoint):
+        if endpoint.samples < MIN_SAMPLES:
+            return
+        others = [other.latency for other in self._healthy()
+                  if other is not endpoint and other.samples >= MIN_SAMPLES]
+        if others and endpoint.latency > SLOW_FACTOR * statistics.median(others):
+            print(f"Warning: {endpoint.host} is slow ({endpoint.latency:.2f}s per request); ejecting it for {EJECT_SECONDS:.0f}s")
+            self._eject(endpoint)
+
+    def chat(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None, **kwargs) -> Any:
+        """Blocking chat call, safe to use from several threads. With stream=True, returns an iterator of chunks."""
+        if kwargs.get('stream'):
+            return self._stream(model, messages, options, **kwargs)
+        tried: Set[str] = set()
+        while True:
+            endpoint = self._acquire(tried)
+            start = time.monotonic()
+            try:
+                response = endpoint.client.chat(model=model, messages=messages, options=options, **kwargs)
+            except Exception as e:
+                self._release(endpoint, time.monotonic() - start, e)
+                tried.add(endpoint.host)
+                if not is_host_failure(e) or not self._has_untried(tried):
+                    raise
+                continue
+            self._release(endpoint, time.monotonic() - start)
+            return response
+
+    def _stream(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]], **kwargs) -> Iterator[Any]:
+        """
+        Streamed chat that holds its host slot until the stream is read to the
+        end or closed. A host that fails before sending anything is retried
+        like a plain request; a failure mid-stream is raised.
+        """
+        tried: Set[str] = set()
+        while True:
+            endpoint = self._acquire(tried)
+            start = time.monotonic()
+            chunks = endpoint.client.chat(model=model, messages=messages, options=options, **kwargs)
+            received = False
+            try:
+                for chunk in chunks:
+                    received = True
+                    yield chunk
+            except GeneratorExit:
+                chunks.close()
+                self._release(endpoint, time.monotonic() - start)
+                raise
+            except Exception as e:
+                self._release(endpoint, time.monotonic() - start, e)
+                tried.add(endpoint.host)
+                if received or not is_host_failure(e) or not self._has_untried(tried):
+                    raise
+                continue
+            self._release(endpoint, time.monotonic() - start)
+            return
+
+    async def _astream(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]], **kwargs) -> AsyncIterator[Any]:
+        tried: Set[str] = set()
+        while True:
+            endpoint = await self._acquire_async(tried)
+            start = time.monotonic()
+            received = False
+            chunks = None
+            try:
+                chunks = await endpoint.async_client().chat(model=model, messages=messages, options=options, **kwargs)
+                async for chunk in chunks:
+                    received = True
+                    yield chunk
+            except GeneratorExit:
+                await chunks.aclose()
+                self._release(endpoint, time.monotonic() - start)
+                raise
+            except Exception as e:
+                self._release(endpoint, time.monotonic() - start, e)
+                tried.add(endpoint.host)
+                if received or not is_host_failure(e) or not self._has_untried(tried):
+                    raise
+                continue
+            self._release(endpoint, time.monotonic() - start)
+            return
+
+    async def achat(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None, **kwargs) -> Any:
+        if kwargs.get('stream'):
+            return self._astream(model, messages, options, **kwargs)
+        tried: Set[str] = set()
+        while True:
+            endpoint = await self._acquire_async(tried)
+            start = time.monotonic()
+            try:
+                response = await endpoint.async_client().chat(model=model, messages=messages, options=options, **kwargs)
+            except Exception as e:
+                self._release(endpoint, time.monotonic() - start, e)
+                tried.add(endpoint.host)
+                if not is_host_failure(e) or not self._has_untried(tried):
+                    raise
+                continue
+            self._release(endpoint, time.monotonic() - start)
+            return response
+
+    def async_client(self) -> 'AsyncPoolClient':
+        return AsyncPoolClient(self)
+
+    def report(self):
+        for endpoint in self.endpoints:
+            latency = f"{endpoint.latency:.2f}s" if endpoint.latency is not None else "n/a"
+            state = "healthy" if endpoint.healthy else "ejected"
+            print(f"{endpoint.host}: {endpoint.requests} requests, {endpoint.failures} failures, "
+                  f"{endpoint.ejections} ejections, avg latency {latency}, {state}")
+
+
+class AsyncPoolClient:
+    """Adapter exposing EndpointPool.achat as `chat`, like ollama.AsyncClient."""
+
+    def __init__(self, pool: EndpointPool):
+        self.pool = pool
+
+    async def chat(self, **kwargs) -> Dict[str, Any]:
+        return await self.pool.achat(**kwargs)
@@ -0,0 +1,255 @@
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import ollama
+
+CACHE_FILE = 'llm_cache.sqlite'
+# Entries kept on disk before least-recently-used rows are evicted.
+MAX_ENTRIES = 500_000
+
+
+class LLMCache:
+    """
+    On-disk cache of chat responses keyed by a hash of the model name, the
+    messages (system and user prompts), the generation options and the
+    requested output format, if any.
+    """
+
+    def __init__(self, path: str = CACHE_FILE, max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Several processes may share the file (partitioned runs), so wait on locks.
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " content TEXT NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON responses (last_used)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_model ON responses (model)")
+        self._conn.commit()
+        # Running row count, so put() does not scan the table. Other processes
+        # sharing the file are only seen when it is recounted before evicting.
+        self._count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None,
+                 format: Optional[Any] = None) -> str:
+        request = {'model': model, 'messages': messages, 'options': options or {}}
+        # Only added when set, so keys of plain-text requests are unchanged.
+        if format is not None:
+            request['format'] = format
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None,
+            format: Optional[Any] = None) -> Optional[str]:
+        key = self.make_key(model, messages, options, format)
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, model: str, messages: List[Dict[str, str]], content: str, options: Optional[Dict[str, Any]] = None,
+            format: Optional[Any] = None):
+        key = self.make_key(model, messages, options, format)
+        with self._lock:
+            exists = self._conn.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, content, last_used) VALUES (?, ?, ?, ?)",
+                (key, model, content, time.time()),
+            )
+            if not exists:
+                self._count += 1
+            if self._count > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        self._count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = self._count - self.max_entries
+        if excess > 0:
+            cursor = self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+            self._count -= cursor.rowcount
+
+    def invalidate_model(self, model: str) -> int:
+        """Drop every cached response produced by `model`. Returns the number of rows removed."""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM responses WHERE model = ?", (model,))
+            self._conn.commit()
+            self._count -= cursor.rowcount
+            return cursor.rowcount
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': self.size(),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _chat_kwargs(options: Optional[Dict[str, Any]], format: Optional[Any], keep_alive: Optional[Any] = None) -> Dict[str, Any]:
+    kwargs = {}
+    if options:
+        kwargs['options'] = options
+    if format is not None:
+        kwargs['format'] = format
+    if keep_alive is not None:
+        kwargs['keep_alive'] = keep_alive
+    return kwargs
+
+
+def _joined_response(last: Any, parts: List[str], stopped_early: bool) -> Dict[str, Any]:
+    """
+    One response dict from streamed chunks. The final chunk carries Ollama's
+    token counts and timings; a stream cut short has none, so its eval_count
+    is the number of chunks read (about one token each).
+    """
+    response = {'message': {'role': 'assistant', 'content': ''.join(parts)}, 'stopped_early': stopped_early}
+    if last is not None and last.get('done'):
+        for name in ('model', 'done_reason', 'total_duration', 'load_duration',
+                     'prompt_eval_count', 'prompt_eval_duration', 'eval_count', 'eval_duration'):
+            if last.get(name) is not None:
+                response[name] = last.get(name)
+    else:
+        response['eval_count'] = len(parts)
+    return response
+
+
+def collect_stream(chunks, stop_when: Optional[Callable[[str], bool]] = None) -> Dict[str, Any]:
+    """
+    Read a streamed chat response until it ends or stop_when(content so far)
+    is true. Closing the stream early drops the connection, which makes
+    Ollama stop generating.
+    """
+    parts: List[str] = []
+    last = None
+    stopped_early = False
+    try:
+        for chunk in chunks:
+            last = chunk
+            parts.append(chunk['message']['content'])
+            if stop_when is not None and not chunk.get('done') and stop_when(''.join(parts)):
+                stopped_early = True
+                break
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+    return _joined_response(last, parts, stopped_early)
+
+
+async def collect_stream_async(chunks, stop_when: Optional[Callable[[str], bool]] = None) -> Dict[str, Any]:
+    """Async counterpart of collect_stream."""
+    parts: List[str] = []
+    last = None
+    stopped_early = False
+    try:
+        async for chunk in chunks:
+            last = chunk
+            parts.append(chunk['message']['content'])
+            if stop_when is not None and not chunk.get('done') and stop_when(''.join(parts)):
+                stopped_early = True
+                break
+    finally:
+        if hasattr(chunks, 'aclose'):
+            await chunks.aclose()
+    return _joined_response(last, parts, stopped_early)
+
+
+def cached_chat(cache: Optional[LLMCache], model: str, messages: List[Dict[str, str]],
+                options: Optional[Dict[str, Any]] = None, chat_fn=None, format: Optional[Any] = None,
+                stop_when: Optional[Callable[[str], bool]] = None, keep_alive: Optional[Any] = None,
+                refresh: bool = False) -> Dict[str, Any]:
+    """
+    Drop-in replacement for ollama.chat that consults the cache first. Only the
+    message content is cached, so hits return a minimal response dict.
+    `format` is passed through to Ollama ('json' or a JSON schema). With
+    `stop_when` the response is streamed and cut off as soon as
+    stop_when(content so far) is true; the partial content is what gets cached.
+    `keep_alive` is passed through and is not part of the cache key. With
+    `refresh` the cached answer is not read, and the new answer replaces it.
+    """
+    if cache is not None and not refresh:
+        content = cache.get(model, messages, options, format)
+        if content is not None:
+            return {'message': {'role': 'assistant', 'content': content}, 'cached': True}
+
+    chat_fn = chat_fn or ollama.chat
+    kwargs = _chat_kwargs(options, format, keep_alive)
+    if stop_when is not None:
+        response = collect_stream(chat_fn(model=model, messages=messages, stream=True, **kwargs), stop_when)
+    else:
+        response = chat_fn(model=model, messages=messages, **kwargs)
+
+    if cache is not None:
+        cache.put(model, messages, response['message']['content'], options, format)
+    return response
+
+
+async def cached_chat_async(cache: Optional[LLMCache], client, model: str, messages: List[Dict[str, str]],
+                            options: Optional[Dict[str, Any]] = None, format: Optional[Any] = None,
+                            stop_when: Optional[Callable[[str], bool]] = None, keep_alive: Optional[Any] = None,
+                            refresh: bool = False) -> Dict[str, Any]:
+    """Async counterpart of cached_chat for ollama.AsyncClient."""
+    if cache is not None and not refresh:
+        content = cache.get(model, messages, options, format)
+        if content is not None:
+            return {'message': {'role': 'assistant', 'content': content}, 'cached': True}
+
+    kwargs = _chat_kwargs(options, format, keep_alive)
+    if stop_when is not None:
+        response = await collect_stream_async(await client.chat(model=model, messages=messages, stream=True, **kwargs), stop_when)
+    else:
+        response = await client.chat(model=model, messages=messages, **kwargs)
+
+    if cache is not None:
+        cache.put(model, messages, response['message']['content'], options, format)
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the shared LLM response cache.")
+    parser.add_argument('--path', default=CACHE_FILE, help="Path to the cache database")
+    parser.add_argument('--invalidate-model', help="Remove all cached responses for this model")
+
+    args = parser.parse_args()
+
+    cache = LLMCache(args.path)
+    if args.invalidate_model:
+        removed = cache.invalidate_model(args.invalidate_model)
+        print(f"Removed {removed} cached responses for {args.invalidate_model}")
+    print(f"{cache.size()} cached responses in {args.path}")
+    cache.close()
+
+if __name__ == "__main__":
+    main()
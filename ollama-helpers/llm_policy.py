@@ -0,0 +1,230 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Awaitable, Callable, Optional
+
+import ollama
+
+from llm_backend import is_host_failure
+from llm_telemetry import percentile
+
+# Seconds one attempt (including its hedge) may take before it is abandoned.
+DEADLINE_SECONDS = 120.0
+# Attempts per call, the first included.
+MAX_ATTEMPTS = 3
+# Backoff before the n-th retry is BACKOFF_SECONDS * 2**(n-1), capped, with jitter.
+BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+# Send a duplicate request once an attempt has taken longer than this percentile of recent calls.
+HEDGE = False
+HEDGE_PERCENTILE = 95
+# Calls observed before hedging starts, and how many recent calls the percentile uses.
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 1000
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Timeouts, connection failures, server errors and rate limits are worth another try; bad requests are not."""
+    if isinstance(error, ollama.ResponseError) and error.status_code == 429:
+        return True
+    return isinstance(error, Exception) and is_host_failure(error)
+
+
+def _start_thread(fn: Callable[[], Any]) -> Future:
+    """
+    Run fn in a daemon thread. A call abandoned at its deadline keeps its
+    thread until the HTTP client gives up, but never blocks interpreter exit.
+    """
+    future: Future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+class CallPolicy:
+    """
+    Deadline, retry and hedging policy for one LLM call, shared by all calls
+    of a run so the hedge delay follows their observed latency.
+
+    Each attempt has `deadline` seconds. An attempt that fails with a
+    retryable error or times out is retried after an exponential backoff,
+    up to `attempts` attempts. With hedging, an attempt still running after
+    the HEDGE_PERCENTILE latency of recent calls gets a duplicate request and
+    the first answer wins. In async code the losing request is cancelled,
+    which makes Ollama stop generating; in threads it is left to finish.
+    Responses marked `cached` do not count towards the latency percentile.
+    """
+
+    def __init__(self, deadline: float = DEADLINE_SECONDS, attempts: int = MAX_ATTEMPTS, backoff: float = BACKOFF_SECONDS,
+                 max_backoff: float = MAX_BACKOFF_SECONDS, hedge: bool = HEDGE, hedge_percentile: float = HEDGE_PERCENTILE,
+                 hedge_min_samples: int = HEDGE_MIN_SAMPLES):
+        self.deadline = deadline
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        self._client: Optional[ollama.Client] = None
+        self.calls = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failures = 0
+
+    def chat_fn(self) -> Callable[..., Any]:
+        """ollama.chat with a client-side timeout matching the deadline, for callers without a backend."""
+        with self._lock:
+            if self._client is None:
+                self._client = ollama.Client(timeout=self.deadline)
+            return self._client.chat
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while hedging is off or too few calls were seen."""
+        if not self.hedge:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        return percentile(latencies, self.hedge_percentile)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def _record(self, result: Any, elapsed: float):
+        if isinstance(result, dict) and result.get('cached'):
+            return
+        with self._lock:
+            self._latencies.append(elapsed)
+
+    def _backoff_delay(self, retry: int) -> float:
+        delay = min(self.max_backoff, self.backoff * 2 ** (retry - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _should_retry(self, error: BaseException, attempt: int) -> bool:
+        if attempt >= self.attempts or not is_retryable(error):
+            self._count('failures')
+            return False
+        self._count('retries')
+        return True
+
+    def _attempt(self, fn: Callable[[], Any]) -> Any:
+        start = time.monotonic()
+        deadline = start + self.deadline
+        futures = [_start_thread(fn)]
+        delay = self.hedge_delay()
+        if delay is not None and delay < self.deadline:
+            done, _ = wait(futures, timeout=delay)
+            if not done:
+                self._count('hedges')
+                futures.append(_start_thread(fn))
+
+        pending = set(futures)
+        errors = []
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        self._count('hedge_wins')
+                    result = future.result()
+                    self._record(result, time.monotonic() - start)
+                    return result
+                errors.append(future.exception())
+        if pending:
+            self._count('timeouts')
+            raise DeadlineExceeded(f"no answer within {self.deadline:g}s")
+        raise errors[0]
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """fn() under the policy; the last error is raised once attempts run out."""
+        self._count('calls')
+        attempt = 1
+        while True:
+            try:
+                return self._attempt(fn)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            time.sleep(self._backoff_delay(attempt))
+            attempt += 1
+
+    async def _aattempt(self, coro_fn: Callable[[], Awaitable[Any]]) -> Any:
+        start = time.monotonic()
+        deadline = start + self.deadline
+        tasks = [asyncio.ensure_future(coro_fn())]
+        try:
+            delay = self.hedge_delay()
+            if delay is not None and delay < self.deadline:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    self._count('hedges')
+                    tasks.append(asyncio.ensure_future(coro_fn()))
+
+            pending = set(tasks)
+            errors = []
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self._count('hedge_wins')
+                        result = task.result()
+                        self._record(result, time.monotonic() - start)
+                        return result
+                    errors.append(task.exception())
+            if pending:
+                self._count('timeouts')
+                raise DeadlineExceeded(f"no answer within {self.deadline:g}s")
+            raise errors[0]
+        finally:
+            unfinished = [task for task in tasks if not task.done()]
+            for task in unfinished:
+                task.cancel()
+            if unfinished:
+                await asyncio.gather(*unfinished, return_exceptions=True)
+
+    async def acall(self, coro_fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async counterpart of call; coro_fn makes a fresh coroutine per request."""
+        self._count('calls')
+        attempt = 1
+        while True:
+            try:
+                return await self._aattempt(coro_fn)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            await asyncio.sleep(self._backoff_delay(attempt))
+            attempt += 1
+
+    def report(self, label: str = ''):
+        delay = self.hedge_delay()
+        hedging = f", {self.hedges} hedged ({self.hedge_wins} won by the duplicate)" if self.hedge else ""
+        print(f"{label}Call policy: {self.calls} calls, {self.retries} retries, {self.timeouts} timeouts, "
+              f"{self.failures} gave up{hedging}"
+              + (f", hedge delay {delay:.2f}s" if delay is not None else ""))
@@ -0,0 +1,186 @@
+import argparse
+import json
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+TELEMETRY_FILE = 'llm_telemetry.jsonl'
+# Print a rolling summary after this many calls.
+SUMMARY_EVERY = 100
+# Ollama reports durations in nanoseconds.
+_NS = 1e9
+_DURATIONS = ['prompt_eval_duration', 'eval_duration', 'load_duration', 'total_duration']
+_COUNTS = ['prompt_eval_count', 'eval_count']
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, math.ceil(q / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+def new_totals() -> Dict[str, Any]:
+    return {'calls': 0, 'cached': 0, 'errors': 0, 'failed': 0,
+            'prompt_eval_count': 0, 'eval_count': 0,
+            'prompt_eval_s': 0.0, 'eval_s': 0.0, 'load_s': 0.0, 'total_s': 0.0}
+
+
+def accumulate(totals: Dict[str, Any], latencies: List[float], entry: Dict[str, Any]):
+    """Add one log entry to running totals; only uncached, successful calls count towards latency."""
+    totals['calls'] += 1
+    totals['cached'] += entry['cached']
+    totals['errors'] += entry['error'] is not None
+    totals['failed'] += entry['failed']
+    if not entry['cached'] and entry['error'] is None:
+        latencies.append(entry['elapsed_s'])
+    for name in ('prompt_eval_count', 'eval_count', 'prompt_eval_s', 'eval_s', 'load_s', 'total_s'):
+        totals[name] += entry.get(name) or 0
+
+
+def response_metadata(response: Any) -> Dict[str, Any]:
+    """Token counts and durations (in seconds) from an Ollama chat response; cached responses carry none."""
+    metadata = {}
+    if response is None:
+        return metadata
+    for name in _COUNTS:
+        value = response.get(name)
+        if value is not None:
+            metadata[name] = int(value)
+    for name in _DURATIONS:
+        value = response.get(name)
+        if value is not None:
+            metadata[name.replace('_duration', '_s')] = value / _NS
+    return metadata
+
+
+class TelemetryLog:
+    """
+    Appends one JSON line per LLM call (latency, token counts, Ollama's
+    prompt-eval/eval/load durations, errors and unusable answers) and keeps
+    running totals for summaries. Safe to share between threads.
+    """
+
+    def __init__(self, script: str, path: str = TELEMETRY_FILE, summary_every: int = SUMMARY_EVERY):
+        self.script = script
+        self.path = path
+        self.summary_every = summary_every
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+        self.latencies: List[float] = []
+        self.totals = new_totals()
+
+    def record(self, model: str, elapsed: float, response: Any = None, error: Optional[Exception] = None,
+               failed: bool = False, **extra):
+        """
+        Log one call. `failed` marks a response the caller could not use (an
+        unparseable score, an ERROR row); `extra` is stored as-is (row, ...).
+        """
+        metadata = response_metadata(response)
+        cached = bool(response is not None and response.get('cached'))
+        entry = {
+            'ts': round(time.time(), 3),
+            'script': self.script,
+            'model': model,
+            'elapsed_s': round(elapsed, 4),
+            'cached': cached,
+            'failed': failed or error is not None,
+            'error': str(error) if error is not None else None,
+            **metadata,
+            **extra,
+        }
+        if metadata.get('eval_s'):
+            entry['eval_tokens_per_s'] = round(metadata.get('eval_count', 0) / metadata['eval_s'], 2)
+        if metadata.get('prompt_eval_s'):
+            entry['prompt_tokens_per_s'] = round(metadata.get('prompt_eval_count', 0) / metadata['prompt_eval_s'], 2)
+
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            accumulate(self.totals, self.latencies, entry)
+            due = self.summary_every and self.totals['calls'] % self.summary_every == 0
+        if due:
+            print(f"[telemetry] {format_summary(self.summary())}")
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return summarize(self.totals, sorted(self.latencies))
+
+    def close(self):
+        print(f"[telemetry] {format_summary(self.summary())} (log: {self.path})")
+        with self._lock:
+            self._file.close()
+
+
+def summarize(totals: Dict[str, Any], sorted_latencies: List[float]) -> Dict[str, Any]:
+    calls = totals['calls']
+    model_s = totals['prompt_eval_s'] + totals['eval_s'] + totals['load_s']
+    return {
+        'calls': calls,
+        'cached': totals['cached'],
+        'failure_rate': totals['failed'] / calls if calls else 0.0,
+        'error_rate': totals['errors'] / calls if calls else 0.0,
+        'p50_s': percentile(sorted_latencies, 50),
+        'p95_s': percentile(sorted_latencies, 95),
+        'p99_s': percentile(sorted_latencies, 99),
+        'prompt_tokens_per_s': totals['prompt_eval_count'] / totals['prompt_eval_s'] if totals['prompt_eval_s'] else None,
+        'eval_tokens_per_s': totals['eval_count'] / totals['eval_s'] if totals['eval_s'] else None,
+        'load_s': totals['load_s'],
+        # Where the model's time went: reading the prompt, generating, or loading weights.
+        'prompt_eval_share': totals['prompt_eval_s'] / model_s if model_s else None,
+        'eval_share': totals['eval_s'] / model_s if model_s else None,
+        'load_share': totals['load_s'] / model_s if model_s else None,
+    }
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    def seconds(value):
+        return f"{value:.2f}s" if value is not None else "n/a"
+
+    def rate(value):
+        return f"{value:.1f}" if value is not None else "n/a"
+
+    def share(value):
+        return f"{value:.0%}" if value is not None else "n/a"
+
+    return (
+        f"{summary['calls']} calls ({summary['cached']} cached), "
+        f"latency p50 {seconds(summary['p50_s'])} p95 {seconds(summary['p95_s'])} p99 {seconds(summary['p99_s'])}, "
+        f"prompt {rate(summary['prompt_tokens_per_s'])} tok/s, generation {rate(summary['eval_tokens_per_s'])} tok/s, "
+        f"model time: prompt {share(summary['prompt_eval_share'])} / generation {share(summary['eval_share'])} / "
+        f"load {share(summary['load_share'])} ({summary['load_s']:.1f}s), "
+        f"failures {summary['failure_rate']:.1%} (errors {summary['error_rate']:.1%})"
+    )
+
+
+def summarize_log(path: str = TELEMETRY_FILE, script: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Summaries per script for an existing telemetry log."""
+    totals: Dict[str, Dict[str, Any]] = {}
+    latencies: Dict[str, List[float]] = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            name = entry.get('script', 'unknown')
+            if script and name != script:
+                continue
+            accumulate(totals.setdefault(name, new_totals()), latencies.setdefault(name, []), entry)
+    return {name: summarize(totals[name], sorted(latencies[name])) for name in totals}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize an LLM telemetry log.")
+    parser.add_argument('path', nargs='?', default=TELEMETRY_FILE, help="Telemetry JSONL file")
+    parser.add_argument('--script', help="Only summarize calls from this script")
+
+    args = parser.parse_args()
+
+    for name, summary in summarize_log(args.path, args.script).items():
+        print(f"{name}: {format_summary(summary)}")
+
+if __name__ == "__main__":
+    main()
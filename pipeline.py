@@ -0,0 +1,329 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+STATE_FILE = '.pipeline_state.json'
+MENUS_CSV = 'datasets/restaurant-menus.csv'
+RESTAURANTS_CSV = 'datasets/restaurants.csv'
+FOOD_DATA_CSVS = [
+    'datasets/food_data/food.csv',
+    'datasets/food_data/nutrient.csv',
+    'datasets/food_data/food_nutrient.csv',
+]
+BUILD_PROMPTS = 'uber-eats-menu-processing/buildPrompts.py'
+MENU_PRICES = 'uber-eats-menu-processing/menu_prices.py'
+BATCH_MENU_RUN = 'ollama-helpers/batch_menu_run.py'
+BATCH_GEN_INGREDIENTS = 'ollama-helpers/batch_gen_ingredients.py'
+LLM_CACHE = 'ollama-helpers/llm_cache.py'
+LLM_POLICY = 'ollama-helpers/llm_policy.py'
+SCORE_INGREDIENTS = 'food-data-central-ingredient-processing/score-restaurant-ingredients.py'
+MENU_SCORES_OUTPUT = 'nutrition_scores_from_menu.csv'
+INGREDIENTS_OUTPUT = 'restaurants_with_ingredients.csv'
+INGREDIENT_SCORES_OUTPUT = 'restaurant_averages_with_score.csv'
+PUBLISHED_MENU_SCORES = 'scored-datasets/uber_eats_menu_with_scores.csv'
+PUBLISHED_INGREDIENT_SCORES = 'scored-datasets/uber_eats_menu_with_ingredients_scores.csv'
+
+# Module-level constants that only affect speed. They are left out of the
+# source digests, so tuning them does not invalidate a stage.
+SPEED_SETTINGS: Dict[str, List[str]] = {
+    BUILD_PROMPTS: ['CHUNK_SIZE'],
+    MENU_PRICES: ['CHUNK_SIZE'],
+    BATCH_MENU_RUN: ['CONCURRENCY', 'USE_TELEMETRY', 'KEEP_ALIVE', 'HEDGE'],
+    BATCH_GEN_INGREDIENTS: ['BATCH_SIZE', 'PARTITION_WORKERS', 'USE_TELEMETRY', 'HEDGE'],
+    LLM_CACHE: ['MAX_ENTRIES'],
+    LLM_POLICY: ['BACKOFF_SECONDS', 'MAX_BACKOFF_SECONDS', 'HEDGE', 'HEDGE_PERCENTILE', 'HEDGE_MIN_SAMPLES',
+                 'LATENCY_WINDOW'],
+    SCORE_INGREDIENTS: ['USE_MATCH_STORE'],
+}
+
+# Each stage lists what its output depends on: input files, the source files
+# that produce it and the script constants that change its result. Any other
+# edit to a `code` file also invalidates the stage, except to SPEED_SETTINGS;
+# `params` name the constants so a change is reported by name. `clean` files
+# are removed before a finished stage reruns on new inputs, so its checkpoint
+# is not resumed.
+STAGES: List[Dict[str, Any]] = [
+    {
+        'name': 'prompts',
+        'command': [BUILD_PROMPTS, '--menus', MENUS_CSV, '--restaurants', RESTAURANTS_CSV,
+                    '--output', 'prompts.csv', '--streaming'],
+        'inputs': [MENUS_CSV, RESTAURANTS_CSV],
+        'code': [BUILD_PROMPTS, MENU_PRICES],
+        'params': {BUILD_PROMPTS: ['STATE']},
+        'outputs': ['prompts.csv'],
+    },
+    {
+        'name': 'menu_scores',
+        'command': [BATCH_MENU_RUN, '--concurrency', '4'],
+        'inputs': ['prompts.csv'],
+        'code': [BATCH_MENU_RUN, LLM_CACHE, LLM_POLICY],
+        'params': {BATCH_MENU_RUN: ['MODEL', 'SYSTEM_PROMPT']},
+        'outputs': [MENU_SCORES_OUTPUT],
+    },
+    {
+        'name': 'ingredients',
+        'command': [BATCH_GEN_INGREDIENTS],
+        'inputs': [MENUS_CSV, RESTAURANTS_CSV],
+        'code': [BATCH_GEN_INGREDIENTS, LLM_CACHE, LLM_POLICY],
+        'params': {BATCH_GEN_INGREDIENTS: ['MODEL', 'STATE']},
+        'outputs': [INGREDIENTS_OUTPUT],
+        'clean': [INGREDIENTS_OUTPUT, INGREDIENTS_OUTPUT + '.checkpoint'],
+    },
+    {
+        'name': 'ingredient_scores',
+        'command': [SCORE_INGREDIENTS],
+        'inputs': [INGREDIENTS_OUTPUT] + FOOD_DATA_CSVS,
+        'code': [
+            SCORE_INGREDIENTS,
+            'food-data-central-ingredient-processing/description_index.py',
+            'food-data-central-ingredient-processing/embedding_index.py',
+            'food-data-central-ingredient-processing/ingredient_store.py',
+            'food-data-central-ingredient-processing/nutrient_matrix.py',
+            'food-data-central-ingredient-processing/restaurant_state.py',
+            'food-data-central-ingredient-processing/fdc_cache.py',
+            'food-data-central-ingredient-processing/shared_arrays.py',
+        ],
+        'params': {SCORE_INGREDIENTS: ['FUZZY_MATCH_THRESHOLD', 'MATCHER', 'EMBEDDING_MATCH_THRESHOLD',
+                                       'MAX_INGREDIENTS_PER_ITEM', 'CANONICALIZE',
+                                       'DRI_CALORIES', 'DRI_SODIUM', 'DRI_PROTEIN']},
+        'outputs': [INGREDIENT_SCORES_OUTPUT],
+    },
+    {
+        'name': 'publish',
+        'copy': {MENU_SCORES_OUTPUT: PUBLISHED_MENU_SCORES, INGREDIENT_SCORES_OUTPUT: PUBLISHED_INGREDIENT_SCORES},
+        'inputs': [MENU_SCORES_OUTPUT, INGREDIENT_SCORES_OUTPUT],
+        'code': [],
+        'params': {},
+        'outputs': [PUBLISHED_MENU_SCORES, PUBLISHED_INGREDIENT_SCORES],
+    },
+    {
+        'name': 'cost_analysis',
+        'command': ['analysis/cost_analysis.py'],
+        'inputs': [PUBLISHED_MENU_SCORES, PUBLISHED_INGREDIENT_SCORES, MENUS_CSV],
+        'code': ['analysis/cost_analysis.py', MENU_PRICES],
+        'params': {},
+        'outputs': ['analysis/cost_analysis_results.csv'],
+    },
+    {
+        'name': 'similarity',
+        'command': ['analysis/similarity.py'],
+        'inputs': [PUBLISHED_MENU_SCORES, PUBLISHED_INGREDIENT_SCORES],
+        'code': ['analysis/similarity.py', 'analysis/score_comparison.py'],
+        'params': {},
+        'outputs': ['restaurant_score_comparison.png', 'restaurant_score_comparison.json'],
+    },
+]
+
+
+def load_state(path: str = STATE_FILE) -> Dict[str, Any]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'stages': {}, 'running': {}, 'digests': {}}
+
+
+def save_state(state: Dict[str, Any], path: str = STATE_FILE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def file_digest(path: str, digests: Dict[str, list]) -> Optional[str]:
+    """
+    sha256 of a file's contents, or None if it does not exist. Digests are
+    remembered by (size, mtime) so unchanged multi-GB inputs are not re-read.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    known = digests.get(path)
+    if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+        return known[2]
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    digests[path] = [stat.st_size, stat.st_mtime_ns, sha.hexdigest()]
+    return digests[path][2]
+
+
+def _assigns_only(node: ast.stmt, names: List[str]) -> bool:
+    if isinstance(node, ast.Assign):
+        return all(isinstance(target, ast.Name) and target.id in names for target in node.targets)
+    return isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name) and node.target.id in names
+
+
+def source_digest(path: str, digests: Dict[str, list]) -> Optional[str]:
+    """
+    Digest of a `code` file. Scripts in SPEED_SETTINGS are hashed as their
+    syntax tree without the assignments to those constants, so neither tuning
+    them nor editing comments changes the digest; other files as bytes.
+    """
+    excluded = SPEED_SETTINGS.get(path)
+    if not excluded:
+        return file_digest(path, digests)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    key = path + '#ast'
+    known = digests.get(key)
+    if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+        return known[2]
+
+    with open(path) as f:
+        tree = ast.parse(f.read(), filename=path)
+    tree.body = [node for node in tree.body if not _assigns_only(node, excluded)]
+    digests[key] = [stat.st_size, stat.st_mtime_ns, hashlib.sha256(ast.dump(tree).encode('utf-8')).hexdigest()]
+    return digests[key][2]
+
+
+def read_constants(path: str, names: List[str]) -> Dict[str, Any]:
+    """Values of module-level constants in a script, read without importing it."""
+    with open(path) as f:
+        tree = ast.parse(f.read(), filename=path)
+    values = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and target.id in names:
+                    values[target.id] = ast.literal_eval(node.value)
+    return {name: values.get(name) for name in names}
+
+
+def stage_fingerprint(stage: Dict[str, Any], digests: Dict[str, list]) -> Dict[str, Any]:
+    components = {
+        'inputs': {path: file_digest(path, digests) for path in stage['inputs']},
+        'code': {path: source_digest(path, digests) for path in stage['code']},
+        'params': {path: read_constants(path, names) for path, names in stage['params'].items()},
+        'command': stage.get('command') or stage.get('copy'),
+    }
+    encoded = json.dumps(components, sort_keys=True).encode('utf-8')
+    return {'fingerprint': hashlib.sha256(encoded).hexdigest(), 'components': components}
+
+
+def stale_reasons(stage: Dict[str, Any], current: Dict[str, Any], record: Optional[Dict[str, Any]]) -> List[str]:
+    """Why a stage has to run; empty when it is up to date."""
+    reasons = [f"missing output {path}" for path in stage['outputs'] if not os.path.exists(path)]
+    if record is None:
+        return reasons + ["never run"]
+    if record['fingerprint'] == current['fingerprint']:
+        return reasons
+
+    previous = record['components']
+    for kind in ('inputs', 'code'):
+        for path, digest in current['components'][kind].items():
+            if previous.get(kind, {}).get(path) != digest:
+                reasons.append(f"{kind[:-1] if kind == 'inputs' else kind} changed: {path}")
+    for path, values in current['components']['params'].items():
+        for name, value in values.items():
+            old_value = previous.get('params', {}).get(path, {}).get(name)
+            if old_value != value:
+                reasons.append(f"param changed: {name} {old_value!r} -> {value!r}")
+    if current['components']['command'] != previous.get('command'):
+        reasons.append("command changed")
+    return reasons or ["fingerprint changed"]
+
+
+def run_stage(stage: Dict[str, Any]) -> bool:
+    if 'copy' in stage:
+        for source, destination in stage['copy'].items():
+            shutil.copyfile(source, destination)
+        return True
+
+    command = [sys.executable] + stage['command']
+    print(f"$ {' '.join(command)}")
+    result = subprocess.run(command)
+    if result.returncode != 0:
+        print(f"Error: stage '{stage['name']}' exited with status {result.returncode}")
+        return False
+    # The scripts print errors and return normally, so check the outputs exist.
+    missing = [path for path in stage['outputs'] if not os.path.exists(path)]
+    if missing:
+        print(f"Error: stage '{stage['name']}' did not produce {', '.join(missing)}")
+        return False
+    return True
+
+
+def run_pipeline(only: Optional[List[str]] = None, force: Optional[List[str]] = None, dry_run: bool = False) -> bool:
+    """
+    Run every stale stage in order. A stage is stale when an output is
+    missing or when its inputs, code or parameters differ from its last
+    successful run; since inputs include upstream outputs, a rerun stage
+    makes its consumers stale only if its output actually changed.
+    """
+    state = load_state()
+    force = set(force or [])
+    for stage in STAGES:
+        name = stage['name']
+        if only and name not in only:
+            continue
+
+        current = stage_fingerprint(stage, state['digests'])
+        record = state['stages'].get(name)
+        reasons = stale_reasons(stage, current, record)
+        if name in force:
+            reasons.append("forced")
+        if not reasons:
+            print(f"[{name}] up to date")
+            continue
+
+        print(f"[{name}] stale: {'; '.join(reasons)}")
+        if dry_run:
+            continue
+
+        missing_inputs = [path for path, digest in current['components']['inputs'].items() if digest is None]
+        if missing_inputs:
+            print(f"Error: stage '{name}' is missing inputs: {', '.join(missing_inputs)}")
+            save_state(state)
+            return False
+
+        # Start over only when rerunning a finished stage on new inputs; a
+        # retry of the same interrupted run keeps its partial output.
+        if record is not None and state['running'].get(name) != current['fingerprint']:
+            for path in stage.get('clean', []):
+                if os.path.exists(path):
+                    os.remove(path)
+        state['running'][name] = current['fingerprint']
+        save_state(state)
+
+        start_time = time.time()
+        if not run_stage(stage):
+            return False
+        del state['running'][name]
+        state['stages'][name] = {
+            'fingerprint': current['fingerprint'],
+            'components': current['components'],
+            'finished': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'seconds': round(time.time() - start_time, 2),
+        }
+        save_state(state)
+        print(f"[{name}] done in {time.time() - start_time:.2f}s")
+    return True
+
+
+def main():
+    stage_names = [stage['name'] for stage in STAGES]
+    parser = argparse.ArgumentParser(description="Run the scoring pipeline, skipping stages whose inputs have not changed.")
+    parser.add_argument('--stages', nargs='+', choices=stage_names, help="Only consider these stages")
+    parser.add_argument('--force', nargs='+', choices=stage_names, default=[], help="Rerun these stages even if up to date")
+    parser.add_argument('--dry-run', action='store_true', help="Show which stages are stale and why without running them")
+
+    args = parser.parse_args()
+
+    if not run_pipeline(args.stages, args.force, args.dry_run):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,56 @@
+import numpy as np
 import pandas as pd
 import argparse
+import json
+import os
+from multiprocessing import Pool, cpu_count
+from menu_prices import PriceAccumulator, source_signature, compensated_add, parse_prices, save_restaurant_prices
 
 STATE = "DC"
+# Rows of restaurant-menus.csv read at a time in streaming mode.
+CHUNK_SIZE = 500_000
+MENU_DTYPES = {'restaurant_id': 'float64', 'category': str, 'name': str, 'price': str}
+SHARD_DIR = 'prompt_shards'
+MANIFEST_NAME = 'manifest.json'
 
-def gen_prompts(menus_path, restaurants_path, output_path):
-    menus = pd.read_csv(menus_path)
+def load_restaurants(restaurants_path):
     restaurants = pd.read_csv(restaurants_path)
     restaurants['state'] = restaurants['full_address'].str.split(', ').str[-2]
-    
-    restaurants = restaurants[restaurants['state'] == STATE].copy()
-    
-    menus['price_float'] = menus['price'].str.replace(' USD', '', regex=False).astype(float)
+    return restaurants
+
+def load_state_restaurants(restaurants_path):
+    restaurants = load_restaurants(restaurants_path)
+
+    return restaurants[restaurants['state'] == STATE].copy()
+
+def zip3(zip_codes):
+    """
+    First three digits of each zip code, or 'unknown'. Zips read as numbers
+    (2134.0 once a column has a missing value) get their leading zeros back,
+    and ZIP+4 codes are cut to five digits.
+    """
+    digits = (zip_codes.astype('string')
+              .str.replace(r'\.0+$', '', regex=True)
+              .str.split('-').str[0]
+              .str.replace(r'\D', '', regex=True))
+    digits = digits.where(digits.str.len() > 0)
+    return digits.str.zfill(5).str[:3].astype(object).fillna('unknown')
+
+def partition_keys(restaurants, partition_by):
+    """Partition label per restaurant: its state, or the first three digits of its zip code."""
+    if partition_by == 'state':
+        keys = restaurants['state']
+    elif partition_by == 'zip3':
+        keys = zip3(restaurants['zip_code'])
+    else:
+        raise ValueError(f"Unknown partition: {partition_by}")
+    return keys.fillna('unknown').astype(str)
+
+def gen_prompts(menus_path, restaurants_path, output_path):
+    menus = pd.read_csv(menus_path)
+    restaurants = load_state_restaurants(restaurants_path)
+
+    menus['price_float'] = parse_prices(menus['price'])
 
     category_stats = menus.groupby(['restaurant_id', 'category']).agg(
         items_count=('name', 'count'),
@@ -44,15 +84,178 @@ def gen_prompts(menus_path, restaurants_path, output_path):
     output_df = pd.DataFrame(output_rows)
     output_df.to_csv(output_path, index=False)
 
+class CategoryAccumulator:
+    """
+    Running item counts and price means per (restaurant_id, category).
+
+    Prices are summed with the same Kahan-compensated update, in the same row
+    order, as pandas' groupby mean, so the folded means are bit-identical to
+    aggregating the whole file at once. Memory grows with the number of
+    distinct (restaurant, category) pairs, not with the number of rows.
+    """
+
+    def __init__(self):
+        self.key_ids = {}
+        self.items_count = np.zeros(0, dtype=np.int64)
+        self.price_count = np.zeros(0, dtype=np.int64)
+        self.price_sum = np.zeros(0, dtype=np.float64)
+        self.price_comp = np.zeros(0, dtype=np.float64)
+
+    def _group_ids(self, restaurant_ids, categories):
+        codes, keys = pd.factorize(pd.MultiIndex.from_arrays([restaurant_ids, categories]))
+        key_ids = np.array([self.key_ids.setdefault(key, len(self.key_ids)) for key in keys], dtype=np.int64)
+        grow = len(self.key_ids) - len(self.items_count)
+        if grow > 0:
+            self.items_count = np.concatenate([self.items_count, np.zeros(grow, dtype=np.int64)])
+            self.price_count = np.concatenate([self.price_count, np.zeros(grow, dtype=np.int64)])
+            self.price_sum = np.concatenate([self.price_sum, np.zeros(grow)])
+            self.price_comp = np.concatenate([self.price_comp, np.zeros(grow)])
+        return key_ids[codes]
+
+    def add(self, restaurant_ids, categories, names, prices):
+        group_ids = self._group_ids(restaurant_ids, categories)
+        self.items_count += np.bincount(group_ids, weights=names.notna().to_numpy(), minlength=len(self.items_count)).astype(np.int64)
+
+        valid = prices.notna().to_numpy()
+        group_ids, values = group_ids[valid], prices.to_numpy()[valid]
+        self.price_count += np.bincount(group_ids, minlength=len(self.price_count))
+        compensated_add(group_ids, values, self.price_sum, self.price_comp)
+
+    def to_frame(self):
+        keys = list(self.key_ids)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            average_price = np.where(self.price_count > 0, self.price_sum / self.price_count, np.nan)
+        return pd.DataFrame({
+            'restaurant_id': [key[0] for key in keys],
+            'category': [key[1] for key in keys],
+            'items_count': self.items_count,
+            'average_price': average_price,
+        })
+
+def aggregate_menus_streaming(menus_path, restaurant_ids, chunksize=CHUNK_SIZE, restaurant_prices=None):
+    """
+    Read the menus file in chunks, keep only rows for restaurant_ids and fold
+    item counts and prices per (restaurant, category). Prices of every
+    restaurant are also folded into restaurant_prices (a PriceAccumulator)
+    when given, so cost analysis does not have to read the file again.
+    """
+    accumulator = CategoryAccumulator()
+    reader = pd.read_csv(
+        menus_path,
+        usecols=list(MENU_DTYPES),
+        dtype=MENU_DTYPES,
+        chunksize=chunksize,
+    )
+    for chunk in reader:
+        if restaurant_prices is not None:
+            priced = chunk[chunk['restaurant_id'].notna()]
+            restaurant_prices.add(priced['restaurant_id'].astype('int64').to_numpy(), parse_prices(priced['price']).to_numpy())
+        chunk = chunk[chunk['restaurant_id'].isin(restaurant_ids) & chunk['category'].notna()]
+        if chunk.empty:
+            continue
+
+        price = parse_prices(chunk['price'])
+        accumulator.add(chunk['restaurant_id'].astype('int64').to_numpy(), chunk['category'].to_numpy(), chunk['name'], price)
+
+    return accumulator.to_frame()
+
+def as_text(series):
+    """Format values like an f-string would, including missing values as 'nan'."""
+    return series.astype(object).map(str)
+
+def build_summaries(category_stats, restaurants):
+    """Build one summary string per restaurant without iterating over rows."""
+    category_stats = category_stats.sort_values(['restaurant_id', 'category'])
+    category_text = (
+        as_text(category_stats['category']) + " ("
+        + as_text(category_stats['items_count']) + " items, avg price $"
+        + category_stats['average_price'].map('{:.2f}'.format) + ")"
+    )
+    cat_str = category_text.groupby(category_stats['restaurant_id'], sort=True).agg('; '.join)
+
+    meta = restaurants.drop_duplicates(subset=['id']).set_index('id').loc[cat_str.index]
+    summary = (
+        "Restaurant: " + as_text(meta['name'])
+        + ", Price Range: " + as_text(meta['price_range'])
+        + ", Zip Code: " + as_text(meta['zip_code'])
+        + ". Menu Categories: " + cat_str.values + "."
+    )
+    return pd.DataFrame({'restaurant_id': cat_str.index, 'summary': summary.values})
+
+def aggregate_menus_with_prices(menus_path, restaurant_ids, chunksize=CHUNK_SIZE):
+    """aggregate_menus_streaming, saving every restaurant's prices from the same pass (see menu_prices.py)."""
+    signature = source_signature(menus_path)
+    restaurant_prices = PriceAccumulator()
+    category_stats = aggregate_menus_streaming(menus_path, restaurant_ids, chunksize, restaurant_prices)
+    save_restaurant_prices(restaurant_prices.to_frame(), menus_path, signature)
+    return category_stats
+
+def gen_prompts_streaming(menus_path, restaurants_path, output_path, chunksize=CHUNK_SIZE):
+    restaurants = load_state_restaurants(restaurants_path)
+    category_stats = aggregate_menus_with_prices(menus_path, restaurants['id'].unique(), chunksize)
+
+    output_df = build_summaries(category_stats, restaurants)
+    output_df.to_csv(output_path, index=False)
+
+def write_prompt_shard(partition, category_stats, restaurants, shard_path):
+    output_df = build_summaries(category_stats, restaurants)
+    output_df.to_csv(shard_path, index=False)
+    return {'partition': partition, 'path': os.path.basename(shard_path), 'rows': len(output_df)}
+
+def gen_prompts_partitioned(menus_path, restaurants_path, shard_dir=SHARD_DIR, partition_by='state',
+                            chunksize=CHUNK_SIZE, workers=None):
+    """
+    Build prompts for every restaurant in one pass over the menus file, then
+    write one shard per partition (state or zip prefix) in parallel. A
+    manifest in shard_dir lists the shards so later stages can consume them
+    independently.
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    restaurants = load_restaurants(restaurants_path)
+    restaurants['partition'] = partition_keys(restaurants, partition_by)
+    category_stats = aggregate_menus_with_prices(menus_path, restaurants['id'].unique(), chunksize)
+
+    partition_of = restaurants.drop_duplicates(subset=['id']).set_index('id')['partition']
+    category_stats['partition'] = category_stats['restaurant_id'].map(partition_of)
+
+    tasks = []
+    for partition, stats_part in category_stats.groupby('partition', sort=True):
+        rest_part = restaurants[restaurants['partition'] == partition]
+        tasks.append((partition, stats_part, rest_part, os.path.join(shard_dir, f"{partition}.csv")))
+
+    with Pool(processes=workers or cpu_count()) as pool:
+        shards = pool.starmap(write_prompt_shard, tasks)
+
+    manifest = {'stage': 'prompts', 'partition_by': partition_by, 'shards': shards}
+    with open(os.path.join(shard_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Wrote {len(shards)} shards to {shard_dir}")
+
 def main():
     parser = argparse.ArgumentParser(description="Generate restaurant menu category summaries.")
     parser.add_argument('--menus', required=True, help="Path to restaurant menus CSV file")
     parser.add_argument('--restaurants', required=True, help="Path to restaurants CSV file")
-    parser.add_argument('--output', required=True, help="Path to output CSV file")
+    parser.add_argument('--output', help="Path to output CSV file")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Read the menus file in chunks so memory stays bounded regardless of its size")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE, help="Menu rows per chunk in streaming mode")
+    parser.add_argument('--all-states', action='store_true',
+                        help="Build prompts for every restaurant, written as one shard per partition")
+    parser.add_argument('--partition-by', choices=['state', 'zip3'], default='state',
+                        help="Partition key for --all-states: state or 3-digit zip prefix")
+    parser.add_argument('--shard-dir', default=SHARD_DIR, help="Output directory for --all-states shards and manifest")
+    parser.add_argument('--workers', type=int, default=None, help="Processes used to write shards (default: all cores)")
 
     args = parser.parse_args()
 
-    gen_prompts(args.menus, args.restaurants, args.output)
+    if args.all_states:
+        gen_prompts_partitioned(args.menus, args.restaurants, args.shard_dir, args.partition_by, args.chunksize, args.workers)
+    elif not args.output:
+        parser.error("--output is required unless --all-states is given")
+    elif args.streaming:
+        gen_prompts_streaming(args.menus, args.restaurants, args.output, args.chunksize)
+    else:
+        gen_prompts(args.menus, args.restaurants, args.output)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+MENUS_PATH = 'datasets/restaurant-menus.csv'
+# Rows of restaurant-menus.csv read at a time.
+CHUNK_SIZE = 500_000
+# The per-restaurant prices are saved next to the menus file, as <menus file> + SIDECAR_SUFFIX.
+SIDECAR_SUFFIX = '.prices.npz'
+# Bump when the sidecar layout changes so old sidecars are rebuilt.
+SIDECAR_VERSION = 1
+PRICE_DTYPES = {'restaurant_id': 'float64', 'price': str}
+
+
+def parse_prices(prices):
+    """'12.99 USD' strings as float64; prices that do not parse become NaN."""
+    numbers = prices.str.replace(' USD', '', regex=False)
+    try:
+        return numbers.astype(float)
+    except ValueError:
+        return pd.to_numeric(numbers, errors='coerce')
+
+
+def compensated_add(group_ids, values, sums, compensation):
+    """
+    Add values to sums[group_ids] in place with the Kahan-compensated update
+    pandas' groupby mean uses, in the same row order, so folding a file chunk
+    by chunk gives bit-identical means to aggregating it at once. values must
+    not contain NaN.
+
+    Every group takes one step per rank (its 1st, 2nd, ... row), vectorized
+    across groups.
+    """
+    if len(group_ids) == 0:
+        return
+    order = np.argsort(group_ids, kind='stable')
+    group_ids, values = group_ids[order], values[order]
+    starts = np.flatnonzero(np.r_[True, group_ids[1:] != group_ids[:-1]])
+    rank = np.arange(len(group_ids)) - np.repeat(starts, np.diff(np.r_[starts, len(group_ids)]))
+    by_rank = np.argsort(rank, kind='stable')
+    bounds = np.searchsorted(rank[by_rank], np.arange(rank.max() + 2))
+    for r in range(len(bounds) - 1):
+        step = by_rank[bounds[r]:bounds[r + 1]]
+        idx, val = group_ids[step], values[step]
+        with np.errstate(invalid='ignore'):
+            y = val - compensation[idx]
+            t = sums[idx] + y
+            comp = t - sums[idx] - y
+        # An infinite price makes the compensation NaN; pandas resets it to 0.
+        comp[np.isnan(comp)] = 0.0
+        compensation[idx] = comp
+        sums[idx] = t
+
+
+class PriceAccumulator:
+    """
+    Running min, max, sum and count of item prices per restaurant. Memory
+    grows with the number of restaurants, not with the number of rows.
+    """
+
+    def __init__(self):
+        self.slots = {}
+        self.min_price = np.zeros(0)
+        self.max_price = np.zeros(0)
+        self.price_sum = np.zeros(0)
+        self.price_comp = np.zeros(0)
+        self.price_count = np.zeros(0, dtype=np.int64)
+
+    def _slot_ids(self, restaurant_ids):
+        codes, ids = pd.factorize(restaurant_ids)
+        slot_ids = np.array([self.slots.setdefault(int(rid), len(self.slots)) for rid in ids], dtype=np.int64)
+        grow = len(self.slots) - len(self.price_count)
+        if grow > 0:
+            self.min_price = np.concatenate([self.min_price, np.full(grow, np.nan)])
+            self.max_price = np.concatenate([self.max_price, np.full(grow, np.nan)])
+            self.price_sum = np.concatenate([self.price_sum, np.zeros(grow)])
+            self.price_comp = np.concatenate([self.price_comp, np.zeros(grow)])
+            self.price_count = np.concatenate([self.price_count, np.zeros(grow, dtype=np.int64)])
+        return slot_ids[codes]
+
+    def add(self, restaurant_ids, prices):
+        """Fold in one chunk of rows (restaurant ids as int64, prices as float64 with NaN for missing)."""
+        slot_ids = self._slot_ids(restaurant_ids)
+        valid = ~np.isnan(prices)
+        slot_ids, values = slot_ids[valid], prices[valid]
+        if len(values) == 0:
+            return
+        self.price_count += np.bincount(slot_ids, minlength=len(self.price_count))
+        grouped = pd.Series(values).groupby(slot_ids)
+        chunk_min, chunk_max = grouped.min(), grouped.max()
+        touched = chunk_min.index.to_numpy()
+        self.min_price[touched] = np.fmin(self.min_price[touched], chunk_min.to_numpy())
+        self.max_price[touched] = np.fmax(self.max_price[touched], chunk_max.to_numpy())
+        compensated_add(slot_ids, values, self.price_sum, self.price_comp)
+
+    def to_frame(self):
+        """restaurant_id, min_price, max_price, avg_price per restaurant, sorted by id; NaN prices where none parsed."""
+        restaurant_ids = np.fromiter(self.slots, dtype=np.int64, count=len(self.slots))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg_price = np.where(self.price_count > 0, self.price_sum / self.price_count, np.nan)
+        frame = pd.DataFrame({
+            'restaurant_id': restaurant_ids,
+            'min_price': self.min_price,
+            'max_price': self.max_price,
+            'avg_price': avg_price,
+        })
+        return frame.sort_values('restaurant_id', ignore_index=True)
+
+
+def sidecar_path(menus_path):
+    return menus_path + SIDECAR_SUFFIX
+
+
+def source_signature(menus_path):
+    stat = os.stat(menus_path)
+    return {'version': SIDECAR_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def save_restaurant_prices(prices, menus_path, signature=None):
+    """
+    Write the per-restaurant prices next to menus_path. signature is the
+    menus file's signature from before it was read, so a file changed while
+    it was being read is not marked as up to date.
+    """
+    path = sidecar_path(menus_path)
+    tmp_path = path + '.tmp.npz'
+    try:
+        np.savez(
+            tmp_path,
+            meta=np.array(json.dumps(signature or source_signature(menus_path))),
+            **{column: prices[column].to_numpy() for column in ['restaurant_id', 'min_price', 'max_price', 'avg_price']},
+        )
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not save restaurant prices to {path}: {e}")
+
+
+def _load_sidecar(menus_path):
+    """Saved prices if they were computed from the current menus file, else None."""
+    try:
+        with np.load(sidecar_path(menus_path)) as data:
+            if json.loads(str(data['meta'])) != source_signature(menus_path):
+                return None
+            return pd.DataFrame({column: data[column] for column in ['restaurant_id', 'min_price', 'max_price', 'avg_price']})
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def aggregate_prices(menus_path, chunksize=CHUNK_SIZE):
+    """Per-restaurant min/max/mean item price, reading only restaurant_id and price in chunks."""
+    accumulator = PriceAccumulator()
+    reader = pd.read_csv(menus_path, usecols=list(PRICE_DTYPES), dtype=PRICE_DTYPES, chunksize=chunksize)
+    for chunk in reader:
+        chunk = chunk[chunk['restaurant_id'].notna()]
+        accumulator.add(chunk['restaurant_id'].astype('int64').to_numpy(), parse_prices(chunk['price']).to_numpy())
+    return accumulator.to_frame()
+
+
+def load_restaurant_prices(menus_path=MENUS_PATH, chunksize=CHUNK_SIZE, rebuild=False):
+    """
+    Per-restaurant min_price, max_price and avg_price, from the sidecar next
+    to menus_path while the menus file is unchanged, otherwise aggregated from
+    it (and saved). Means are the same as a pandas groupby over the whole file.
+    """
+    if not rebuild:
+        prices = _load_sidecar(menus_path)
+        if prices is not None:
+            return prices
+    signature = source_signature(menus_path)
+    prices = aggregate_prices(menus_path, chunksize)
+    save_restaurant_prices(prices, menus_path, signature)
+    return prices
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate item prices per restaurant into a sidecar next to the menus file.")
+    parser.add_argument('--menus', default=MENUS_PATH, help="Path to restaurant menus CSV file")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE, help="Menu rows per chunk")
+    parser.add_argument('--rebuild', action='store_true', help="Ignore an existing sidecar")
+
+    args = parser.parse_args()
+
+    prices = load_restaurant_prices(args.menus, args.chunksize, args.rebuild)
+    print(f"Prices for {prices['avg_price'].notna().sum()} restaurants in {sidecar_path(args.menus)}")
+
+if __name__ == "__main__":
+    main()